@@ -0,0 +1,242 @@
+'''
+Vectorized backtests of SMA-deviation (偏离200日均线) and Fear & Greed rules.
+
+A strategy is long-or-flat on one chart. It buys at the close of a candle whose Low is at least
+`entry_below`% under the SMA_200 (Low_Percentage <= -entry_below) and, if set, whose Fear & Greed
+value is at most `fear_entry`; it sells at the close of a candle whose High is at least
+`exit_above`% over the SMA_200 or whose Fear & Greed value is at least `fear_exit`. A rule set to
+None (NaN in a grid) is not used. An exit signal wins over an entry signal on the same candle.
+
+run_backtest() evaluates a whole parameter grid at once: positions and equity curves are
+(combinations x candles) arrays, processed in chunks of about CHUNK_CELLS cells, optionally on a
+process pool. Every trade pays `fee_bps` of the position value per side.
+
+    python -m SMA.backtest --entry-below 20:60:5 --exit-above 50:200:25 --fear-exit 80,90,none
+'''
+import argparse
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .factors import periods_per_year
+from .metrics import STAGE_SECONDS, STAGE_ROWS
+
+PARAMETERS = ["entry_below", "exit_above", "fear_entry", "fear_exit"]
+METRICS = ["total_return", "cagr", "max_drawdown", "sharpe", "trades", "exposure"]
+SORT_METRICS = ("sharpe", "total_return", "cagr", "max_drawdown")
+DEFAULT_FEE_BPS = 10
+CHUNK_CELLS = 2 ** 19  # Combinations x candles per array pass, keeps each float64 array of a chunk at 4 MB
+MAX_CURVE_POINTS = 2000  # Points per equity curve in backtest_report()
+
+def parse_values(text, max_values=None):
+    '''
+    Parameter values from "20,30,45", an inclusive range "20:60:5", a mix of both, or "none"
+    (rule not used). An empty string means "none". With `max_values`, inputs that would give more
+    values are rejected before any range is expanded. Raises ValueError.
+    '''
+    values = []
+    for part in (text or "none").split(","):
+        part = part.strip().lower()
+        if part in ("", "none"):
+            count, part_values = 1, [None]
+        elif ":" in part:
+            start, stop, step = (float(v) for v in part.split(":"))
+            if not all(math.isfinite(v) for v in (start, stop, step)):
+                raise ValueError("Parameter values must be finite")
+            if step <= 0 or stop < start:
+                raise ValueError(f"Invalid range {part!r}, expected start:stop:step with step > 0")
+            # A range is expanded lazily, so an oversized one is rejected before it is built
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            part_values = (round(start + i * step, 10) for i in range(count))
+        else:
+            count, part_values = 1, [float(part)]
+        if max_values is not None and len(values) + count > max_values:
+            raise ValueError(f"{text!r} gives more than {max_values} values")
+        values.extend(part_values)
+    if not all(v is None or math.isfinite(v) for v in values):
+        raise ValueError("Parameter values must be finite")
+    return list(dict.fromkeys(values))
+
+def parameter_grid(entry_below=(None,), exit_above=(None,), fear_entry=(None,), fear_exit=(None,)):
+    '''Every combination of the given values as a frame with the PARAMETERS columns (None -> NaN).'''
+    combinations = list(itertools.product(entry_below, exit_above, fear_entry, fear_exit))
+    return pd.DataFrame(combinations, columns=PARAMETERS, dtype=float)
+
+def _inputs(frame):
+    '''Float64 arrays (close, low %, high %, Fear & Greed) of a processed frame.'''
+    fear_greed = frame["Fear_Greed"] if "Fear_Greed" in frame.columns else pd.Series(np.nan, index=frame.index)
+    return tuple(
+        np.asarray(column, dtype=np.float64)
+        for column in (frame["Close"], frame["Low_Percentage"], frame["High_Percentage"], fear_greed)
+    )
+
+def _latest_signal(signal):
+    '''For each candle, the index of the latest candle (up to it) with a signal, -1 before the first.'''
+    candles = np.arange(signal.shape[1], dtype=np.int32)
+    return np.maximum.accumulate(np.where(signal, candles, np.int32(-1)), axis=1)
+
+def _rule_groups(columns):
+    '''Distinct rows of a parameter sub-array (NaN = rule not used) and each row's group.'''
+    rules, groups = np.unique(np.nan_to_num(columns, nan=np.inf), axis=0, return_inverse=True)
+    rules[np.isinf(rules)] = np.nan
+    return rules, groups.ravel()
+
+def _evaluate_chunk(inputs, params, fee, ppy, curves=False):
+    '''
+    Metrics (and equity curves) for the combinations in `params`, an array of PARAMETERS rows.
+
+    Signals are scanned once per distinct entry rule and exit rule of the chunk: a combination
+    is in the market wherever its latest entry signal is more recent than its latest exit signal
+    (an exit on the same candle wins). Arrays are (combinations x candles), so every scan runs
+    along contiguous memory, and return sums are matrix products with the per-candle returns.
+    '''
+    close, low_pct, high_pct, fear_greed = inputs
+    entry_rules, entry_groups = _rule_groups(params[:, [0, 2]])
+    exit_rules, exit_groups = _rule_groups(params[:, [1, 3]])
+    entry_below, fear_entry = (column[:, None] for column in entry_rules.T)
+    exit_above, fear_exit = (column[:, None] for column in exit_rules.T)
+    entry = (np.isnan(entry_below) | (low_pct <= -entry_below)) & (np.isnan(fear_entry) | (fear_greed <= fear_entry))
+    exit_ = (~np.isnan(exit_above) & (high_pct >= exit_above)) | (~np.isnan(fear_exit) & (fear_greed >= fear_exit))
+    position = _latest_signal(entry)[entry_groups] > _latest_signal(exit_)[exit_groups]
+
+    previous = np.zeros_like(position)
+    previous[:, 1:] = position[:, :-1]
+    entries = position & ~previous
+    exits = previous & ~position
+    held = previous.astype(np.float64)  # in the market over the move into candle t
+    trades = entries.sum(axis=1)
+    changes = trades + exits.sum(axis=1)
+
+    returns = np.zeros(len(close))
+    returns[1:] = close[1:] / close[:-1] - 1
+    log_fee = math.log1p(-fee)
+    # 手续费 - every side costs `fee` of the position value: equity *= (1 - fee) at entries and exits
+    log_equity = np.cumsum(held * np.log1p(returns) + log_fee * (entries | exits), axis=1)
+
+    # Per-candle strategy returns: r when held, -fee at an entry, (1 + r)(1 - fee) - 1 at an exit
+    exit_values = exits.astype(np.float64)
+    exit_returns = returns * (1 - fee) - fee
+    total = held @ returns - fee * changes - fee * (exit_values @ returns)
+    squares = held @ returns ** 2 - exit_values @ returns ** 2 + exit_values @ exit_returns ** 2 + fee ** 2 * trades
+    n = len(close)
+    periods = max(n - 1, 1)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        variance = (squares - total * total / n) / (n - 1) if n > 1 else np.full(len(params), np.nan)
+        std = np.sqrt(np.maximum(variance, 0.0))
+        final = np.exp(log_equity[:, -1]) if n else np.ones(len(params))
+        metrics = {
+            "total_return": final - 1,
+            "cagr": np.power(final, ppy / periods) - 1,
+            "max_drawdown": np.expm1((log_equity - np.maximum.accumulate(log_equity, axis=1)).min(axis=1)),
+            "sharpe": np.where(std > 1e-12, total / n / std * np.sqrt(ppy), np.nan),
+            "trades": trades,
+            "exposure": position.mean(axis=1)
+        }
+    return (metrics, np.exp(log_equity)) if curves else metrics
+
+_worker_inputs = None
+
+def _init_worker(inputs):
+    global _worker_inputs
+    _worker_inputs = inputs
+
+def _evaluate_in_worker(params, fee, ppy):
+    return _evaluate_chunk(_worker_inputs, params, fee, ppy)
+
+def run_backtest(frame, grid, fee_bps=DEFAULT_FEE_BPS, interval="1d", workers=None, chunk_size=None):
+    '''
+    Evaluates every combination of `grid` (see parameter_grid) over a processed frame
+    (get_processed_data). Returns the grid with the METRICS columns added: total_return, cagr
+    and max_drawdown as fractions, annualized sharpe, number of entries and the fraction of
+    candles in the market. With workers > 1, chunks are spread over a process pool; the candle
+    arrays are sent to each worker once. `chunk_size` (combinations per chunk) defaults to what
+    fits CHUNK_CELLS for the frame's length.
+    '''
+    inputs = _inputs(frame)
+    chunk_size = chunk_size or max(1, CHUNK_CELLS // max(len(frame), 1))
+    params = grid[PARAMETERS].to_numpy(dtype=np.float64)
+    fee, ppy = fee_bps / 10000, periods_per_year(interval)
+    chunks = [params[i:i + chunk_size] for i in range(0, len(params), chunk_size)]
+    with STAGE_SECONDS.time(stage="backtest"):
+        if workers is not None and workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(inputs,)) as pool:
+                results = list(pool.map(_evaluate_in_worker, chunks, itertools.repeat(fee), itertools.repeat(ppy)))
+        else:
+            results = [_evaluate_chunk(inputs, chunk, fee, ppy) for chunk in chunks]
+    STAGE_ROWS.inc(len(frame) * len(params), stage="backtest")
+
+    stats = grid[PARAMETERS].reset_index(drop=True)
+    for metric in METRICS:
+        stats[metric] = np.concatenate([r[metric] for r in results]) if results else np.array([])
+    return stats
+
+def equity_curves(frame, params, fee_bps=DEFAULT_FEE_BPS, interval="1d"):
+    '''Equity curves (starting at 1.0) of the combinations in `params` as columns of a frame indexed like `frame`.'''
+    values = params[PARAMETERS].to_numpy(dtype=np.float64)
+    _, equity = _evaluate_chunk(_inputs(frame), values, fee_bps / 10000, periods_per_year(interval), curves=True)
+    return pd.DataFrame(equity.T, index=frame.index)
+
+def _json_value(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+def backtest_report(frame, grid, fee_bps=DEFAULT_FEE_BPS, interval="1d", top=5, sort="sharpe"):
+    '''
+    JSON-ready summary for the dashboard: the `top` combinations by `sort` (NaN last), buy and
+    hold for comparison, and their equity curves, thinned to at most MAX_CURVE_POINTS points.
+    '''
+    from .data_fetcher import is_intraday
+    from .data_processor import _format_dates
+    if sort not in SORT_METRICS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_METRICS)}")
+    stats = run_backtest(frame, grid, fee_bps, interval)
+    best = stats.sort_values(sort, ascending=False, na_position="last", kind="stable").head(top)
+    benchmark = run_backtest(frame, parameter_grid(), fee_bps, interval)  # 买入持有 - no rules: always in the market
+
+    curves = equity_curves(frame, pd.concat([best, benchmark])[PARAMETERS], fee_bps, interval)
+    step = max(1, math.ceil(len(curves) / MAX_CURVE_POINTS))
+    rows = np.unique(np.append(np.arange(0, len(curves), step), len(curves) - 1)) if len(curves) else np.array([], dtype=int)
+    sampled = curves.iloc[rows]
+
+    def records(table):
+        return [{column: _json_value(row[column]) for column in PARAMETERS + METRICS} for _, row in table.iterrows()]
+
+    return {
+        "combinations": len(stats),
+        "fee_bps": fee_bps,
+        "sort": sort,
+        "results": records(best),
+        "buy_and_hold": records(benchmark)[0],
+        "dates": _format_dates(sampled.index, is_intraday(interval)),
+        "equity": [np.round(sampled[c].to_numpy(), 4).tolist() for c in sampled.columns[:len(best)]],
+        "buy_and_hold_equity": np.round(sampled[sampled.columns[-1]].to_numpy(), 4).tolist()
+    }
+
+if __name__ == "__main__":
+    from .data_processor import get_processed_data
+
+    parser = argparse.ArgumentParser(description="Backtest SMA-deviation / Fear & Greed rules over a parameter grid.")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--entry-below", default="20:60:5", help="buy when Low is this %% under the SMA_200")
+    parser.add_argument("--exit-above", default="50:200:25", help="sell when High is this %% over the SMA_200")
+    parser.add_argument("--fear-entry", default="none", help="also require Fear & Greed <= value to buy")
+    parser.add_argument("--fear-exit", default="none", help="also sell when Fear & Greed >= value")
+    parser.add_argument("--fee-bps", type=float, default=DEFAULT_FEE_BPS)
+    parser.add_argument("--workers", type=int, default=None, help="process pool size for large grids")
+    parser.add_argument("--sort", default="sharpe", choices=SORT_METRICS)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", help="write the stats of every combination to this CSV file")
+    args = parser.parse_args()
+
+    grid = parameter_grid(parse_values(args.entry_below), parse_values(args.exit_above),
+                          parse_values(args.fear_entry), parse_values(args.fear_exit))
+    data = get_processed_data(args.symbol, args.interval)
+    stats = run_backtest(data, grid, args.fee_bps, args.interval, workers=args.workers)
+    if args.output:
+        stats.to_csv(args.output, index=False)
+    with pd.option_context("display.width", 160, "display.max_columns", None):
+        print(stats.sort_values(args.sort, ascending=False, na_position="last").head(args.top).to_string(index=False))
@@ -0,0 +1,113 @@
+'''
+Columnar binary chart payload, an alternative to the JSON /data body.
+
+Layout (all little-endian):
+
+    b"BTCC" | u8 format version | 3 bytes padding | u32 header length | header JSON | buffers
+
+The header is small JSON: the ECharts options with every `data` array removed, the x-axis
+description and one descriptor per series buffer ({"series": i, "dtype", "offset", "length"},
+offsets relative to the start of the buffer section). Every buffer starts on an 8-byte boundary
+so browsers can wrap it in a typed array without copying. Missing values are NaN.
+
+The x-axis (history plus future padding) is sent as {"kind": "range", "unit", "start", "step",
+"count"} when the labels are evenly spaced (the usual case) and as an int32 buffer otherwise;
+"unit" is "day" (epoch days) for daily charts and "minute" (epoch minutes) for intraday ones.
+'''
+import json
+import struct
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MAGIC = b"BTCC"
+_PREFIX = struct.Struct("<4sB3xI")
+
+# Series order matches generate_echarts_options; (column, dtype, decimals)
+SERIES_COLUMNS = [
+    ("Close", "<f8", 2),
+    ("SMA_200", "<f8", 2),
+    ("Low_Percentage", "<f8", 2),
+    ("High_Percentage", "<f8", 2),
+    ("Fear_Greed", "<f4", None),  # integers 0-100 are exact in float32
+]
+
+def _pad8(n):
+    return (-n) % 8
+
+def _x_axis(labels, intraday):
+    '''x-axis description plus an optional int32 buffer for irregular axes, from the option labels.'''
+    if intraday:
+        units = np.char.replace(np.array(labels), " ", "T").astype("datetime64[m]").astype(np.int64)
+        unit = "minute"
+    else:
+        units = np.array(labels, dtype="datetime64[D]").astype(np.int64)
+        unit = "day"
+    steps = np.diff(units)
+    if len(units) == 1 or (steps == steps[0]).all():
+        step = int(steps[0]) if len(steps) else 1
+        return {"kind": "range", "unit": unit, "start": int(units[0]), "step": step, "count": len(units)}, None
+    return {"kind": "array", "unit": unit, "count": len(units)}, units.astype("<i4")
+
+# Indicator series (SMA.factors) follow the standard ones in the order they were requested
+INDICATOR_DTYPE = ("<f8", 4)
+
+def encode_chart_binary(frame, options, version, last_updated, intraday=False, extra_columns=()):
+    '''
+    Packs the chart `options` that generate_echarts_options built from `frame` into the binary layout.
+    `extra_columns` names the frame columns of any indicator series appended after SERIES_COLUMNS.
+    '''
+    skeleton = dict(options)  # shallow copies; the shared options dict is never modified
+    skeleton["xAxis"] = dict(options["xAxis"], data=None)
+    skeleton["series"] = [dict(series, data=None) for series in options["series"]]
+    x_axis, x_buffer = _x_axis(options["xAxis"]["data"], intraday)
+
+    buffers = []
+    columns = []
+    offset = 0
+
+    def add_buffer(raw):
+        nonlocal offset
+        start = offset
+        buffers.append(raw)
+        buffers.append(b"\0" * _pad8(len(raw)))
+        offset += len(raw) + _pad8(len(raw))
+        return start
+
+    if x_buffer is not None:
+        x_axis.update({"dtype": "int32", "offset": add_buffer(x_buffer.tobytes()), "length": len(x_buffer)})
+    series_columns = SERIES_COLUMNS + [(column,) + INDICATOR_DTYPE for column in extra_columns]
+    for i, (column, dtype, decimals) in enumerate(series_columns):
+        values = frame[column].to_numpy(dtype=float, na_value=np.nan)
+        if decimals is not None:
+            values = np.round(values, decimals)
+        raw = values.astype(dtype).tobytes()
+        columns.append({"series": i, "dtype": "float64" if dtype == "<f8" else "float32", "offset": add_buffer(raw), "length": len(values)})
+
+    header = json.dumps({
+        "version": version,
+        "last_updated": last_updated.isoformat(),
+        "options": skeleton,
+        "x": x_axis,
+        "columns": columns
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header += b" " * _pad8(_PREFIX.size + len(header))  # buffers start 8-byte aligned
+    return _PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)) + header + b"".join(buffers)
+
+def decode_chart_binary(body):
+    '''Inverse of encode_chart_binary: (header dict, {series index: ndarray}, x values ndarray).'''
+    magic, format_version, header_len = _PREFIX.unpack_from(body, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError("Not a version 1 binary chart payload")
+    header = json.loads(body[_PREFIX.size:_PREFIX.size + header_len])
+    base = _PREFIX.size + header_len
+    series = {
+        c["series"]: np.frombuffer(body, dtype="<f8" if c["dtype"] == "float64" else "<f4", count=c["length"], offset=base + c["offset"])
+        for c in header["columns"]
+    }
+    x = header["x"]
+    if x["kind"] == "range":
+        x_values = x["start"] + x["step"] * np.arange(x["count"], dtype=np.int64)
+    else:
+        x_values = np.frombuffer(body, dtype="<i4", count=x["length"], offset=base + x["offset"]).astype(np.int64)
+    return header, series, x_values
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# 本地K线存储 - local on-disk candle store, one SQLite file shared by all symbols/intervals
+DEFAULT_STORE_PATH = os.environ.get("CHART_CANDLE_STORE") or os.path.join(os.path.dirname(__file__), "output", "candles.sqlite")
+
+KLINE_COLUMNS = ["open_time", "open", "high", "low", "close", "volume", "close_time"]
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS klines (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    open_time INTEGER NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL NOT NULL,
+    close_time INTEGER NOT NULL,
+    PRIMARY KEY (symbol, interval, open_time)
+) WITHOUT ROWID
+'''
+
+# 修复记录 - one row per gap backfilled or duplicate removed by SMA.gaps
+_REPAIRS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS kline_repairs (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    end_time INTEGER NOT NULL,
+    candles INTEGER NOT NULL,
+    repaired INTEGER NOT NULL,
+    repaired_at INTEGER NOT NULL
+)
+'''
+
+REPAIR_COLUMNS = ["symbol", "interval", "kind", "start_time", "end_time", "candles", "repaired", "repaired_at"]
+
+def _connect(path=None):
+    '''Opens the store, creating the directory and table on first use.'''
+    path = path or DEFAULT_STORE_PATH
+    store_dir = os.path.dirname(path)
+    if store_dir and not os.path.exists(store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    conn.execute(_REPAIRS_SCHEMA)
+    return conn
+
+def get_last_open_time(symbol, interval, path=None):
+    '''Returns the open time (ms) of the newest stored candle, or None if the store is empty.'''
+    conn = _connect(path)
+    try:
+        row = conn.execute(
+            "SELECT MAX(open_time) FROM klines WHERE symbol = ? AND interval = ?",
+            (symbol, interval)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row and row[0] is not None else None
+
+def upsert_klines(klines, symbol, interval, path=None):
+    '''
+    Inserts raw Binance kline rows, replacing rows with the same open time.
+    The last candle of a page is usually still open, so re-fetched candles must overwrite.
+    '''
+    if not klines:
+        return 0
+    records = [
+        (symbol, interval, int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]), int(k[6]))
+        for k in klines
+    ]
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO klines (symbol, interval, open_time, open, high, low, close, volume, close_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+    finally:
+        conn.close()
+    return len(records)
+
+def load_klines(symbol, interval, path=None):
+    '''Loads all stored candles for a symbol/interval, ordered by open time.'''
+    conn = _connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT open_time, open, high, low, close, volume, close_time FROM klines "
+            "WHERE symbol = ? AND interval = ? ORDER BY open_time",
+            (symbol, interval)
+        ).fetchall()
+    finally:
+        conn.close()
+    return pd.DataFrame(rows, columns=KLINE_COLUMNS)
+
+def load_open_times(symbol, interval, path=None):
+    '''Open times (ms) of all stored candles for a symbol/interval, ascending, as an int64 array.'''
+    conn = _connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT open_time FROM klines WHERE symbol = ? AND interval = ? ORDER BY open_time",
+            (symbol, interval)
+        ).fetchall()
+    finally:
+        conn.close()
+    return np.array([r[0] for r in rows], dtype=np.int64)
+
+def delete_klines(open_times, symbol, interval, path=None):
+    '''Deletes the stored candles with the given open times. Returns the number of rows deleted.'''
+    if len(open_times) == 0:
+        return 0
+    conn = _connect(path)
+    try:
+        with conn:
+            cursor = conn.executemany(
+                "DELETE FROM klines WHERE symbol = ? AND interval = ? AND open_time = ?",
+                [(symbol, interval, int(t)) for t in open_times]
+            )
+            deleted = cursor.rowcount
+    finally:
+        conn.close()
+    return deleted
+
+def record_repairs(repairs, path=None):
+    '''Appends repair records, dicts with the REPAIR_COLUMNS keys.'''
+    if not repairs:
+        return
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                f"INSERT INTO kline_repairs ({', '.join(REPAIR_COLUMNS)}) VALUES ({', '.join('?' * len(REPAIR_COLUMNS))})",
+                [tuple(r[c] for c in REPAIR_COLUMNS) for r in repairs]
+            )
+    finally:
+        conn.close()
+
+def load_repairs(symbol, interval, path=None):
+    '''Repair records of a symbol/interval, oldest first.'''
+    conn = _connect(path)
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(REPAIR_COLUMNS)} FROM kline_repairs WHERE symbol = ? AND interval = ? ORDER BY rowid",
+            (symbol, interval)
+        ).fetchall()
+    finally:
+        conn.close()
+    return pd.DataFrame(rows, columns=REPAIR_COLUMNS)
+
+def load_unfillable_gaps(symbol, interval, path=None):
+    '''(start_time, end_time) of the gaps recorded as unfillable: the exchange has no candles for them.'''
+    conn = _connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT start_time, end_time FROM kline_repairs WHERE symbol = ? AND interval = ? AND kind = 'gap' AND repaired = 0",
+            (symbol, interval)
+        ).fetchall()
+    finally:
+        conn.close()
+    return set(rows)
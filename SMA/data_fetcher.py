@@ -1,17 +1,60 @@
-import requests
+import logging
+import os
+import threading
 import time
+import numpy as np
 import pandas as pd
+import requests
 from datetime import datetime
 
-def get_btc_data():
-    url = "https://api.binance.com/api/v3/klines"
-    symbol = "BTCUSDT"
-    interval = "1d"
-    start_time = int(datetime.strptime("2015-01-01", "%Y-%m-%d").timestamp() * 1000)
-    end_time = int(datetime.now().timestamp() * 1000)
-    limit = 1000
+from .candle_store import get_last_open_time, upsert_klines, load_klines, load_unfillable_gaps
+from .http_client import DEFAULT_TIMEOUT, binance_limiter, get_session
+from .metrics import HTTP_CLIENT_REQUESTS, HTTP_CLIENT_SECONDS, STAGE_SECONDS, STAGE_ROWS, record_cache
+
+logger = logging.getLogger(__name__)
+
+# API roots can be pointed at local stand-ins (benchmarks, replay tests)
+BINANCE_API_URL = os.environ.get("BINANCE_API_URL", "https://api.binance.com")
+FEAR_GREED_API_URL = os.environ.get("FEAR_GREED_API_URL", "https://api.alternative.me")
+BINANCE_KLINES_URL = BINANCE_API_URL + "/api/v3/klines"
+FEAR_GREED_URL = FEAR_GREED_API_URL + "/fng/"
+KLINES_REQUEST_WEIGHT = 2
+HISTORY_START = "2015-01-01"
+
+# Binance K线周期的毫秒长度 - length of each supported Binance kline interval
+INTERVAL_MS = {
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "30m": 30 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "2h": 2 * 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "6h": 6 * 60 * 60 * 1000,
+    "12h": 12 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+    "3d": 3 * 24 * 60 * 60 * 1000,
+    "1w": 7 * 24 * 60 * 60 * 1000,
+}
 
-    data = []
+def is_intraday(interval):
+    '''Intraday candles are indexed by datetime, daily and longer ones by date.'''
+    return INTERVAL_MS[interval] < INTERVAL_MS["1d"]
+
+def _timed_get(source, url, params):
+    '''GET over the shared session, recording request count, status and latency per source.'''
+    with HTTP_CLIENT_SECONDS.time(source=source):
+        try:
+            response = get_session().get(url, params=params, timeout=DEFAULT_TIMEOUT)
+        except Exception:
+            HTTP_CLIENT_REQUESTS.inc(source=source, status="error")
+            raise
+    HTTP_CLIENT_REQUESTS.inc(source=source, status=response.status_code)
+    return response
+
+def _fetch_klines(symbol, interval, start_time, end_time, limit=1000):
+    '''Pages through /api/v3/klines from start_time to end_time and returns the raw rows.'''
+    klines = []
     current_time = start_time
 
     while current_time < end_time:
@@ -22,29 +65,158 @@ def get_btc_data():
             "endTime": end_time,
             "limit": limit
         }
-        response = requests.get(url, params=params)
+        binance_limiter.acquire(KLINES_REQUEST_WEIGHT)
+        response = _timed_get("binance", BINANCE_KLINES_URL, params)
+        binance_limiter.update(response)
+        response.raise_for_status()
         result = response.json()
         
         if not result:
             break
         
-        for item in result:
-            data.append({
-                'Date': datetime.fromtimestamp(item[0] / 1000),
-                'Low': float(item[3]),
-                'High': float(item[2]),
-                'Close': float(item[4])
-            })
+        klines.extend(result)
+        if len(result) < limit:
+            break  # 最后一页 - last page, no need to ask again
         
-        current_time = result[-1][0] + 24 * 60 * 60 * 1000
-        time.sleep(0.1)
+        current_time = result[-1][0] + INTERVAL_MS[interval]
+
+    return klines
+
+def _candle_index(open_times, intraday=False):
+    '''
+    Open times (ms since the epoch) as a DatetimeIndex. Daily and longer candles get their local
+    date, as datetime.fromtimestamp gives it (the UTC offset is looked up once per distinct hour
+    instead of once per candle). Intraday candles keep their open time in UTC: local wall-clock
+    times repeat when daylight saving time ends, and the index must stay unique and increasing.
+    '''
+    ms = np.asarray(open_times, dtype=np.int64)
+    if intraday:
+        return pd.DatetimeIndex(ms.astype("datetime64[ms]").astype("datetime64[ns]"), name="Date")
+    hours, inverse = np.unique(ms // 3600000, return_inverse=True)
+    offsets = np.array([time.localtime(h * 3600).tm_gmtoff for h in hours.tolist()], dtype=np.int64) * 1000
+    days = (ms + offsets[inverse]).astype("datetime64[ms]").astype("datetime64[D]")  # 转换为日期 - the candle's date
+    return pd.DatetimeIndex(days.astype("datetime64[ns]"), name="Date")
+
+def candle_open_time(label, interval):
+    '''
+    Open time (ms since the epoch) of the candle _candle_index labels `label`: the label itself for
+    intraday candles; for daily and longer ones the 00:00 UTC (when Binance opens them) whose
+    local date is the label.
+    '''
+    ms = pd.Timestamp(label).value // 1000000
+    if is_intraday(interval):
+        return ms
+    day = INTERVAL_MS["1d"]
+    for candidate in (ms, ms + day, ms - day):
+        if _candle_index([candidate])[0] == label:
+            return candidate
+    raise ValueError(f"No candle opening at 00:00 UTC has the local date {label}")
+
+def _klines_to_frame(open_times, low, high, close, intraday=False):
+    '''Candle frame (Low/High/Close as float64) indexed by date or open time, see _candle_index.'''
+    return pd.DataFrame({
+        'Low': np.asarray(low, dtype=np.float64),
+        'High': np.asarray(high, dtype=np.float64),
+        'Close': np.asarray(close, dtype=np.float64)
+    }, index=_candle_index(open_times, intraday))
+
+def kline_rows_to_frame(klines, interval):
+    '''Candle frame from /api/v3/klines rows (or streamed klines in the same layout).'''
+    return _klines_to_frame(
+        [k[0] for k in klines], [k[3] for k in klines], [k[2] for k in klines], [k[4] for k in klines], is_intraday(interval)
+    )
+
+def get_klines(symbol="BTCUSDT", interval="1d", use_store=True, store_path=None, repair=True):
+    '''
+    Returns candles for any Binance symbol/interval as a DatetimeIndex frame: normalized to the
+    local date for daily and longer intervals, the candle's open time in UTC for intraday ones.
+
+    With use_store, history is kept in the local candle store and only candles from the
+    last stored open time onwards are requested; that last candle is re-fetched because
+    it may still have been open when it was stored. With repair, holes and duplicates in the
+    stored history are fixed first (SMA.gaps.repair_candles), requesting only the missing ranges.
+    '''
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"Unsupported interval: {interval}")
+    intraday = is_intraday(interval)
+    start_time = int(datetime.strptime(HISTORY_START, "%Y-%m-%d").timestamp() * 1000)
+    end_time = int(datetime.now().timestamp() * 1000)
+
+    if not use_store:
+        with STAGE_SECONDS.time(stage="fetch_klines"):
+            klines = _fetch_klines(symbol, interval, start_time, end_time)
+        STAGE_ROWS.inc(len(klines), stage="fetch_klines")
+        return kline_rows_to_frame(klines, interval)
+
+    last_open_time = get_last_open_time(symbol, interval, store_path)
+    if last_open_time is not None:
+        start_time = last_open_time
+
+    with STAGE_SECONDS.time(stage="fetch_klines"):
+        klines = _fetch_klines(symbol, interval, start_time, end_time)
+    STAGE_ROWS.inc(len(klines), stage="fetch_klines")
+    with STAGE_SECONDS.time(stage="store_write"):
+        upsert_klines(klines, symbol, interval, store_path)
+
+    with STAGE_SECONDS.time(stage="store_read"):
+        stored = load_klines(symbol, interval, store_path)
+    if repair and _needs_repair(stored["open_time"], symbol, interval, store_path):
+        from .gaps import repair_candles
+        try:
+            repairs = repair_candles(symbol, interval, store_path)
+        except requests.RequestException as e:
+            logger.warning(f"Backfilling {symbol} {interval} failed, serving the history with gaps: {e}")
+            repairs = []
+        if repairs:
+            with STAGE_SECONDS.time(stage="store_read"):
+                stored = load_klines(symbol, interval, store_path)
+    STAGE_ROWS.inc(len(stored["open_time"]), stage="store_read")
+
+    with STAGE_SECONDS.time(stage="frame_build"):
+        frame = _klines_to_frame(stored["open_time"], stored["low"], stored["high"], stored["close"], intraday)
+    STAGE_ROWS.inc(len(frame), stage="frame_build")
+    return frame
+
+def _needs_repair(open_times, symbol, interval, store_path=None):
+    '''
+    Cheap check on the loaded history: a step between open times that is not one interval, other
+    than a gap already recorded as unfillable (kline_repairs is only read when there are gaps).
+    '''
+    open_times = np.asarray(open_times, dtype=np.int64)
+    interval_ms = INTERVAL_MS[interval]
+    irregular = np.flatnonzero(np.diff(open_times) != interval_ms)
+    if not len(irregular):
+        return False
+    steps = open_times[irregular + 1] - open_times[irregular]
+    if ((steps < interval_ms) | (steps % interval_ms != 0)).any():
+        return True  # off the grid: duplicates to remove
+    gaps = zip((open_times[irregular] + interval_ms).tolist(), (open_times[irregular + 1] - interval_ms).tolist())
+    unfillable = load_unfillable_gaps(symbol, interval, store_path)
+    return any(gap not in unfillable for gap in gaps)
+
+def get_btc_data(use_store=True, store_path=None):
+    '''Returns daily BTCUSDT candles indexed by date (datetime64, midnight).'''
+    return get_klines("BTCUSDT", "1d", use_store, store_path)
+
+# The index only changes once a day, so concurrent per-symbol refreshes share one download
+FEAR_GREED_MAX_AGE = 10 * 60
+FEAR_GREED_CLASSES = ["Extreme Fear", "Fear", "Neutral", "Greed", "Extreme Greed"]
+_fear_greed_cache = {"frame": None, "fetched_at": 0.0}
+_fear_greed_lock = threading.Lock()
 
-    df = pd.DataFrame(data)
-    df['Date'] = df['Date'].dt.date  # 新增：转换为 date 类型
-    df.set_index('Date', inplace=True)
-    return df
+def get_fear_greed_index(max_age=FEAR_GREED_MAX_AGE):
+    '''Fear & Greed history indexed by date (sorted), re-downloaded at most every `max_age` seconds.'''
+    with _fear_greed_lock:
+        stale = _fear_greed_cache["frame"] is None or time.monotonic() - _fear_greed_cache["fetched_at"] >= max_age
+        record_cache("fear_greed", not stale)
+        if stale:
+            with STAGE_SECONDS.time(stage="fetch_fear_greed"):
+                _fear_greed_cache["frame"] = _download_fear_greed_index()
+            _fear_greed_cache["fetched_at"] = time.monotonic()
+            STAGE_ROWS.inc(len(_fear_greed_cache["frame"]), stage="fetch_fear_greed")
+        return _fear_greed_cache["frame"]
 
-def get_fear_greed_index():
+def _download_fear_greed_index():
     # API 请求参数
     params = {
         "limit": 0,          # 获取全部数据
@@ -52,19 +224,19 @@ def get_fear_greed_index():
     }
 
     # 发送 GET 请求
-    url = "https://api.alternative.me/fng/"
-    response = requests.get(url, params=params)
+    response = _timed_get("fear_greed", FEAR_GREED_URL, params)
+    response.raise_for_status()
     data = response.json()
 
     # 转换为 DataFrame
     df = pd.DataFrame(data["data"])
-    df["date"] = pd.to_datetime(df["timestamp"], format='%d-%m-%Y').dt.date
-    
-    # 创建新的DataFrame而不是修改切片
-    result = pd.DataFrame()
-    result['date'] = df['date']
-    result['value'] = pd.to_numeric(df['value'])
-    result['value_classification'] = df['value_classification']
-    result.set_index('date', inplace=True)
-    
-    return result
\ No newline at end of file
+    classes = df["value_classification"]
+    result = pd.DataFrame({
+        'value': pd.to_numeric(df['value']).to_numpy(),
+        # 类别列 - five distinct labels, stored as categorical codes instead of Python strings
+        'value_classification': pd.Categorical(
+            classes, categories=FEAR_GREED_CLASSES + sorted(set(classes) - set(FEAR_GREED_CLASSES))
+        )
+    }, index=pd.DatetimeIndex(pd.to_datetime(df["timestamp"], format='%d-%m-%Y'), name='date'))
+    # The API lists the newest day first; joins expect ascending dates
+    return result.sort_index()
@@ -1,77 +1,237 @@
-from .data_fetcher import get_btc_data, get_fear_greed_index
-from .indicator import calculate_percentages
+from .data_fetcher import get_klines, get_fear_greed_index, is_intraday, kline_rows_to_frame, candle_open_time, INTERVAL_MS
+from .indicator import update_percentages
+from .metrics import STAGE_SECONDS, STAGE_ROWS
+from .factors import indicator_column, indicator_label, indicator_axis
+import numpy as np
 import pandas as pd
 import json # Not strictly needed here if we return dict, but good for consistency
-import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def get_processed_data():
-    '''Fetches and processes BTC and Fear & Greed data.'''
-    btc_df = get_btc_data()
-    fear_greed_df = get_fear_greed_index()
-    
-    # Calculate percentages
-    processed_df = calculate_percentages(btc_df.copy()) # Use .copy() to avoid SettingWithCopyWarning
-    
-    # Merge fear_greed_data (按索引对齐 - align by index)
-    # Ensure index types are compatible for join. data_fetcher already converts to date.
-    processed_df = processed_df.join(fear_greed_df, how='left')
-    processed_df.rename(columns={
-        'value': 'Fear_Greed',
-        'value_classification': 'Fear_Greed_Class'
-    }, inplace=True)
+# 指标增量状态 - per (symbol, interval): processed candle frame and the incremental indicator state that belongs to it
+_indicator_cache = {}
+_indicator_cache_lock = threading.Lock()
+
+def get_processed_data(symbol="BTCUSDT", interval="1d"):
+    '''Fetches and processes candles for one symbol/interval together with Fear & Greed data.'''
+    # 两个数据源并发获取 - both sources are fetched concurrently over the shared session
+    with STAGE_SECONDS.time(stage="fetch"), ThreadPoolExecutor(max_workers=2, thread_name_prefix="fetch") as pool:
+        candles_future = pool.submit(get_klines, symbol, interval)
+        fear_greed_future = pool.submit(get_fear_greed_index)
+        candles_df = candles_future.result()
+        fear_greed_df = fear_greed_future.result()
     
-    return processed_df
-
-def generate_echarts_options(data_df):
-    '''Generates ECharts options dictionary from the processed DataFrame.'''
-    # Ensure index is string date for JSON serialization if it becomes DatetimeIndex
-    # data_fetcher.py already converts the index to date objects,
-    # and get_processed_data returns it as such.
-    # For ECharts, string dates are usually preferred.
+    # Calculate percentages, only for candles added since the previous run
+    with _indicator_cache_lock:
+        cached = _indicator_cache.get((symbol, interval), {"frame": None, "state": None})
+    processed_df, state = update_percentages(candles_df, cached["frame"], cached["state"])
+    with _indicator_cache_lock:
+        _indicator_cache[(symbol, interval)] = {"frame": processed_df, "state": state}
     
-    # Create a copy to safely modify for ECharts data preparation
-    chart_df = data_df.copy()
-
-    if isinstance(chart_df.index, pd.DatetimeIndex):
-        chart_df["Date"] = chart_df.index.strftime("%Y-%m-%d")
-    elif isinstance(chart_df.index, pd.Index) and pd.api.types.is_object_dtype(chart_df.index):
-         # Assuming it's an index of date objects, convert to string
-        chart_df["Date"] = chart_df.index.map(lambda x: x.strftime("%Y-%m-%d") if hasattr(x, 'strftime') else str(x))
+    with STAGE_SECONDS.time(stage="join"):
+        joined = join_fear_greed(processed_df, fear_greed_df, interval)
+    STAGE_ROWS.inc(len(joined), stage="join")
+    return joined
+
+# 图表数据的浮点存储类型 - storage dtype of the float columns of the published frame. "float32" halves
+# their memory; indicators are always computed in float64 and values are served rounded to 2 decimals.
+# Storage type of the percentage columns. Prices always stay float64: float32 cannot hold 2 decimals
+# above 131072. With float32 the percentages are stored rounded to the 2 decimals that are served,
+# so the served values do not change.
+FLOAT_DTYPE = np.dtype(os.environ.get("CHART_FLOAT_DTYPE", "float64"))
+FLOAT_COLUMNS = ["Low_Percentage", "High_Percentage"]
+
+def apply_live_klines(symbol, interval, klines):
+    '''
+    Applies streamed klines (/api/v3/klines row layout, any order) to the candles of the last
+    get_processed_data() call for the pair: a kline for the newest candle replaces it, a kline
+    for the next candle is appended, older ones are ignored. Klines are matched on their open
+    time, never on the index label, and the last one given for an open time wins. Indicators are
+    updated incrementally. Returns the joined frame like get_processed_data(), or None when nothing
+    can be applied because the pair has not been loaded yet or the klines leave a gap.
+    '''
+    with _indicator_cache_lock:
+        cached = _indicator_cache.get((symbol, interval))
+    if cached is None or cached["frame"] is None or cached["frame"].empty:
+        return None
+
+    processed_df = cached["frame"]
+    last_open = candle_open_time(processed_df.index[-1], interval)
+    latest = {kline[0]: kline for kline in klines}
+    open_times = sorted(t for t in latest if t >= last_open)
+    if not open_times:
+        return None
+    step = INTERVAL_MS[interval]
+    if open_times[0] - last_open > step or (np.diff(open_times) > step).any():
+        return None
+
+    updates = kline_rows_to_frame([latest[t] for t in open_times], interval)
+    updates.index = updates.index.astype(processed_df.index.dtype)  # same datetime unit as the loaded candles
+    candles = processed_df[["Low", "High", "Close"]]
+    kept = len(candles) - 1 if open_times[0] == last_open else len(candles)
+    candles = pd.concat([candles.iloc[:kept], updates])
+    processed_df, state = update_percentages(candles, processed_df, cached["state"])
+    with _indicator_cache_lock:
+        _indicator_cache[(symbol, interval)] = {"frame": processed_df, "state": state}
+    with STAGE_SECONDS.time(stage="join"):
+        return join_fear_greed(processed_df, get_fear_greed_index(), interval)
+
+def join_fear_greed(processed_df, fear_greed_df, interval="1d"):
+    '''
+    Left-joins the Fear & Greed value and class onto the processed candles.
+
+    Both frames are indexed by ascending datetime64 dates, so the join is a binary-search merge
+    of two sorted arrays: every candle (intraday ones included) gets the value of its calendar
+    day. Fear_Greed is float32 (NaN where missing), Fear_Greed_Class categorical, and the
+    FLOAT_COLUMNS are stored as FLOAT_DTYPE.
+    '''
+    days = pd.DatetimeIndex(processed_df.index).values.astype("datetime64[D]")
+    fg_days = pd.DatetimeIndex(fear_greed_df.index).values.astype("datetime64[D]")
+    positions = np.minimum(np.searchsorted(fg_days, days), max(len(fg_days) - 1, 0))
+    matched = fg_days[positions] == days if len(fg_days) else np.zeros(len(days), dtype=bool)
+
+    values = fear_greed_df["value"].to_numpy(dtype=np.float32)
+    fear_greed = np.full(len(days), np.nan, dtype=np.float32)
+    fear_greed[matched] = values[positions[matched]]
+    classes = pd.Categorical(fear_greed_df["value_classification"])
+    codes = np.where(matched, classes.codes[positions] if len(fg_days) else -1, -1)
+
+    # One constructor call over the column arrays; float64 columns are not copied when FLOAT_DTYPE is float64
+    columns = {c: processed_df[c].array for c in processed_df.columns}
+    if FLOAT_DTYPE != np.float64:
+        for c in FLOAT_COLUMNS:
+            columns[c] = np.round(processed_df[c].to_numpy(dtype=np.float64), 2).astype(FLOAT_DTYPE)
+    columns["Fear_Greed"] = fear_greed
+    columns["Fear_Greed_Class"] = pd.Categorical.from_codes(codes, dtype=classes.dtype)
+    return pd.DataFrame(columns, index=processed_df.index, copy=False)
+
+def _format_dates(index, intraday=False):
+    '''
+    Formats the frame index as "%Y-%m-%d" strings ("%Y-%m-%d %H:%M" for intraday charts)
+    without a per-row Python loop.
+    '''
+    if intraday:
+        minutes = pd.DatetimeIndex(index).values.astype("datetime64[m]")
+        return np.char.replace(np.datetime_as_string(minutes, unit="m"), "T", " ").tolist()
+    if isinstance(index, pd.DatetimeIndex) and index.tz is None:
+        days = index.values.astype("datetime64[D]")
+    elif pd.api.types.is_object_dtype(index) and pd.api.types.infer_dtype(index, skipna=False) in ("date", "datetime"):
+        # data_fetcher.py converts the index to date objects; convert them to datetime64 in one go
+        days = pd.to_datetime(index).values.astype("datetime64[D]")
+    elif isinstance(index, pd.DatetimeIndex):
+        return index.strftime("%Y-%m-%d").tolist()
+    elif pd.api.types.is_object_dtype(index):
+        return index.map(lambda x: x.strftime("%Y-%m-%d") if hasattr(x, 'strftime') else str(x)).tolist()
     else: # Fallback for other index types
-        chart_df["Date"] = chart_df.index.astype(str)
+        return index.astype(str).tolist()
+    return np.datetime_as_string(days, unit="D").tolist()
+
+def _future_dates(last_date, future_days, step=1, keep=()):
+    '''
+    Every `step`-th calendar day of the `future_days` after last_date ("%Y-%m-%d"), as strings.
+    Dates in `keep` that fall in that span are always included.
+    '''
+    first = np.datetime64(last_date, "D") + 1
+    days = np.arange(first, first + future_days, step)
+    if step > 1 and len(keep):
+        extra = np.array(keep, dtype="datetime64[D]")
+        days = np.union1d(days, extra[(extra >= first) & (extra < first + future_days)])
+    return np.datetime_as_string(days, unit="D").tolist()
+
+def _series_data(column, decimals=None, integral=False):
+    '''
+    Column values as a JSON-ready list: optionally rounded, NaN replaced by None.
+    Float32 columns are widened first so rounding gives the same decimals as float64 storage.
+    With `integral`, a column without missing values is emitted as ints (the Fear & Greed index
+    is stored as float32 but used to be an integer column whenever nothing was missing).
+    '''
+    values = column.to_numpy()
+    if values.dtype.kind == "O":
+        nan_mask = pd.isna(values)
+    elif values.dtype.kind != "f":
+        return values.tolist()
+    else:
+        values = values.astype(np.float64, copy=False)
+        if decimals is not None:
+            values = np.round(values, decimals)
+        nan_mask = np.isnan(values)
+    if not nan_mask.any():
+        return values.astype(np.int64).tolist() if integral and values.dtype.kind == "f" else values.tolist()
+    values = values.astype(object)
+    values[nan_mask] = None
+    return values.tolist()
+
+# Important events (Halving dates)
+HALVING_DATES = ["2020-05-11", "2024-04-20", "2028-03-30"] # Keep as strings
+HALVING_ANNOTATIONS = ["3. Halving", "4. Halving", "5. Halving"]
+
+# 因子系列所在的坐标轴 - y axis of each indicator axis kind (see SMA.factors)
+INDICATOR_Y_AXIS = {"price": 0, "percent": 1, "oscillator": 2, "ratio": 3}
+
+def generate_echarts_options(data_df, future_days=1460, future_step=1, symbol="BTCUSDT", interval="1d", indicators=()):
+    '''
+    Generates ECharts options dictionary from the processed DataFrame.
+    `future_days` empty dates are appended after the last row, every `future_step`-th day
+    (downsampled charts use a matching step so the padding does not dwarf the history).
+    Intraday charts label the axis with times and get no future padding.
+    `indicators` are (name, window) specs from SMA.factors whose columns data_df already has;
+    each one becomes an extra line series after the five standard ones.
+    '''
+    with STAGE_SECONDS.time(stage="options"):
+        option = _build_echarts_options(data_df, future_days, future_step, symbol, interval)
+        if indicators:
+            _add_indicator_series(option, data_df, indicators)
+    STAGE_ROWS.inc(len(data_df), stage="options")
+    return option
+
+def _add_indicator_series(option, data_df, indicators):
+    for name, window in indicators:
+        label = indicator_label(name, window)
+        y_axis = INDICATOR_Y_AXIS[indicator_axis(name)]
+        if y_axis == 3 and len(option["yAxis"]) == 3:
+            option["yAxis"].append({"type": "value", "name": "因子", "position": "left", "offset": 80})
+        option["legend"]["data"].append(label)
+        option["series"].append({
+            "name": label,
+            "type": "line",
+            "data": _series_data(data_df[indicator_column(name, window)], 4),
+            "yAxisIndex": y_axis,
+            "smooth": True,
+            "lineStyle": {"width": 1}
+        })
+
+def _build_echarts_options(data_df, future_days, future_step, symbol, interval):
+    intraday = is_intraday(interval)
+    asset = symbol[:-4] if symbol.endswith("USDT") else symbol
+    # ECharts category axes want string dates; the columns are converted with NumPy
+    # directly from the frame, without copying it.
 
     # Data preparation for ECharts
     # 生成原始日期
-    dates = chart_df["Date"].tolist()
+    dates = _format_dates(data_df.index, intraday)
     # 补充未来日期
-    last_date = datetime.datetime.strptime(dates[-1], "%Y-%m-%d")
-    future_days = 1460  # 例如补充一年
-    for i in range(1, future_days+1):
-        future = last_date + datetime.timedelta(days=i)
-        dates.append(future.strftime("%Y-%m-%d"))
-    # 处理NaN值
-    def replace_nan(val):
-        return val if pd.notna(val) else None
-    
-    # 修改数据准备部分
-    close = [replace_nan(x) for x in chart_df["Close"].round(2).tolist()]
-    sma200 = [replace_nan(x) for x in chart_df["SMA_200"].round(2).tolist()]
-    low_pct = [replace_nan(x) for x in chart_df["Low_Percentage"].round(2).tolist()]
-    high_pct = [replace_nan(x) for x in chart_df["High_Percentage"].round(2).tolist()]
-    fear_greed = [replace_nan(x) for x in chart_df["Fear_Greed"].tolist()]
+    if future_days and not intraday:
+        dates.extend(_future_dates(dates[-1], future_days, future_step, HALVING_DATES))
 
-    # Important events (Halving dates)
-    halving_dates = ["2020-05-11", "2024-04-20", "2028-03-30"] # Keep as strings
-    annotations = ["3. Halving", "4. Halving", "5. Halving"]
+    # 修改数据准备部分 (round to 2 decimals, NaN -> None)
+    close = _series_data(data_df["Close"], 2)
+    sma200 = _series_data(data_df["SMA_200"], 2)
+    low_pct = _series_data(data_df["Low_Percentage"], 2)
+    high_pct = _series_data(data_df["High_Percentage"], 2)
+    fear_greed = _series_data(data_df["Fear_Greed"], integral=True)
+
+    halving_dates = [d + " 00:00" for d in HALVING_DATES] if intraday else HALVING_DATES
+    annotations = HALVING_ANNOTATIONS
 
     # ECharts configuration (adapted from visualizer_echarts.py)
     option = {
-        "title": {"text": "BTC Price and SMA Percentage Analysis"},
+        "title": {"text": f"{asset} Price and SMA Percentage Analysis" + (f" ({interval})" if interval != "1d" else "")},
         "tooltip": {"trigger": "axis"},
-        "legend": {"data": ["BTC价格", "SMA200", "相对SMA下降", "相对SMA上涨", "恐慌指数"], "top": "5%"}, # Adjust legend position
+        "legend": {"data": [f"{asset}价格", "SMA200", "相对SMA下降", "相对SMA上涨", "恐慌指数"], "top": "5%"}, # Adjust legend position
         "xAxis": {"type": "category", "data": dates, "axisPointer": {"show": True}},
         "yAxis": [
-            {"type": "value", "name": "BTC Price (USD)"},
+            {"type": "value", "name": f"{asset} Price (USD)"},
             {
                 "type": "value",
                 "name": "百分比(%)",
@@ -82,7 +242,7 @@ def generate_echarts_options(data_df):
             {"type": "value", "name": "恐慌指数", "min": 0, "max": 100, "position": "right", "offset": 80} # Increased offset
         ],
         "series": [
-            {"name": "BTC价格", "type": "line", "data": close, "yAxisIndex": 0, "smooth": True, "lineStyle": {"color": "#FFA500", "width": 2}},
+            {"name": f"{asset}价格", "type": "line", "data": close, "yAxisIndex": 0, "smooth": True, "lineStyle": {"color": "#FFA500", "width": 2}},
             {"name": "SMA200", "type": "line", "data": sma200, "yAxisIndex": 0, "smooth": True, "lineStyle": {"color": "#000080", "width": 2}},
             {
                 "name": "相对SMA下降", 
@@ -104,23 +264,12 @@ def generate_echarts_options(data_df):
         "responsive": True # Added for better responsiveness if ECharts supports it directly
     }
     
-    # Add halving events markLines to the series instead of top-level markLine for clarity
-    # This is a common way to add vertical lines tied to specific dates
-    # However, ECharts prefers markLines on specific series or globally if they are more general.
-    # For vertical lines on xAxis, it's often clearer to add them to a relevant series or use global markLine.
-    # The original code had a slightly unusual way of adding global markLine for halving dates.
-    # Let's try to attach it to the first series (BTC Price) for better context or use a global approach.
-    
-    # Global markLine for halving dates:
-    mark_line_data = []
-    for d, a in zip(halving_dates, annotations):
-        if d in dates: # Ensure the date exists in the current xAxis data
-             mark_line_data.append({"xAxis": d, "label": {"formatter": a, "position": "insideEndTop"}})
-        else:
-            # Handle cases where halving date might be out of current data range (e.g. future dates)
-            # Optionally, still add it if you want to denote future events, ECharts might just not show it if date is not on axis
-            mark_line_data.append({"xAxis": d, "label": {"formatter": a, "position": "insideEndTop"}})
-
+    # Halving dates outside the current xAxis (e.g. future events) are kept as well;
+    # ECharts simply does not draw a markLine whose date is not on the axis.
+    mark_line_data = [
+        {"xAxis": d, "label": {"formatter": a, "position": "insideEndTop"}}
+        for d, a in zip(halving_dates, annotations)
+    ]
 
     if mark_line_data: # Only add if there are valid marklines
         option["series"][0]["markLine"] = { # Attaching to the first series (BTC Price)
@@ -0,0 +1,81 @@
+'''
+Tail deltas between two published ECharts option dicts.
+
+Every refresh appends (or rewrites the last few) daily points, so each data array of a new
+version is an old array with its tail replaced. A delta records, per array, where the old
+array stops matching and the new tail from there on; applying it is
+`old[:start] + data` on the client.
+
+Servers keep a DeltaBase per superseded version instead of the whole snapshot: per array its
+last TAIL_POINTS values and a digest of everything before them, so the memory a retained
+version costs does not grow with the history.
+'''
+from collections import namedtuple
+
+TAIL_POINTS = 32 # Values kept per array; a refresh rewrites at most the last few candles
+
+# (length of the digested prefix, hash of that prefix, the values after it) per data array,
+# x-axis first; `names` are the series names (a different layout needs a full snapshot)
+DeltaBase = namedtuple("DeltaBase", ["version", "names", "arrays"])
+
+def common_prefix_length(old, new):
+    '''Length of the longest common prefix of two lists.'''
+    n = min(len(old), len(new))
+    if old[:n] == new[:n]:  # common case: pure append, one C-level comparison
+        return n
+    lo, hi = 0, n
+    while lo < hi:  # binary search on prefix equality keeps the comparisons in C
+        mid = (lo + hi + 1) // 2
+        if old[:mid] == new[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def diff_tail(old, new):
+    start = common_prefix_length(old, new)
+    return {"start": start, "data": new[start:]}
+
+def compute_delta(old_options, new_options):
+    '''
+    Returns {"xAxis": tail, "series": [tail, ...]} turning old_options' data into
+    new_options' data, or None when the chart layout changed and a full snapshot is needed.
+    '''
+    old_series = old_options.get("series", [])
+    new_series = new_options.get("series", [])
+    if [s.get("name") for s in old_series] != [s.get("name") for s in new_series]:
+        return None
+    return {
+        "xAxis": diff_tail(old_options["xAxis"]["data"], new_options["xAxis"]["data"]),
+        "series": [diff_tail(o["data"], n["data"]) for o, n in zip(old_series, new_series)]
+    }
+
+def _data_arrays(options):
+    return [options["xAxis"]["data"]] + [s["data"] for s in options.get("series", [])]
+
+def _prefix_hash(values, length):
+    # Bases never leave the process, so the built-in hash is enough (and hashes a list in C)
+    return hash(tuple(values[:length]))
+
+def delta_base(version, options, tail=TAIL_POINTS):
+    '''The part of a version's options compute_delta_since needs to diff a later version against it.'''
+    arrays = []
+    for values in _data_arrays(options):
+        keep = max(len(values) - tail, 0)
+        arrays.append((keep, _prefix_hash(values, keep), list(values[keep:])))
+    return DeltaBase(version, [s.get("name") for s in options.get("series", [])], arrays)
+
+def compute_delta_since(base, new_options):
+    '''
+    compute_delta() from a DeltaBase: the same tails, or None when the layout changed or the
+    new version rewrote values before the kept tail (e.g. backfilled history).
+    '''
+    if [s.get("name") for s in new_options.get("series", [])] != base.names:
+        return None
+    tails = []
+    for (keep, prefix_hash, tail), new in zip(base.arrays, _data_arrays(new_options)):
+        if len(new) < keep or _prefix_hash(new, keep) != prefix_hash:
+            return None
+        start = keep + common_prefix_length(tail, new[keep:keep + len(tail)])
+        tails.append({"start": start, "data": new[start:]})
+    return {"xAxis": tails[0], "series": tails[1:]}
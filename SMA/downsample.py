@@ -0,0 +1,93 @@
+'''
+Point reduction for chart series.
+
+Line series use Largest-Triangle-Three-Buckets, which keeps the visual shape of a line with
+a fixed number of points. Bar series use min/max bucketing so extremes such as the -50%
+drawdown bars are never averaged or skipped away. All selectors return sorted row positions,
+so the series of one chart can share a single category x-axis.
+'''
+import numpy as np
+import pandas as pd
+
+LINE_COLUMNS = ["Close", "SMA_200", "Fear_Greed"]
+BAR_COLUMNS = ["Low_Percentage", "High_Percentage"]
+
+def lttb_indices(y, n_out):
+    '''Positions of the n_out points LTTB keeps from y (NaNs are skipped, x is the row position).'''
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y))
+    if n_out >= len(valid):
+        return valid
+    if n_out < 3:
+        return valid[[0, -1]][:n_out]
+
+    x = valid.astype(float)
+    v = y[valid]
+    # Bucket edges over the points between the fixed first and last one
+    edges = np.linspace(1, len(valid) - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else len(valid)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = v[next_lo:next_hi].mean()
+        areas = np.abs((x[a] - avg_x) * (v[lo:hi] - v[a]) - (x[a] - x[lo:hi]) * (avg_y - v[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    selected[-1] = len(valid) - 1
+    return valid[selected]
+
+def minmax_indices(y, n_out):
+    '''Positions of the minimum and maximum of each of n_out // 2 equal buckets (NaNs skipped).'''
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y))
+    n_buckets = max(n_out // 2, 1)
+    if n_out >= len(valid):
+        return valid
+    v = y[valid]
+    edges = np.linspace(0, len(valid), n_buckets + 1).astype(int)
+    picks = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            picks.append(lo + int(np.argmin(v[lo:hi])))
+            picks.append(lo + int(np.argmax(v[lo:hi])))
+    return valid[np.unique(picks)]
+
+def downsample_frame(frame, max_points, keep=None):
+    '''
+    Rows of `frame` to plot with at most about max_points points: each line/bar column gets an
+    equal share of the budget and the selections are merged. Rows labelled in `keep` (e.g. halving
+    dates that carry markLines) and the first/last row are always included.
+    '''
+    if len(frame) <= max_points:
+        return frame
+    columns = [c for c in LINE_COLUMNS + BAR_COLUMNS if c in frame.columns]
+    budget = max(max_points // max(len(columns), 1), 3)
+
+    positions = [np.array([0, len(frame) - 1])]
+    for column in columns:
+        values = frame[column].to_numpy(dtype=float, na_value=np.nan)
+        selector = minmax_indices if column in BAR_COLUMNS else lttb_indices
+        positions.append(selector(values, budget))
+    if keep is not None:
+        positions.append(np.flatnonzero(frame.index.isin(keep)))
+    return frame.iloc[np.unique(np.concatenate(positions))]
+
+def slice_frame(frame, start=None, end=None):
+    '''Rows whose index date lies in [start, end] (whole days, also for intraday rows); either bound may be None.'''
+    index = frame.index
+    mask = np.ones(len(frame), dtype=bool)
+    if isinstance(index, pd.DatetimeIndex):
+        if start is not None:
+            mask &= np.asarray(index >= pd.Timestamp(start))
+        if end is not None:
+            mask &= np.asarray(index < pd.Timestamp(end) + pd.Timedelta(days=1))
+        return frame[mask]
+    if start is not None:
+        mask &= np.asarray(index >= start)
+    if end is not None:
+        mask &= np.asarray(index <= end)
+    return frame[mask]
@@ -0,0 +1,147 @@
+'''
+Streaming export of processed chart frames as CSV, NDJSON or Parquet.
+
+iter_export() yields the encoded file chunk by chunk (CHUNK_ROWS rows at a time, one Parquet row
+group per chunk), so neither the HTTP endpoint nor the CLI ever holds the whole encoded output.
+Several frames (e.g. one per symbol) can go into one file; each row then carries its Symbol
+and Interval.
+'''
+import io
+
+import pandas as pd
+
+try:
+    import pyarrow as pa  # 可选依赖 - optional, only Parquet exports need it
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from .data_fetcher import is_intraday
+from .data_processor import _format_dates
+from .downsample import slice_frame
+from .metrics import STAGE_ROWS
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet"
+}
+CHUNK_ROWS = 20000
+
+def available_formats():
+    return [f for f in EXPORT_FORMATS if f != "parquet" or pa is not None]
+
+def select_export(frame, start=None, end=None, columns=None):
+    '''
+    Rows of `frame` in [start, end] (dates, either may be None) with the given columns in the
+    given order (all when None). Raises ValueError for unknown columns.
+    '''
+    if columns:
+        unknown = [c for c in columns if c not in frame.columns]
+        if unknown:
+            raise ValueError(f"Unknown columns {', '.join(unknown)}; available: {', '.join(frame.columns)}")
+        frame = frame[list(columns)]
+    return slice_frame(frame, start, end)
+
+def _chunks(frames):
+    '''(symbol, interval, rows) for every CHUNK_ROWS slice of the (symbol, interval, frame) triples.'''
+    for symbol, interval, frame in frames:
+        for start in range(0, len(frame), CHUNK_ROWS):
+            yield symbol, interval, frame.iloc[start:start + CHUNK_ROWS]
+
+def _records(symbol, interval, rows, tagged):
+    '''Chunk as a plain frame: formatted Date first, then Symbol/Interval when several pairs are exported.'''
+    columns = {"Date": _format_dates(rows.index, is_intraday(interval))}
+    if tagged:
+        columns["Symbol"] = symbol
+        columns["Interval"] = interval
+    for column in rows.columns:
+        # Categorical Fear & Greed classes stay categorical: labels in CSV/NDJSON, a dictionary
+        # column with the same type in every Parquet row group
+        columns[column] = rows[column].array
+    return pd.DataFrame(columns)
+
+def _iter_csv(frames, tagged):
+    header = True
+    for symbol, interval, rows in _chunks(frames):
+        yield _records(symbol, interval, rows, tagged).to_csv(index=False, header=header, lineterminator="\n").encode("utf-8")
+        header = False
+        STAGE_ROWS.inc(len(rows), stage="export")
+
+def _iter_ndjson(frames, tagged):
+    for symbol, interval, rows in _chunks(frames):
+        lines = _records(symbol, interval, rows, tagged).to_json(orient="records", lines=True)
+        if lines and not lines.endswith("\n"):
+            lines += "\n"  # older pandas versions omit the last line break
+        yield lines.encode("utf-8")
+        STAGE_ROWS.inc(len(rows), stage="export")
+
+
+class _ChunkSink(io.RawIOBase):
+    '''Write-only stream collecting what the Parquet writer produced since the last drain().'''
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+def _iter_parquet(frames, tagged):
+    if pa is None:
+        raise RuntimeError("Parquet export needs the 'pyarrow' package (pip install pyarrow).")
+    sink = _ChunkSink()
+    writer = None
+    try:
+        for symbol, interval, rows in _chunks(frames):
+            records = _records(symbol, interval, rows, tagged)
+            if writer is None:
+                table = pa.Table.from_pandas(records, preserve_index=False)
+                writer = pq.ParquetWriter(sink, table.schema, compression="zstd")
+            else:
+                # Later chunks (and pairs) are cast to the schema of the first one
+                table = pa.Table.from_pandas(records, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)  # one row group per chunk
+            STAGE_ROWS.inc(len(rows), stage="export")
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+def iter_export(frames, format="csv"):
+    '''
+    Encoded chunks of an export of `frames`, a list of (symbol, interval, frame) triples.
+    Frames are written in the given order; with more than one, every row gets Symbol and Interval.
+    '''
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {format!r}; available: {', '.join(EXPORT_FORMATS)}")
+    frames = list(frames)
+    tagged = len(frames) > 1
+    encoder = {"csv": _iter_csv, "ndjson": _iter_ndjson, "parquet": _iter_parquet}[format]
+    for chunk in encoder(frames, tagged):
+        if chunk:
+            yield chunk
+
+def write_export(frames, path_or_file, format="csv"):
+    '''Writes an export to a path or binary file object, chunk by chunk. Returns the number of bytes written.'''
+    if isinstance(path_or_file, (str, bytes)) or hasattr(path_or_file, "__fspath__"):
+        with open(path_or_file, "wb") as f:
+            return write_export(frames, f, format)
+    written = 0
+    for chunk in iter_export(frames, format):
+        path_or_file.write(chunk)
+        written += len(chunk)
+    return written
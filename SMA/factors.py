@@ -0,0 +1,260 @@
+'''
+Pluggable indicator registry for the multi-factor chart (多因子).
+
+An indicator is requested with a spec string "<name>" or "<name>:<window>", e.g. "sma:50",
+"ema:21", "mayer:200", "vol:30", "rsi:14", "drawdown", "zscore:200". compute_indicators()
+evaluates any set of specs over a candle frame in one NumPy pass: every spec reads its inputs
+from a shared FactorContext, whose RollingKernel builds one cumulative sum (and one cumulative
+sum of squares) per input series and caches rolling means, deviations and EMAs by window, so
+"sma:200", "mayer:200" and "zscore:200" share the same rolling buffers.
+
+New indicators are added with @register_indicator. Inputs are assumed to be gap-free candles
+without missing closes, as get_klines returns them.
+'''
+import math
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .data_fetcher import INTERVAL_MS
+from .metrics import STAGE_SECONDS, STAGE_ROWS
+
+# axis: which chart axis the series belongs on - "price" (price scale), "percent" (百分比 axis),
+# "oscillator" (0-100, shared with the Fear & Greed axis) or "ratio" (a separate factor axis)
+Indicator = namedtuple("Indicator", ["name", "func", "column", "axis", "default_window", "label"])
+
+INDICATORS = {}
+MAX_WINDOW = 5000
+_SPEC_RE = re.compile(r"^([a-z_]+)(?::(\d+))?$")
+
+def register_indicator(name, column, axis, default_window=None, label=None):
+    '''
+    Decorator registering func(context, window) -> ndarray under `name`.
+    `column` is the output column name, formatted with {window}; label is the legend text.
+    '''
+    def decorator(func):
+        INDICATORS[name] = Indicator(name, func, column, axis, default_window, label or column)
+        return func
+    return decorator
+
+def parse_indicator_spec(spec):
+    '''(name, window) from a spec string such as "sma:50". Raises ValueError.'''
+    match = _SPEC_RE.match(spec.strip().lower())
+    if match is None or match.group(1) not in INDICATORS:
+        raise ValueError(f"Unknown indicator {spec!r}; available: {', '.join(sorted(INDICATORS))}")
+    indicator = INDICATORS[match.group(1)]
+    if indicator.default_window is None:
+        if match.group(2) is not None:
+            raise ValueError(f"Indicator {indicator.name!r} takes no window")
+        return indicator.name, None
+    window = int(match.group(2)) if match.group(2) else indicator.default_window
+    if not 2 <= window <= MAX_WINDOW:
+        raise ValueError(f"Window of {spec!r} must be between 2 and {MAX_WINDOW}")
+    return indicator.name, window
+
+def parse_indicator_specs(text):
+    '''Parses a comma separated list of specs; duplicates are dropped, order is kept.'''
+    specs = []
+    for part in text.split(","):
+        if part.strip():
+            spec = parse_indicator_spec(part)
+            if spec not in specs:
+                specs.append(spec)
+    return specs
+
+def indicator_column(name, window):
+    return INDICATORS[name].column.format(window=window)
+
+def indicator_label(name, window):
+    return INDICATORS[name].label.format(window=window)
+
+def indicator_axis(name):
+    return INDICATORS[name].axis
+
+
+class RollingKernel:
+    '''
+    Rolling statistics of one series from shared prefix sums.
+
+    The series is shifted by its first value before summing, which keeps the prefix sums (and
+    the cancellation in rolling variances) small for price-like data. Every statistic is cached
+    by window, so indicators asking for the same window reuse the same arrays.
+    '''
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=float)
+        self._shift = self.values[0] if len(self.values) else 0.0
+        self._csum = None
+        self._csum2 = None
+        self._cache = {}
+
+    def _prefix_sums(self):
+        if self._csum is None:
+            shifted = self.values - self._shift
+            self._csum = np.concatenate(([0.0], np.cumsum(shifted)))
+            self._csum2 = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+        return self._csum, self._csum2
+
+    def _window_sums(self, window):
+        csum, csum2 = self._prefix_sums()
+        out, out2 = np.full(len(self.values), np.nan), np.full(len(self.values), np.nan)
+        if window <= len(self.values):
+            out[window - 1:] = csum[window:] - csum[:-window]
+            out2[window - 1:] = csum2[window:] - csum2[:-window]
+        return out, out2
+
+    def mean(self, window):
+        '''Rolling mean over `window` rows (NaN until the window is full), like rolling(window).mean().'''
+        key = ("mean", window)
+        if key not in self._cache:
+            sums, _ = self._window_sums(window)
+            self._cache[key] = sums / window + self._shift
+        return self._cache[key]
+
+    def std(self, window):
+        '''Rolling sample standard deviation (ddof=1), like rolling(window).std().'''
+        key = ("std", window)
+        if key not in self._cache:
+            sums, sums2 = self._window_sums(window)
+            var = (sums2 - sums * sums / window) / (window - 1)
+            self._cache[key] = np.sqrt(np.maximum(var, 0.0))
+        return self._cache[key]
+
+    def ema(self, alpha, min_periods=1):
+        '''
+        Exponential moving average y[t] = alpha * x[t] + (1 - alpha) * y[t-1], like
+        ewm(alpha=alpha, adjust=False).mean(). Evaluated block-wise in closed form: inside a
+        block the recursion is a scaled prefix sum, with the block length chosen so the
+        decay factors stay within four orders of magnitude. Very short spans use a truncated
+        FIR filter instead, which avoids thousands of tiny blocks.
+        '''
+        key = ("ema", alpha, min_periods)
+        if key in self._cache:
+            return self._cache[key]
+        x = self.values
+        out = np.empty(len(x))
+        decay = 1.0 - alpha
+        block = len(x) if decay <= 0.0 else max(1, int(4 / -math.log10(decay)))
+        if len(x) and block < 64:
+            # 短窗口 - fast decay: older values vanish below float precision after a few dozen
+            # rows, so a truncated FIR filter plus the decaying seed term is exact to rounding
+            taps = alpha * decay ** np.arange(max(1, math.ceil(17 / -math.log10(decay))) if decay > 0.0 else 1)
+            out[:] = np.convolve(x, taps)[:len(x)] + x[0] * decay ** (np.arange(len(x)) + 1.0)
+        elif len(x):
+            powers = decay ** np.arange(block + 1)
+            inverse = 1.0 / powers[:block]
+            previous = x[0]  # seeding with x[0] makes y[0] = x[0]
+            start = 0
+            while start < len(x):
+                chunk = x[start:start + block]
+                k = len(chunk)
+                weighted = np.cumsum(alpha * chunk * inverse[:k]) * powers[:k]
+                out[start:start + k] = weighted + previous * powers[1:k + 1]
+                previous = out[start + k - 1]
+                start += k
+        out[:min_periods - 1] = np.nan
+        self._cache[key] = out
+        return out
+
+
+class FactorContext:
+    '''
+    Shared inputs of one compute_indicators() call: one RollingKernel per derived series,
+    created on first use. SMA columns already on the frame (the incremental SMA_200) are reused.
+    '''
+
+    def __init__(self, frame, interval="1d"):
+        self.frame = frame
+        self.interval = interval
+        self.close = frame["Close"].to_numpy(dtype=float)
+        self._kernels = {}
+
+    def kernel(self, series):
+        if series not in self._kernels:
+            if series == "close":
+                values = self.close
+            elif series == "log_return":
+                values = np.diff(np.log(self.close))
+            elif series in ("gain", "loss"):
+                change = np.diff(self.close)
+                values = np.maximum(change, 0.0) if series == "gain" else np.maximum(-change, 0.0)
+            else:
+                raise KeyError(series)
+            self._kernels[series] = RollingKernel(values)
+        return self._kernels[series]
+
+    def sma(self, window):
+        column = f"SMA_{window}"
+        if column in self.frame.columns:
+            return self.frame[column].to_numpy(dtype=float)
+        return self.kernel("close").mean(window)
+
+    @property
+    def periods_per_year(self):
+        return periods_per_year(self.interval)
+
+def periods_per_year(interval):
+    # 加密货币全年交易 - crypto trades around the clock, every day of the year
+    return 365 * INTERVAL_MS["1d"] / INTERVAL_MS[interval]
+
+def _lagged(values):
+    '''Series computed on first differences are one row shorter; realign them with the candles.'''
+    return np.concatenate(([np.nan], values))
+
+@register_indicator("sma", "SMA_{window}", "price", default_window=50, label="SMA{window}")
+def _sma(context, window):
+    return context.sma(window)
+
+@register_indicator("ema", "EMA_{window}", "price", default_window=21, label="EMA{window}")
+def _ema(context, window):
+    return context.kernel("close").ema(2.0 / (window + 1))
+
+@register_indicator("mayer", "Mayer_{window}", "ratio", default_window=200, label="Mayer倍数({window})")
+def _mayer(context, window):
+    return context.close / context.sma(window)
+
+@register_indicator("vol", "Volatility_{window}", "percent", default_window=30, label="年化波动率({window})")
+def _volatility(context, window):
+    std = context.kernel("log_return").std(window)
+    return _lagged(std * np.sqrt(context.periods_per_year) * 100)
+
+@register_indicator("rsi", "RSI_{window}", "oscillator", default_window=14, label="RSI{window}")
+def _rsi(context, window):
+    # Wilder 平滑 - Wilder's smoothing is an EMA with alpha = 1 / window
+    gain = context.kernel("gain").ema(1.0 / window, min_periods=window)
+    loss = context.kernel("loss").ema(1.0 / window, min_periods=window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(loss == 0.0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    rsi[np.isnan(gain) | np.isnan(loss)] = np.nan
+    return _lagged(rsi)
+
+@register_indicator("drawdown", "Drawdown", "percent", label="距最高点回撤")
+def _drawdown(context, window):
+    return (context.close / np.maximum.accumulate(context.close) - 1.0) * 100
+
+@register_indicator("zscore", "ZScore_{window}", "ratio", default_window=200, label="Z分数({window})")
+def _zscore(context, window):
+    kernel = context.kernel("close")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (context.close - context.sma(window)) / kernel.std(window)
+
+def compute_indicators(frame, specs, interval="1d"):
+    '''
+    Evaluates parsed `specs` ([(name, window)]) over `frame` (needs Close) and returns the
+    indicator columns as a new frame with the same index. Columns already on the frame are
+    taken as they are.
+    '''
+    with STAGE_SECONDS.time(stage="factors"):
+        context = FactorContext(frame, interval)
+        columns = {}
+        for name, window in specs:
+            column = indicator_column(name, window)
+            if column in frame.columns:
+                columns[column] = frame[column].to_numpy(dtype=float)
+            elif column not in columns:
+                columns[column] = INDICATORS[name].func(context, window)
+        result = pd.DataFrame(columns, index=frame.index)
+    STAGE_ROWS.inc(len(frame) * len(columns), stage="factors")
+    return result
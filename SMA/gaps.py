@@ -0,0 +1,165 @@
+'''
+Integrity pass over the candle store: gaps and duplicates in the stored history, and a backfill
+that requests only the missing ranges.
+
+The store's primary key rules out two rows with the same open time, but candles off the
+interval grid (another alignment, an interval that was changed, a shifted import) still put two
+candles into one interval slot - and two rows on the same date into the chart frame.
+check_candles() reports those as duplicates, and every run of missing open times between the
+first and the last stored candle as a gap. repair_candles() deletes the duplicates and fetches
+the gaps with parallel range requests of at most REQUEST_CANDLES candles each, all drawing on
+the shared Binance weight budget (binance_limiter). Every repair is recorded in the
+kline_repairs table; gaps the exchange has no candles for (outages) are recorded with
+repaired=0 and skipped by later passes.
+
+    python -m SMA.gaps --pairs BTCUSDT:1d,BTCUSDT:1h --workers 4
+'''
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import data_fetcher
+from .candle_store import delete_klines, load_open_times, load_unfillable_gaps, record_repairs, upsert_klines
+from .data_fetcher import INTERVAL_MS
+from .metrics import STAGE_SECONDS, STAGE_ROWS
+
+logger = logging.getLogger(__name__)
+
+REQUEST_CANDLES = 1000  # /api/v3/klines page limit
+DEFAULT_WORKERS = 4
+
+def _grid_offset(open_times, interval_ms):
+    '''Open time modulo the interval shared by most candles: the grid the history is on.'''
+    residues, counts = np.unique(open_times % interval_ms, return_counts=True)
+    return residues[np.argmax(counts)]
+
+def find_duplicates(open_times, interval):
+    '''Open times off the interval grid of the history, i.e. extra candles inside another candle's slot.'''
+    open_times = np.asarray(open_times, dtype=np.int64)
+    if len(open_times) == 0:
+        return open_times
+    interval_ms = INTERVAL_MS[interval]
+    return open_times[open_times % interval_ms != _grid_offset(open_times, interval_ms)]
+
+def find_gaps(open_times, interval):
+    '''
+    (first, last) missing open times of every hole between the first and the last of the sorted
+    `open_times`; candles off the grid are ignored.
+    '''
+    open_times = np.asarray(open_times, dtype=np.int64)
+    interval_ms = INTERVAL_MS[interval]
+    if len(open_times):
+        open_times = open_times[open_times % interval_ms == _grid_offset(open_times, interval_ms)]
+    holes = np.flatnonzero(np.diff(open_times) > interval_ms)
+    return [(int(open_times[i]) + interval_ms, int(open_times[i + 1]) - interval_ms) for i in holes]
+
+def check_candles(symbol, interval, path=None):
+    '''Integrity report of the stored history: candle count, duplicate open times and gaps.'''
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"Unsupported interval: {interval}")
+    with STAGE_SECONDS.time(stage="integrity"):
+        open_times = load_open_times(symbol, interval, path)
+        interval_ms = INTERVAL_MS[interval]
+        gaps = [
+            {"start": start, "end": end, "candles": (end - start) // interval_ms + 1}
+            for start, end in find_gaps(open_times, interval)
+        ]
+        report = {
+            "symbol": symbol,
+            "interval": interval,
+            "candles": len(open_times),
+            "duplicates": find_duplicates(open_times, interval).tolist(),
+            "gaps": gaps,
+            "missing": sum(g["candles"] for g in gaps)
+        }
+    STAGE_ROWS.inc(len(open_times), stage="integrity")
+    return report
+
+def _split(gaps, interval_ms):
+    '''(start, end) open time ranges of at most REQUEST_CANDLES candles covering the gaps.'''
+    for start, end in gaps:
+        for first in range(start, end + 1, REQUEST_CANDLES * interval_ms):
+            yield first, min(first + (REQUEST_CANDLES - 1) * interval_ms, end)
+
+def _fetch_range(symbol, interval, start, end):
+    '''On-grid candles with start <= open time <= end.'''
+    interval_ms = INTERVAL_MS[interval]
+    klines = data_fetcher._fetch_klines(symbol, interval, start, end + interval_ms - 1, limit=REQUEST_CANDLES)
+    return [k for k in klines if start <= k[0] <= end and (k[0] - start) % interval_ms == 0]
+
+def repair_candles(symbol, interval, path=None, workers=DEFAULT_WORKERS, retry_known=False):
+    '''
+    Deletes duplicate candles and backfills the gaps of the stored history (see the module
+    docstring). Gaps already recorded as unfillable are skipped unless `retry_known`.
+    Returns the repair records written to kline_repairs.
+    '''
+    report = check_candles(symbol, interval, path)
+    interval_ms = INTERVAL_MS[interval]
+    now = int(time.time() * 1000)
+    repairs = []
+
+    if report["duplicates"]:
+        delete_klines(report["duplicates"], symbol, interval, path)
+        repairs.extend(
+            {"symbol": symbol, "interval": interval, "kind": "duplicate", "start_time": t, "end_time": t,
+             "candles": 1, "repaired": 1, "repaired_at": now}
+            for t in report["duplicates"]
+        )
+
+    gaps = [(g["start"], g["end"]) for g in report["gaps"]]
+    if gaps and not retry_known:
+        unfillable = load_unfillable_gaps(symbol, interval, path)
+        gaps = [gap for gap in gaps if gap not in unfillable]
+
+    if gaps:
+        ranges = list(_split(gaps, interval_ms))
+        with STAGE_SECONDS.time(stage="backfill"):
+            if workers and workers > 1 and len(ranges) > 1:
+                # Threads: the requests wait on the network; binance_limiter paces all of them
+                with ThreadPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+                    pages = list(pool.map(lambda r: _fetch_range(symbol, interval, *r), ranges))
+            else:
+                pages = [_fetch_range(symbol, interval, *r) for r in ranges]
+            klines = [k for page in pages for k in page]
+            upsert_klines(klines, symbol, interval, path)
+        STAGE_ROWS.inc(len(klines), stage="backfill")
+
+        fetched = np.sort(np.array([k[0] for k in klines], dtype=np.int64))
+        for start, end in gaps:
+            filled = int(np.searchsorted(fetched, end, side="right") - np.searchsorted(fetched, start, side="left"))
+            repairs.append({"symbol": symbol, "interval": interval, "kind": "gap", "start_time": start, "end_time": end,
+                            "candles": (end - start) // interval_ms + 1, "repaired": filled, "repaired_at": now})
+
+    record_repairs(repairs, path)
+    if repairs:
+        logger.info(
+            f"Repaired {symbol} {interval}: {len(report['duplicates'])} duplicates removed, "
+            f"{sum(r['repaired'] for r in repairs if r['kind'] == 'gap')} of {report['missing']} missing candles backfilled"
+        )
+    return repairs
+
+if __name__ == "__main__":
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description="Find and repair gaps and duplicates in the local candle store.")
+    parser.add_argument("--pairs", default="BTCUSDT:1d", help="comma separated SYMBOL:INTERVAL pairs")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="parallel range requests")
+    parser.add_argument("--check", action="store_true", help="only report, do not repair")
+    parser.add_argument("--retry-known", action="store_true", help="also retry gaps recorded as unfillable")
+    parser.add_argument("--store", help="candle store path (default: SMA/output/candles.sqlite)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    for pair in args.pairs.split(","):
+        symbol, interval = pair.strip().upper().split(":")[0], pair.strip().split(":")[1]
+        report = check_candles(symbol, interval, args.store)
+        print(f"{symbol} {interval}: {report['candles']} candles, {len(report['duplicates'])} duplicates, "
+              f"{len(report['gaps'])} gaps ({report['missing']} missing candles)")
+        for gap in report["gaps"]:
+            print(f"  {datetime.fromtimestamp(gap['start'] / 1000)} - {datetime.fromtimestamp(gap['end'] / 1000)}: {gap['candles']}")
+        if not args.check:
+            repairs = repair_candles(symbol, interval, args.store, args.workers, args.retry_known)
+            print(f"  {sum(r['repaired'] for r in repairs)} candles repaired")
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) 超时秒数 - a hung socket must never stall the scheduler job
+DEFAULT_TIMEOUT = (5, 20)
+
+_session = None
+_session_lock = threading.Lock()
+
+def _build_session():
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,  # 0.5s, 1s, 2s between attempts
+        status_forcelist=(429, 500, 502, 503, 504),  # not 418: an IP ban only gets longer when retried
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_session():
+    '''Returns the process-wide pooled keep-alive session shared by all data sources.'''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+class BinanceWeightLimiter:
+    '''
+    Client-side view of Binance's per-minute request weight budget.
+
+    The budget resets on clock-minute boundaries. acquire() blocks only when the next request
+    would push the used weight over the budget; update() resyncs with the X-MBX-USED-WEIGHT-1M
+    header the server returns.
+    '''
+
+    def __init__(self, limit=6000, safety=0.8):
+        self.budget = int(limit * safety)
+        self.used = 0
+        self.minute = int(time.time() // 60)
+        self._lock = threading.Lock()
+
+    def _roll(self, now):
+        minute = int(now // 60)
+        if minute != self.minute:
+            self.minute = minute
+            self.used = 0
+
+    def acquire(self, weight):
+        while True:
+            with self._lock:
+                now = time.time()
+                self._roll(now)
+                if self.used + weight <= self.budget:
+                    self.used += weight
+                    return
+                wait = (self.minute + 1) * 60 - now
+            logger.info(f"Binance weight budget exhausted ({self.used}/{self.budget}), waiting {wait:.1f}s")
+            time.sleep(wait)
+
+    def update(self, response):
+        used = response.headers.get("X-MBX-USED-WEIGHT-1M")
+        if used is None:
+            return
+        with self._lock:
+            self._roll(time.time())
+            self.used = max(self.used, int(used))
+
+
+binance_limiter = BinanceWeightLimiter()
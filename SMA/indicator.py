@@ -1,3 +1,13 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from .metrics import STAGE_SECONDS, STAGE_ROWS, record_cache
+
+SMA_WINDOW = 200
+
 def calculate_percentages(data):
     # 计算200日SMA
     data['SMA_200'] = data['Close'].rolling(window=200).mean()
@@ -10,4 +20,150 @@ def calculate_percentages(data):
     data['High_Percentage'] = (data['High'] - data['SMA_200']) / data['SMA_200'] * 100
     data.loc[data['High_Percentage'] < 0, 'High_Percentage'] = 0  # 只保留正值
     
-    return data
\ No newline at end of file
+    return data
+
+
+class RollingMeanState:
+    '''
+    Running state of a fixed-window rolling mean.
+
+    Mirrors the add/remove steps of pandas' rolling(window).mean() kernel (Kahan-compensated
+    running sum, separate compensation for added and removed values), so pushing values one by
+    one yields bit-identical results to recomputing the whole column with pandas.
+    '''
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.nobs = 0
+        self.neg_ct = 0
+        self.num_consecutive_same_value = 0
+        self.prev_value = None
+
+    def copy(self):
+        other = RollingMeanState(self.window)
+        other.values = deque(self.values, maxlen=self.window)
+        other.sum_x = self.sum_x
+        other.compensation_add = self.compensation_add
+        other.compensation_remove = self.compensation_remove
+        other.nobs = self.nobs
+        other.neg_ct = self.neg_ct
+        other.num_consecutive_same_value = self.num_consecutive_same_value
+        other.prev_value = self.prev_value
+        return other
+
+    def push(self, val):
+        '''Adds the next value, drops the one leaving the window and returns the current mean.'''
+        if self.prev_value is None:
+            self.prev_value = val
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if not math.isnan(old):
+                self.nobs -= 1
+                y = -old - self.compensation_remove
+                t = self.sum_x + y
+                self.compensation_remove = t - self.sum_x - y
+                self.sum_x = t
+                if math.copysign(1.0, old) < 0:
+                    self.neg_ct -= 1
+        self.values.append(val)
+
+        if not math.isnan(val):
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            if val == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = val
+
+        if self.nobs < self.window or self.nobs == 0:
+            return math.nan
+        if self.num_consecutive_same_value >= self.nobs:
+            return self.prev_value
+        result = self.sum_x / self.nobs
+        if self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+
+class IndicatorState:
+    '''
+    Incremental state for update_percentages, kept next to the processed frame it belongs to.
+
+    Only closed candles are committed: the last row of every update may still be an open candle
+    that gets re-fetched, so it is computed from a throwaway copy of the rolling state.
+    '''
+
+    def __init__(self, window=SMA_WINDOW):
+        self.window = window
+        self.rolling = RollingMeanState(window)
+        self.position = 0        # number of committed rows
+        self.last_label = None   # index label of the last committed row
+
+    def can_extend(self, candles):
+        if self.position == 0:
+            return True
+        if len(candles) < self.position:
+            return False
+        return candles.index[self.position - 1] == self.last_label
+
+
+def update_percentages(candles, previous=None, state=None, window=SMA_WINDOW):
+    '''
+    Incremental counterpart of calculate_percentages.
+
+    `candles` is the full current candle frame (Low/High/Close), `previous` and `state` are what
+    the last call returned. Only rows after the committed position are recomputed, so appending
+    N candles costs O(N) indicator work; the output equals calculate_percentages(candles.copy()).
+    Falls back to a full pass when there is no state or the committed history no longer lines up.
+    Returns (processed frame, state).
+    '''
+    with STAGE_SECONDS.time(stage="indicators"):
+        processed, state, computed = _update_percentages(candles, previous, state, window)
+    STAGE_ROWS.inc(computed, stage="indicators")
+    return processed, state
+
+def _update_percentages(candles, previous, state, window):
+    reuse = previous is not None and state is not None and state.window == window and state.can_extend(candles)
+    record_cache("indicator_state", reuse)
+    if not reuse:
+        state = IndicatorState(window)
+        head = None
+    else:
+        head = previous.iloc[:state.position]
+
+    start = state.position
+    tail = candles.iloc[start:].copy()
+    closes = tail['Close'].to_numpy(dtype=float)
+
+    sma = np.empty(len(closes))
+    commit = len(closes) - 1
+    for i, val in enumerate(closes[:commit]):
+        sma[i] = state.rolling.push(float(val))
+    if commit >= 0:
+        # 最后一根K线可能未收盘 - the last candle may still be open, do not commit it
+        sma[commit] = state.rolling.copy().push(float(closes[commit]))
+        state.position = start + commit
+        state.last_label = candles.index[state.position - 1] if state.position else None
+
+    low = tail['Low'].to_numpy(dtype=float)
+    high = tail['High'].to_numpy(dtype=float)
+    low_pct = -1 * (sma - low) / sma * 100
+    high_pct = (high - sma) / sma * 100
+    tail['SMA_200'] = sma
+    tail['Low_Percentage'] = np.where(low_pct > 0, 0.0, low_pct)  # 只保留负值
+    tail['High_Percentage'] = np.where(high_pct < 0, 0.0, high_pct)  # 只保留正值
+
+    processed = tail if head is None or head.empty else pd.concat([head, tail])
+    return processed, state, len(tail)
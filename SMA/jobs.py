@@ -0,0 +1,86 @@
+import datetime
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class UpdateJobQueue:
+    '''
+    Runs data refreshes in the background, on its own worker thread or on a shared executor.
+
+    Submitting while a refresh is queued or running returns that job instead of starting
+    another one, so manual POSTs and the scheduler never race each other. Finished jobs are
+    kept (up to max_jobs) so their status can still be polled. Keyword `params` given to submit()
+    are passed on to func, and whatever func returns is kept as the job's result.
+    '''
+
+    def __init__(self, func, max_jobs=100, executor=None):
+        self._func = func
+        self._max_jobs = max_jobs
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="update")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active_id = None
+
+    def submit(self, source="manual", **params):
+        '''
+        Returns (job, coalesced); job is a snapshot dict of the queued or already active job.
+        When coalesced, `params` are ignored and the active job runs as it was submitted.
+        '''
+        with self._lock:
+            if self._active_id is not None:
+                return dict(self._jobs[self._active_id]), True
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "source": source,
+                "params": params,
+                "status": "queued",
+                "stage": None,
+                "error": None,
+                "submitted_at": datetime.datetime.now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None
+            }
+            self._active_id = job_id
+            while len(self._jobs) > self._max_jobs:
+                self._jobs.popitem(last=False)
+            job = dict(self._jobs[job_id])
+
+        self._executor.submit(self._run, job_id, params)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _set(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, params):
+        self._set(job_id, status="running", started_at=datetime.datetime.now().isoformat())
+        try:
+            result = self._func(progress=lambda stage: self._set(job_id, stage=stage), **params)
+        except Exception as e:
+            logger.error(f"Update job {job_id} failed: {e}", exc_info=True)
+            self._set(job_id, status="failed", error=str(e))
+        else:
+            self._set(job_id, status="succeeded", result=result)
+        finally:
+            with self._lock:
+                self._jobs[job_id]["finished_at"] = datetime.datetime.now().isoformat()
+                if self._active_id == job_id:
+                    self._active_id = None
+
+    def shutdown(self):
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
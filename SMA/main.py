@@ -1,22 +1,75 @@
-from data_fetcher import get_btc_data, get_fear_greed_index
-from indicator import calculate_percentages
-# from visualizer import plot_btc_analysis
-from visualizer_echarts import plot_btc_analysis
-def main():
-    # 获取数据
-    data = get_btc_data()
-    # 获取恐慌指数数据
-    fear_greed_data = get_fear_greed_index()
-    # 计算百分比
-    data = calculate_percentages(data)
-    # 合并恐慌指数数据（按索引对齐）
-    data = data.join(fear_greed_data, how='left')
-    data.rename(columns={
-        'value': 'Fear_Greed',
-        'value_classification': 'Fear_Greed_Class'
-    }, inplace=True)
-    # 绘制图表
-    plot_btc_analysis(data)
+'''
+Command line entry point, run from the project root:
+
+    python -m SMA.main                  # ECharts report of BTCUSDT 1d
+    python -m SMA.main report --pairs BTCUSDT:1d,ETHUSDT:1d --ranges all,1y,90d --indicators "" --indicators sma:50,rsi:14 --workers 4
+    python -m SMA.main export --pairs BTCUSDT:1d,ETHUSDT:1d --format parquet --output history.parquet
+'''
+import argparse
+import datetime
+import os
+import sys
+
+def main(pairs=(("BTCUSDT", "1d"),), ranges=("all",), indicator_sets=("",), output_dir=None, workers=None):
+    '''
+    Writes the standalone ECharts reports for every pair, range and indicator set (see
+    SMA.visualizer_echarts.generate_reports). Candles come from the local candle store.
+    '''
+    from .visualizer_echarts import generate_reports, DEFAULT_REPORT_DIR
+    output_dir = output_dir or DEFAULT_REPORT_DIR
+    reports = generate_reports(list(pairs), ranges, indicator_sets, output_dir, workers)
+    print(f"Wrote {len(reports)} reports to {output_dir} (index.html lists them)", file=sys.stderr)
+    return reports
+
+def export(pairs, output, export_format="csv", start=None, end=None, columns=None):
+    '''
+    Streams the processed data of (symbol, interval) pairs to `output` (a path, or "-" for stdout).
+    Candles come from the local candle store, only new ones are downloaded.
+    '''
+    from .data_processor import get_processed_data
+    from .export import select_export, write_export
+    frames = [
+        (symbol, interval, select_export(get_processed_data(symbol, interval), start, end, columns))
+        for symbol, interval in pairs
+    ]
+    if output == "-":
+        written = write_export(frames, sys.stdout.buffer, export_format)
+        sys.stdout.buffer.flush()
+    else:
+        written = write_export(frames, output, export_format)
+    print(f"Exported {sum(len(f) for _, _, f in frames)} rows ({written} bytes) to {output}", file=sys.stderr)
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="BTC multi-factor analysis.")
+    commands = parser.add_subparsers(dest="command")
+    report_parser = commands.add_parser("report", help="write standalone ECharts reports (default)")
+    report_parser.add_argument("--pairs", default="BTCUSDT:1d", help="comma separated SYMBOL:INTERVAL pairs")
+    report_parser.add_argument("--ranges", default="all", help="comma separated ranges: all, 90d/6m/1y back from the last candle, START:END")
+    report_parser.add_argument("--indicators", action="append", help="indicator set such as sma:50,rsi:14, repeat for several reports per range")
+    report_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes rendering the reports")
+    report_parser.add_argument("--output-dir", help="output directory (default: SMA/output/reports)")
+    export_parser = commands.add_parser("export", help="export processed data as CSV, NDJSON or Parquet")
+    export_parser.add_argument("--pairs", default="BTCUSDT:1d", help="comma separated SYMBOL:INTERVAL pairs")
+    export_parser.add_argument("--format", default="csv", choices=["csv", "ndjson", "parquet"])
+    export_parser.add_argument("--start", type=datetime.date.fromisoformat, help="first date, YYYY-MM-DD")
+    export_parser.add_argument("--end", type=datetime.date.fromisoformat, help="last date, YYYY-MM-DD")
+    export_parser.add_argument("--columns", help="comma separated columns (default: all)")
+    export_parser.add_argument("--output", default="-", help="output file, - for stdout")
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in ("report", "export", "-h", "--help"):
+        argv.insert(0, "report")  # report is the default command
+    return parser.parse_args(argv)
+
+def _parse_pairs(text):
+    return [(p.split(":")[0].strip().upper(), p.split(":")[1].strip()) for p in text.split(",") if p.strip()]
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = _parse_args()
+    if args.command == "export":
+        export(
+            _parse_pairs(args.pairs), args.output, args.format, args.start, args.end,
+            [c.strip() for c in args.columns.split(",")] if args.columns else None
+        )
+    else:
+        main(_parse_pairs(args.pairs), [r.strip() for r in args.ranges.split(",") if r.strip()],
+             args.indicators or [""], args.output_dir, args.workers)
@@ -0,0 +1,206 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus 文本格式的进程内指标 - in-process counters and histograms rendered in the Prometheus
+# text exposition format. Each worker process has its own registry.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+class Counter(_Metric):
+    '''Monotonically increasing count, one series per label combination.'''
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+class Gauge(_Metric):
+    '''Last set value, one series per label combination.'''
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+class Histogram(_Metric):
+    '''Cumulative-bucket histogram of observed values (latencies in seconds, sizes in bytes).'''
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        '''Observes the wall time of the with-block, also when it raises.'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry["count"] if entry else 0
+
+    def _render_samples(self, items):
+        lines = []
+        for key, entry in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, entry["counts"]):
+                cumulative += n
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(entry['sum'])}")
+            lines.append(f"{self.name}_count{labels} {entry['count']}")
+        return lines
+
+def render_metrics():
+    '''All registered metrics in the Prometheus text exposition format (version 0.0.4).'''
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def reset_metrics():
+    '''Clears every recorded sample (tests).'''
+    with _registry_lock:
+        metrics = list(_registry)
+    for metric in metrics:
+        metric.reset()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 数据管道指标 - pipeline metrics shared by SMA.data_fetcher, SMA.indicator, SMA.data_processor and server.py
+HTTP_CLIENT_REQUESTS = Counter(
+    "btc_http_client_requests_total", "Upstream API requests by source and HTTP status.", ("source", "status"))
+HTTP_CLIENT_SECONDS = Histogram(
+    "btc_http_client_request_seconds", "Upstream API request latency by source.", ("source",))
+STAGE_SECONDS = Histogram(
+    "btc_pipeline_stage_seconds", "Wall time of each refresh pipeline stage.", ("stage",))
+STAGE_ROWS = Counter(
+    "btc_pipeline_rows_total", "Rows processed by each refresh pipeline stage.", ("stage",))
+CACHE_REQUESTS = Counter(
+    "btc_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result"))
+REFRESHES = Counter(
+    "btc_chart_refreshes_total", "Chart refreshes by pair and result.", ("symbol", "interval", "result"))
+REFRESH_SECONDS = Histogram(
+    "btc_chart_refresh_seconds", "Wall time of a whole chart refresh.", ("symbol", "interval"))
+SNAPSHOT_BYTES = Gauge(
+    "btc_snapshot_payload_bytes", "Size of the published /data body by pair and content-coding.", ("symbol", "interval", "coding"))
+RESPONSE_BYTES = Histogram(
+    "btc_http_response_bytes", "Body size of served responses by endpoint.", ("endpoint",), buckets=SIZE_BUCKETS)
+REQUEST_SECONDS = Histogram(
+    "btc_http_request_seconds", "Latency of served requests by endpoint, method and status.", ("endpoint", "method", "status"))
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def run_profiled(func, path, top=25):
+    '''
+    Calls func() under cProfile, writes the raw stats to `path` (open with pstats or snakeviz)
+    and returns (result, summary) where summary lists the `top` functions by cumulative time.
+    Only the calling thread is profiled: work handed to pool threads shows up as waiting.
+    '''
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = func()
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    summary = [
+        {
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": calls,
+            "total_seconds": round(total, 6),
+            "cumulative_seconds": round(cumulative, 6)
+        }
+        for (filename, line, name), (_, calls, total, cumulative, _callers) in rows
+    ]
+    return result, summary
@@ -0,0 +1,46 @@
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli  # 可选依赖 - optional, br is only offered when installed
+except ImportError:
+    brotli = None
+
+# Content type of the columnar binary chart body (SMA.binary_payload); defined here so the server
+# can negotiate it without importing NumPy
+BINARY_MIMETYPE = "application/vnd.btc-chart+binary"
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+AVAILABLE_CODINGS = ("identity", "gzip", "br") if brotli is not None else ("identity", "gzip")
+
+def serialize_json(obj):
+    '''Compact UTF-8 JSON bytes, as served to the dashboard.'''
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def encode_payload(body, codings=AVAILABLE_CODINGS):
+    '''
+    Pre-compresses a serialized response body once.
+    Returns (encodings, etag): encodings maps content-coding ("identity", "gzip", "br") to bytes,
+    etag is a strong validator derived from the uncompressed body. Pass `codings` to only
+    produce the variants a one-off response needs.
+    '''
+    encodings = {"identity": body}
+    if "gzip" in codings:
+        encodings["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if "br" in codings and brotli is not None:
+        encodings["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    return encodings, etag
+
+def choose_encoding(accept_encodings, encodings):
+    '''Picks the smallest pre-compressed variant the client accepts (werkzeug MIMEAccept-style input).'''
+    for coding in ("br", "gzip"):
+        if coding in encodings and accept_encodings[coding]:
+            return coding
+    return "identity"
+
+def variant_etag(etag, coding):
+    '''Each content-coding is a different representation, so it gets its own strong ETag.'''
+    return etag if coding == "identity" else f"{etag}-{coding}"
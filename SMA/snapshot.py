@@ -0,0 +1,281 @@
+import datetime
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from .payload import serialize_json, encode_payload
+
+# 不可变图表快照 - everything a reader needs, published with one reference swap.
+# `derived` memoizes payloads computed from this snapshot on demand (deltas, binary bodies,
+# frames with indicator columns);
+# `frame` is the processed DataFrame the options were built from (for range queries), or a
+# ColumnarFrame for snapshots read from a file; use snapshot_frame() to get the DataFrame.
+ChartSnapshot = namedtuple("ChartSnapshot", ["version", "last_updated", "options", "encodings", "etag", "derived", "frame"])
+
+SNAPSHOT_MAGIC = b"BTCSNAP2"
+_HEADER_LEN = struct.Struct("<I")
+_ALIGNMENT = 8 # Frame columns start on multiples of this, so numpy reads them in place
+
+def build_snapshot(options, last_updated, previous_version=0, frame=None):
+    '''Serializes and compresses options once; the version is a millisecond timestamp kept strictly increasing.'''
+    version = max(previous_version + 1, int(last_updated.timestamp() * 1000))
+    encodings, etag = encode_payload(serialize_json({
+        "version": version,
+        "echarts_options": options,
+        "last_updated": last_updated.isoformat()
+    }))
+    return ChartSnapshot(version, last_updated, options, encodings, etag, {}, frame)
+
+def snapshot_options(snapshot):
+    '''Options of a snapshot; snapshots read from a file only carry bytes and are parsed on demand.'''
+    if snapshot.options is not None:
+        return snapshot.options
+    return json.loads(snapshot.encodings["identity"].decode("utf-8"))["echarts_options"]
+
+class ColumnarFrame:
+    '''
+    The frame section of a snapshot file: the index and every column as a raw numpy array, with
+    name, dtype and position in the file header (categoricals as codes plus their categories).
+    It is only turned into a DataFrame (which imports pandas) when a range, binary or indicator
+    request first needs it, so loading a snapshot at boot stays cheap. The arrays are views of
+    the mapped file, not copies.
+    '''
+
+    def __init__(self, buffer, layout):
+        self.buffer = buffer
+        self.layout = layout
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def _array(self, section):
+        import numpy as np
+        offset, length = section["offset"], section["length"]
+        return np.frombuffer(self.buffer[offset:offset + length], dtype=np.dtype(section["dtype"]))
+
+    def load(self):
+        with self._lock:
+            if self._frame is None:
+                import pandas as pd
+                columns = {}
+                for section in self.layout["columns"]:
+                    values = self._array(section)
+                    if "categories" in section:
+                        values = pd.Categorical.from_codes(values, categories=section["categories"], ordered=section["ordered"])
+                    columns[section["name"]] = values
+                index = pd.Index(self._array(self.layout["index"]), name=self.layout["index"]["name"], copy=False)
+                self._frame = pd.DataFrame(columns, index=index, copy=False)
+                self.buffer = None
+            return self._frame
+
+def snapshot_frame(snapshot):
+    '''The processed DataFrame of a snapshot (None if it has none).'''
+    frame = snapshot.frame
+    return frame.load() if isinstance(frame, ColumnarFrame) else frame
+
+def _frame_sections(frame, position):
+    '''
+    Layout (for the file header) and the arrays of a frame's section, starting at `position`
+    bytes after the header. Columns must be numeric, bool, datetime64 or categorical.
+    '''
+    import numpy as np
+    import pandas as pd
+    arrays = []
+
+    def section(name, values):
+        nonlocal position
+        if values.dtype.kind not in "biufM":
+            raise TypeError(f"Column {name!r} of dtype {values.dtype} cannot be written to a snapshot file")
+        padding = -position % _ALIGNMENT
+        arrays.append(b"\0" * padding)
+        values = np.ascontiguousarray(values)
+        arrays.append(values)
+        position += padding + values.nbytes
+        return {"name": name, "dtype": values.dtype.str, "offset": position - values.nbytes, "length": values.nbytes}
+
+    layout = {"index": section(frame.index.name, np.asarray(frame.index)), "columns": []}
+    for name, column in frame.items():
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            entry = section(name, column.cat.codes.to_numpy())
+            entry["categories"] = column.cat.categories.tolist()
+            entry["ordered"] = bool(column.cat.ordered)
+        else:
+            entry = section(name, column.to_numpy())
+        layout["columns"].append(entry)
+    return layout, arrays
+
+def write_snapshot_file(path, snapshot):
+    '''
+    Publishes a snapshot for other processes: magic, header length, JSON header, then the encoded
+    bodies and the frame columns back to back. Written to a temp file and renamed, so readers
+    never see a partial file.
+    '''
+    sections = list(snapshot.encodings.values())
+    offsets = {}
+    position = 0
+    for coding, body in snapshot.encodings.items():
+        offsets[coding] = [position, len(body)]
+        position += len(body)
+    header = {
+        "version": snapshot.version,
+        "last_updated": snapshot.last_updated.isoformat(),
+        "etag": snapshot.etag,
+        "encodings": offsets
+    }
+    if snapshot.frame is not None:
+        header["frame"], arrays = _frame_sections(snapshot_frame(snapshot), position)
+        sections.extend(arrays)
+    header = json.dumps(header).encode("utf-8")
+    # Pad the header with spaces so the sections after it start aligned
+    header += b" " * (-(len(SNAPSHOT_MAGIC) + _HEADER_LEN.size + len(header)) % _ALIGNMENT)
+    _write_atomic(path, [SNAPSHOT_MAGIC, _HEADER_LEN.pack(len(header)), header] + sections)
+
+def _write_atomic(path, chunks):
+    '''Writes `chunks` to a temp file and renames it over `path`, so readers never see a partial file.'''
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def read_snapshot_file(path):
+    '''
+    Memory-maps a snapshot file written by write_snapshot_file; returns None if it is missing or invalid.
+    Only the small JSON header is parsed. The encoded bodies are copied out (they are sent whole);
+    the frame comes back as a ColumnarFrame over the mapping, which stays open as long as the frame
+    is referenced (a replaced file keeps its mapping valid).
+    '''
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            mm.close()
+            return None
+        start = len(SNAPSHOT_MAGIC)
+        (header_len,) = _HEADER_LEN.unpack(mm[start:start + _HEADER_LEN.size])
+        start += _HEADER_LEN.size
+        header = json.loads(mm[start:start + header_len].decode("utf-8"))
+        base = start + header_len
+        encodings = {
+            coding: mm[base + offset:base + offset + length]
+            for coding, (offset, length) in header["encodings"].items()
+        }
+    except (ValueError, KeyError, struct.error):
+        mm.close()
+        return None
+    frame = None
+    if "frame" in header:
+        frame = ColumnarFrame(memoryview(mm)[base:], header["frame"])
+    else:
+        mm.close()
+    last_updated = datetime.datetime.fromisoformat(header["last_updated"])
+    return ChartSnapshot(header["version"], last_updated, None, encodings, header["etag"], {}, frame)
+
+
+class SnapshotFile:
+    '''
+    A snapshot file shared by several server processes (e.g. Gunicorn workers).
+
+    load_if_changed() is cheap enough to call per request: it only stats the file, and
+    re-maps it when the file was replaced.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.tick_path = path + ".tick"
+        self._stat_key = None
+        self._tick_stat_key = None
+
+    def publish(self, snapshot):
+        write_snapshot_file(self.path, snapshot)
+
+    def load_if_changed(self):
+        stat_key = _stat_key(self.path)
+        if stat_key is None or stat_key == self._stat_key:
+            return None
+        snapshot = read_snapshot_file(self.path)
+        if snapshot is not None:
+            self._stat_key = stat_key
+        return snapshot
+
+    def publish_tick(self, body):
+        '''Shares a streamed tick (a small JSON body, see server.flush_stream_updates) next to the snapshot.'''
+        _write_atomic(self.tick_path, [body])
+
+    def load_tick_if_changed(self):
+        stat_key = _stat_key(self.tick_path)
+        if stat_key is None or stat_key == self._tick_stat_key:
+            return None
+        try:
+            with open(self.tick_path, "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        self._tick_stat_key = stat_key
+        return body
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class ProcessLock:
+    '''
+    Inter-process lock on a lock file (fcntl.flock), e.g. to elect the one scheduler process.
+    acquire() does not wait unless given a timeout, and then retries every RETRY_INTERVAL seconds.
+    '''
+
+    RETRY_INTERVAL = 0.05
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, timeout=0):
+        if self._fd is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:  # Windows: there is only ever one process to coordinate
+            self._fd = -1
+            return True
+        deadline = time.monotonic() + timeout
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(self.RETRY_INTERVAL)
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
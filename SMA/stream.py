@@ -0,0 +1,170 @@
+'''
+Binance kline WebSocket ingestion for the optional streaming mode.
+
+KlineStream subscribes to the combined kline streams of a set of pairs on its own asyncio loop
+(in a background thread) and hands every kline to a callback in /api/v3/klines row layout, so
+the candle store and the incremental indicators treat streamed and downloaded candles alike.
+It reconnects with exponential backoff; Binance drops every connection after 24 hours.
+
+Recorded messages can be replayed offline (see benchmarks/standin_server.py):
+
+    python -m SMA.stream --record kline_stream.jsonl --pairs BTCUSDT:1m --seconds 120
+'''
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    from websockets.asyncio.client import connect  # 可选依赖 - optional, only the streaming mode needs it
+except ImportError:
+    connect = None
+
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+BINANCE_STREAM_URL = os.environ.get("BINANCE_STREAM_URL", "wss://stream.binance.com:9443")
+
+STREAM_MESSAGES = Counter("btc_stream_messages_total", "Kline stream messages received by pair.", ("symbol", "interval"))
+STREAM_RECONNECTS = Counter("btc_stream_reconnects_total", "Kline stream connection failures followed by a reconnect.")
+
+def stream_name(symbol, interval):
+    return f"{symbol.lower()}@kline_{interval}"
+
+def stream_url(pairs, url=None):
+    '''Combined-stream URL subscribing to the kline streams of all (symbol, interval) pairs.'''
+    return f"{url or BINANCE_STREAM_URL}/stream?streams=" + "/".join(stream_name(s, i) for s, i in pairs)
+
+def parse_kline_message(message):
+    '''
+    (symbol, interval, kline, closed) from a raw kline stream message (combined or raw stream),
+    where kline is [open_time, open, high, low, close, volume, close_time] like /api/v3/klines.
+    Returns None for any other message.
+    '''
+    payload = json.loads(message)
+    data = payload.get("data", payload)
+    if not isinstance(data, dict) or data.get("e") != "kline":
+        return None
+    k = data["k"]
+    return k["s"], k["i"], [k["t"], k["o"], k["h"], k["l"], k["c"], k["v"], k["T"]], bool(k["x"])
+
+def kline_message(symbol, interval, kline, closed, event_time=None):
+    '''Inverse of parse_kline_message: a combined-stream message for a /api/v3/klines row.'''
+    open_time, open_, high, low, close, volume, close_time = kline[:7]
+    return json.dumps({
+        "stream": stream_name(symbol, interval),
+        "data": {
+            "e": "kline", "E": event_time or close_time, "s": symbol,
+            "k": {"t": open_time, "T": close_time, "s": symbol, "i": interval,
+                  "o": str(open_), "c": str(close), "h": str(high), "l": str(low), "v": str(volume), "x": closed}
+        }
+    })
+
+def load_recording(path):
+    '''Raw messages of a recording, one per line.'''
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+class KlineStream:
+    '''
+    Background consumer of Binance kline streams.
+
+    on_kline(symbol, interval, kline, closed) is called on the stream thread for every kline
+    message, in arrival order; it should only hand the kline over and return quickly.
+    '''
+
+    def __init__(self, pairs, on_kline, url=None, reconnect_delay=1.0, max_reconnect_delay=60.0):
+        if connect is None:
+            raise RuntimeError("The streaming mode needs the 'websockets' package (pip install websockets).")
+        self.pairs = list(pairs)
+        self.on_kline = on_kline
+        self.url = stream_url(self.pairs, url)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connected = threading.Event()
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._thread_main, name="kline-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._task = self._loop.create_task(self._run())
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async with connect(self.url, ping_interval=20, max_size=2 ** 20) as websocket:
+                    logger.info(f"Kline stream connected: {self.url}")
+                    self.connected.set()
+                    delay = self.reconnect_delay
+                    async for message in websocket:
+                        self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Kline stream error: {e}; reconnecting in {delay:.0f}s")
+            finally:
+                self.connected.clear()
+            STREAM_RECONNECTS.inc()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _dispatch(self, message):
+        try:
+            parsed = parse_kline_message(message)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring malformed kline message: {e}")
+            return
+        if parsed is None:
+            return
+        symbol, interval, kline, closed = parsed
+        STREAM_MESSAGES.inc(symbol=symbol, interval=interval)
+        try:
+            self.on_kline(symbol, interval, kline, closed)
+        except Exception as e:
+            logger.error(f"Kline handler failed for {symbol} {interval}: {e}", exc_info=True)
+
+def record(pairs, path, seconds, url=None):
+    '''Writes the raw messages of the pairs' kline streams to `path` (one per line) for `seconds`.'''
+    async def run():
+        async with connect(stream_url(pairs, url)) as websocket:
+            deadline = time.monotonic() + seconds
+            with open(path, "w", encoding="utf-8") as f:
+                while time.monotonic() < deadline:
+                    try:
+                        message = await asyncio.wait_for(websocket.recv(), deadline - time.monotonic())
+                    except asyncio.TimeoutError:
+                        break
+                    f.write(message + "\n")
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record Binance kline stream messages for offline replay.")
+    parser.add_argument("--record", required=True, help="output file, one raw message per line")
+    parser.add_argument("--pairs", default="BTCUSDT:1m", help="comma separated SYMBOL:INTERVAL pairs")
+    parser.add_argument("--seconds", type=float, default=60)
+    args = parser.parse_args()
+    record([tuple(p.split(":")) for p in args.pairs.split(",")], args.record, args.seconds)
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+from .metrics import Gauge, record_cache
+
+VARIANT_CACHE_ENTRIES = Gauge("btc_variant_cache_entries", "Chart variants held in the LRU cache.")
+VARIANT_CACHE_BYTES = Gauge("btc_variant_cache_bytes", "Serialized bytes held in the chart variant LRU cache.")
+
+class VariantCache:
+    '''
+    LRU cache of serialized chart variants (a range, downsampling, indicator set, ... of one chart).
+
+    Entries live under a namespace (one per symbol/interval) and are keyed on the data version
+    plus the request parameters. invalidate() switches a namespace to a new version and drops
+    its entries under the same lock, so once a dataset is published no reader can hit or store
+    a variant of the previous one. Bounded by entry count and by the bytes of the payloads.
+    '''
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, name="variants"):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # (namespace, params) -> (payload, size)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, version, params):
+        '''The cached payload, or None if missing or built from another data version.'''
+        with self._lock:
+            entry = None
+            if self._versions.get(namespace) == version:
+                entry = self._entries.get((namespace, params))
+            if entry is not None:
+                self._entries.move_to_end((namespace, params))
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache(self.name, entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, namespace, version, params, payload):
+        '''
+        Stores a payload ({"encodings": {coding: bytes}, "etag": ...}) built from `version`.
+        Payloads of a version that is no longer current, or larger than the whole cache, are not kept.
+        '''
+        size = sum(len(body) for body in payload["encodings"].values())
+        with self._lock:
+            if self._versions.get(namespace, version) != version or size > self.max_bytes:
+                return
+            self._versions[namespace] = version
+            key = (namespace, params)
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (payload, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+            self._update_gauges()
+
+    def invalidate(self, namespace, version):
+        '''Makes `version` the only valid data version of `namespace`, dropping all its entries.'''
+        with self._lock:
+            self._versions[namespace] = version
+            for key in [k for k in self._entries if k[0] == namespace]:
+                self.bytes -= self._entries.pop(key)[1]
+            self._update_gauges()
+
+    def get_or_build(self, namespace, version, params, build):
+        '''Cached payload for (version, params), calling build() and storing its result on a miss.'''
+        payload = self.get(namespace, version, params)
+        if payload is None:
+            payload = build()
+            self.put(namespace, version, params, payload)
+        return payload
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+    def _update_gauges(self):
+        VARIANT_CACHE_ENTRIES.set(len(self._entries))
+        VARIANT_CACHE_BYTES.set(self.bytes)
@@ -1,60 +1,228 @@
-import json
+'''
+Standalone ECharts reports, HTML files viewable without the server.
+
+plot_btc_analysis_standalone() writes one self-contained chart. generate_reports() renders a
+batch - every combination of pairs, date ranges and indicator sets - on a process pool. The
+reports of a pair share one external data file (data/<SYMBOL>_<interval>.js, loaded with a
+script tag so it also works from file://) with the full history of every column they plot;
+each HTML file only holds its chart options without the data arrays and the slice it shows.
+'''
+import itertools
 import os
-# Import the new centralized function
-from .data_processor import generate_echarts_options, get_processed_data
+import re
+from concurrent.futures import ProcessPoolExecutor
+from string import Template
+
+import pandas as pd
+
+from .binary_payload import SERIES_COLUMNS, INDICATOR_DTYPE
+from .data_fetcher import is_intraday
+from .data_processor import (generate_echarts_options, get_processed_data, _format_dates, _future_dates,
+                             _series_data, HALVING_DATES)
+from .downsample import slice_frame
+from .factors import compute_indicators, indicator_column, parse_indicator_specs
+from .payload import serialize_json
 
 # Default output path for the standalone HTML file (consider making this relative)
 DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
 DEFAULT_OUTPUT_HTML_FILE = os.path.join(DEFAULT_OUTPUT_DIR, "btc_analysis_echarts_standalone.html")
+DEFAULT_REPORT_DIR = os.path.join(DEFAULT_OUTPUT_DIR, "reports")
+DEFAULT_FUTURE_DAYS = 1460
 
-def plot_btc_analysis_standalone(data_df, output_html=DEFAULT_OUTPUT_HTML_FILE):
-    '''
-    Generates ECharts options using the centralized function and saves a standalone HTML file.
-    '''
-    
-    # Ensure the output directory exists
-    output_dir = os.path.dirname(output_html)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"Created directory: {output_dir}")
-
-    # Generate ECharts options using the centralized function
-    option = generate_echarts_options(data_df)
-
-    # Generate HTML (similar to the original visualizer_echarts.py)
-    # The ECharts option object is now sourced from generate_echarts_options
-    html = f'''
-<!DOCTYPE html>
+_HTML = Template('''<!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8">
-    <title>BTC ECharts Visualization (Standalone)</title>
+    <title>$title</title>
     <script src="https://cdn.jsdelivr.net/npm/echarts@5/dist/echarts.min.js"></script>
-    <style>html,body,#main{{height:100%;margin:0;padding:0;}}</style>
+    $data_script
+    <style>html,body,#main{height:100%;margin:0;padding:0;}</style>
 </head>
 <body>
-    <div id="main" style="width:100vw;height:90vh;"></div> {/* Consider making width/height more flexible */}
+    <div id="main" style="width:100vw;height:90vh;"></div>
     <script type="text/javascript">
-        var chartDom = document.getElementById('main');
-        var myChart = echarts.init(chartDom);
-        var option = {json.dumps(option, ensure_ascii=False, indent=None)}; // Use indent=None for compactness in HTML
+        var myChart = echarts.init(document.getElementById('main'));
+        var option = $option;
+        var view = $view;
+        if (view) {
+            // Fill in the data arrays from the shared data file
+            var data = window.BTC_CHART_DATA[view.key];
+            option.xAxis.data = data.dates.slice(view.dates[0], view.dates[1]);
+            option.series.forEach(function(series, i) {
+                series.data = data.columns[view.columns[i]].slice(view.rows[0], view.rows[1]);
+            });
+        }
         myChart.setOption(option);
-        // Optional: Add resize listener if this HTML is viewed directly
-        window.addEventListener('resize', function() {{
+        window.addEventListener('resize', function() {
             myChart.resize();
-        }});
+        });
     </script>
 </body>
 </html>
-'''
-    with open(output_html, "w", encoding="utf-8") as f:
-        f.write(html)
+''')
+
+def _script_json(obj):
+    '''JSON for embedding in a <script> element.'''
+    return serialize_json(obj).decode("utf-8").replace("</", "<\\/")
+
+def _write_html(path, title, option, view=None, data_src=None):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data_script = f'<script src="{data_src}"></script>' if data_src else ""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(_HTML.substitute(title=title, data_script=data_script, option=_script_json(option),
+                                 view=_script_json(view)))
+
+def plot_btc_analysis_standalone(data_df, output_html=DEFAULT_OUTPUT_HTML_FILE, symbol="BTCUSDT", interval="1d"):
+    '''
+    Generates ECharts options using the centralized function and saves a self-contained HTML file.
+    '''
+    option = generate_echarts_options(data_df, symbol=symbol, interval=interval)
+    _write_html(output_html, "BTC ECharts Visualization (Standalone)", option)
     print(f"Standalone ECharts HTML saved to: {output_html}")
 
+
+# ---- Batch reports -------------------------------------------------------------------------
+
+_RELATIVE_RANGE = re.compile(r"^(\d+)([dwmy])$")
+_RANGE_UNITS = {"d": "days", "w": "weeks", "m": "months", "y": "years"}
+
+def resolve_range(spec, index):
+    '''
+    (start, end) dates of a range spec: "all", a span back from the last candle ("90d", "6m",
+    "4y") or "YYYY-MM-DD:YYYY-MM-DD" (either side may be empty). Raises ValueError.
+    '''
+    spec = spec.strip().lower()
+    if spec == "all":
+        return None, None
+    match = _RELATIVE_RANGE.match(spec)
+    if match:
+        last = pd.Timestamp(index[-1]).normalize()
+        start = last - pd.DateOffset(**{_RANGE_UNITS[match.group(2)]: int(match.group(1))}) + pd.Timedelta(days=1)
+        return start.date(), None
+    if ":" in spec:
+        start, end = (pd.Timestamp(s).date() if s else None for s in spec.split(":", 1))
+        if start and end and start > end:
+            raise ValueError(f"Range {spec!r} starts after it ends")
+        return start, end
+    raise ValueError(f"Unknown range {spec!r}; use all, <n>d/w/m/y or START:END")
+
+def _tag(text):
+    return re.sub(r"[^A-Za-z0-9.-]+", "-", text).strip("-")
+
+def _pair_key(symbol, interval):
+    return f"{symbol}_{interval}"
+
+def _column_decimals(column):
+    '''(decimals, integral) used for a plotted column, as in the /data options.'''
+    for name, _, decimals in SERIES_COLUMNS:
+        if name == column:
+            return decimals, column == "Fear_Greed"
+    return INDICATOR_DTYPE[1], False
+
+def _write_data_file(path, symbol, interval, frame, columns):
+    '''Shared data file of a pair: axis labels (history plus future padding) and the full `columns`.'''
+    dates = _format_dates(frame.index, is_intraday(interval))
+    if not is_intraday(interval) and dates:
+        dates.extend(_future_dates(dates[-1], DEFAULT_FUTURE_DAYS, 1, HALVING_DATES))
+    data = {"dates": dates, "columns": {c: _series_data(frame[c], *_column_decimals(c)) for c in columns}}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"(window.BTC_CHART_DATA = window.BTC_CHART_DATA || {{}})[{_script_json(_pair_key(symbol, interval))}] = ")
+        f.write(_script_json(data))
+        f.write(";\n")
+    return path
+
+def _render_report(path, data_src, symbol, interval, frame, range_spec, indicators):
+    '''One report: the options skeleton of the range and indicator set, data taken from the shared file.'''
+    start, end = resolve_range(range_spec, frame.index)
+    positions = slice_frame(pd.Series(range(len(frame)), index=frame.index), start, end)
+    if positions.empty:
+        raise ValueError(f"No {symbol} {interval} data in range {range_spec!r}")
+    first, last = int(positions.iloc[0]), int(positions.iloc[-1]) + 1
+    # Future padding (daily charts) only when the range reaches the latest candle, as on the dashboard
+    dates_end = None if last == len(frame) else last
+
+    # Options are built from the last row only: everything but the data arrays is independent of the rows
+    option = generate_echarts_options(frame.iloc[last - 1:last], 0, symbol=symbol, interval=interval, indicators=indicators)
+    option["xAxis"] = dict(option["xAxis"], data=None)
+    option["series"] = [dict(series, data=None) for series in option["series"]]
+    if range_spec.strip().lower() != "all":
+        option["title"] = dict(option["title"], text=f"{option['title']['text']} [{range_spec}]")
+    view = {
+        "key": _pair_key(symbol, interval),
+        "rows": [first, last],
+        "dates": [first, dates_end],
+        "columns": [c for c, _, _ in SERIES_COLUMNS] + [indicator_column(n, w) for n, w in indicators]
+    }
+    _write_html(path, f"{symbol} {interval} {range_spec}", option, view, data_src)
+    return path
+
+_worker_frames = None
+
+def _init_worker(frames):
+    global _worker_frames
+    _worker_frames = frames
+
+def _run_task(task, frames=None):
+    kind, pair, args = task
+    frame = (frames or _worker_frames)[pair]
+    if kind == "data":
+        return _write_data_file(args[0], pair[0], pair[1], frame, args[1])
+    return _render_report(args[0], args[1], pair[0], pair[1], frame, args[2], args[3])
+
+def generate_reports(pairs, ranges=("all",), indicator_sets=("",), output_dir=DEFAULT_REPORT_DIR, workers=None, frames=None):
+    '''
+    Renders a report for every (pair, range, indicator set) combination into output_dir, plus an
+    index.html linking them. `indicator_sets` are spec strings such as "sma:50,rsi:14" ("" for
+    none). Frames come from get_processed_data (candles from the local store, only new ones are
+    downloaded) unless given as {(symbol, interval): frame}. With workers > 1 the data files and
+    reports are written on a process pool. Returns the report paths.
+    '''
+    indicator_specs = [parse_indicator_specs(text) for text in indicator_sets]
+    if frames is None:
+        frames = {pair: get_processed_data(*pair) for pair in pairs}
+    frames = dict(frames)  # the indicator columns are joined onto copies, not into the caller's dict
+    # Indicators are computed once per pair over the whole history and shared by all its reports
+    union = list(dict.fromkeys(itertools.chain.from_iterable(indicator_specs)))
+    if union:
+        for pair in pairs:
+            extra = compute_indicators(frames[pair], union, pair[1])
+            frames[pair] = frames[pair].join(extra[extra.columns.difference(frames[pair].columns)])
+    for pair in pairs:
+        for range_spec in ranges:
+            resolve_range(range_spec, frames[pair].index)  # fail early on a bad spec
+
+    columns = [c for c, _, _ in SERIES_COLUMNS] + list(dict.fromkeys(indicator_column(n, w) for n, w in union))
+    tasks = []
+    reports = []
+    for pair in pairs:
+        data_name = f"data/{_pair_key(*pair)}.js"
+        tasks.append(("data", pair, (os.path.join(output_dir, data_name), columns)))
+        for range_spec, (text, specs) in itertools.product(ranges, zip(indicator_sets, indicator_specs)):
+            name = "_".join(filter(None, [_pair_key(*pair), _tag(range_spec), _tag(text.replace(":", ""))])) + ".html"
+            tasks.append(("report", pair, (os.path.join(output_dir, name), data_name, range_spec, specs)))
+            reports.append((pair, range_spec, text, name))
+
+    if workers is not None and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(frames,)) as pool:
+            written = list(pool.map(_run_task, tasks))
+    else:
+        written = [_run_task(task, frames) for task in tasks]
+
+    links = "\n".join(
+        f'    <li><a href="{name}">{pair[0]} {pair[1]} {range_spec}{" " + text if text else ""}</a></li>'
+        for pair, range_spec, text, name in reports
+    )
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>BTC reports</title></head>\n<body>\n<ul>\n{links}\n</ul>\n</body>\n</html>\n')
+    return [path for path, task in zip(written, tasks) if task[0] == "report"]
+
 # Example usage (for testing this module directly)
 if __name__ == "__main__":
     print("Fetching and processing data for standalone visualizer...")
     df = get_processed_data() # Use the centralized data fetching too
     print("Data processed. Now generating standalone HTML chart...")
     plot_btc_analysis_standalone(df)
-    print(f"Standalone chart generated at {DEFAULT_OUTPUT_HTML_FILE}")
\ No newline at end of file
+    print(f"Standalone chart generated at {DEFAULT_OUTPUT_HTML_FILE}")
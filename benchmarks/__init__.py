@@ -0,0 +1 @@
+# This file makes the 'benchmarks' directory a package, run with: python -m benchmarks.bench_pipeline
@@ -0,0 +1,168 @@
+'''
+Offline benchmark of the fetch -> indicator -> render pipeline.
+
+Every stage of a refresh is timed against a local stand-in of the Binance and Fear & Greed
+APIs at several history sizes; the candle interval is chosen per size so the whole history
+still ends "now" and starts after HISTORY_START. Reports best-of-N wall time, throughput and
+the tracemalloc peak of each stage.
+
+    python -m benchmarks.bench_pipeline                       # 3k, 100k and 1M candles
+    python -m benchmarks.bench_pipeline --sizes 3000 --check  # fail on regressions vs baseline.json
+    python -m benchmarks.bench_pipeline --save-baseline
+'''
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from SMA import data_fetcher
+from SMA.binary_payload import encode_chart_binary
+from SMA.data_fetcher import INTERVAL_MS, HISTORY_START, get_klines, get_fear_greed_index, is_intraday
+from SMA.data_processor import generate_echarts_options, join_fear_greed
+from SMA.http_client import BinanceWeightLimiter
+from SMA.indicator import calculate_percentages, update_percentages
+from SMA.payload import serialize_json, encode_payload
+
+from .fixtures import KlineFixture, fear_greed_payload
+from .standin_server import StandinServer
+
+DEFAULT_SIZES = [3000, 100000, 1000000]
+INTERVAL_CHOICES = ["1d", "4h", "1h", "15m", "5m", "1m"]
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+SYMBOL = "BTCUSDT"
+
+def pick_interval(n):
+    '''Longest interval for which n candles ending now start after HISTORY_START.'''
+    start_ms = datetime.datetime.strptime(HISTORY_START, "%Y-%m-%d").timestamp() * 1000
+    now_ms = time.time() * 1000
+    for interval in INTERVAL_CHOICES:
+        if now_ms - n * INTERVAL_MS[interval] > start_ms:
+            return interval
+    raise ValueError(f"{n} candles do not fit between {HISTORY_START} and now even at 1m")
+
+def measure(results, size, stage, func, rows, repeats, track_memory):
+    '''Runs func `repeats` times, records the best time (and optionally the peak allocation) and returns its result.'''
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+
+    peak_mb = None
+    if track_memory:
+        tracemalloc.start()
+        func()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+    results.append({
+        "size": size,
+        "stage": stage,
+        "seconds": best,
+        "rows_per_sec": rows / best if best > 0 else None,
+        "peak_mb": peak_mb
+    })
+    print(f"  {stage:<34} {best * 1000:10.1f} ms  {rows / best if best > 0 else 0:14,.0f} rows/s"
+          + (f"  {peak_mb:9.1f} MB" if peak_mb is not None else ""), flush=True)
+    return value
+
+def run_size(n, repeats, track_memory):
+    interval = pick_interval(n)
+    print(f"\n{n:,} candles ({SYMBOL} {interval})", flush=True)
+    fixture = KlineFixture(n, INTERVAL_MS[interval])
+    results = []
+
+    with StandinServer(fixture, fear_greed_payload()) as server, tempfile.TemporaryDirectory() as tmp:
+        data_fetcher.BINANCE_KLINES_URL = server.url + "/api/v3/klines"
+        data_fetcher.FEAR_GREED_URL = server.url + "/fng/"
+        data_fetcher.binance_limiter = BinanceWeightLimiter(limit=10 ** 9)  # the stand-in has no weight budget
+        store_paths = (os.path.join(tmp, f"cold-{i}.sqlite") for i in range(repeats + 2))
+        store_path = os.path.join(tmp, "candles.sqlite")
+        get_klines(SYMBOL, interval, store_path=store_path)
+
+        candles = measure(results, n, "get_klines (cold store)",
+                          lambda: get_klines(SYMBOL, interval, store_path=next(store_paths)), n, repeats, track_memory)
+        measure(results, n, "get_klines (incremental)",
+                lambda: get_klines(SYMBOL, interval, store_path=store_path), n, repeats, track_memory)
+        fear_greed_df = measure(results, n, "get_fear_greed_index",
+                                lambda: get_fear_greed_index(max_age=0), n, repeats, track_memory)
+        measure(results, n, "calculate_percentages",
+                lambda: calculate_percentages(candles.copy()), n, repeats, track_memory)
+        processed, state = measure(results, n, "update_percentages (full)",
+                                   lambda: update_percentages(candles), n, repeats, track_memory)
+        measure(results, n, "update_percentages (open candle)",
+                lambda: update_percentages(candles, processed, state), n, repeats, track_memory)
+        joined = measure(results, n, "join_fear_greed",
+                         lambda: join_fear_greed(processed, fear_greed_df, interval), n, repeats, track_memory)
+        options = measure(results, n, "generate_echarts_options",
+                          lambda: generate_echarts_options(joined, symbol=SYMBOL, interval=interval), n, repeats, track_memory)
+        now = datetime.datetime.now()
+        measure(results, n, "serialize /data (json+compress)",
+                lambda: encode_payload(serialize_json({"version": 1, "echarts_options": options, "last_updated": now.isoformat()})),
+                n, repeats, track_memory)
+        measure(results, n, "serialize /data (binary+compress)",
+                lambda: encode_payload(encode_chart_binary(joined, options, 1, now, is_intraday(interval))),
+                n, repeats, track_memory)
+        print(f"  stand-in requests: {server.request_counts}")
+
+    for result in results:
+        result["interval"] = interval
+    return results
+
+def check_regressions(results, baseline, tolerance, min_delta):
+    '''Stages slower than baseline * (1 + tolerance) by more than min_delta seconds.'''
+    reference = {(r["size"], r["stage"]): r["seconds"] for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = reference.get((result["size"], result["stage"]))
+        if base is None:
+            continue
+        if result["seconds"] > base * (1 + tolerance) and result["seconds"] - base > min_delta:
+            regressions.append((result, base))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fetch -> indicator -> render pipeline offline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="history sizes in candles")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per stage (best is kept); sizes >= 500k run once")
+    parser.add_argument("--no-memory", action="store_true", help="skip the extra tracemalloc run per stage")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store results as the baseline ({BASELINE_PATH})")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if a stage regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown as a fraction of the baseline (default 0.5)")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.sizes:
+        results.extend(run_size(n, args.repeats if n < 500000 else 1, not args.no_memory))
+
+    report = {"created": datetime.datetime.now().isoformat(), "python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {BASELINE_PATH}")
+
+    if args.check:
+        if not os.path.exists(BASELINE_PATH):
+            print(f"\nNo baseline at {BASELINE_PATH}; run with --save-baseline first.")
+            return 1
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = check_regressions(results, baseline, args.tolerance, args.min_delta)
+        for result, base in regressions:
+            print(f"REGRESSION {result['size']:,} {result['stage']}: {result['seconds'] * 1000:.1f} ms vs baseline {base * 1000:.1f} ms")
+        if regressions:
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+'''
+Kline and Fear & Greed fixtures for the offline benchmarks.
+
+`python -m benchmarks.fixtures --record` saves real API responses under benchmarks/fixtures/.
+Recorded candles are replayed as-is; history sizes beyond what was recorded are synthesized
+as a random walk in the same wire format, continuing from the recorded prices.
+'''
+import argparse
+import datetime
+import json
+import os
+
+import numpy as np
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+KLINES_FIXTURE = os.path.join(FIXTURE_DIR, "klines_BTCUSDT_1d.json")
+FEAR_GREED_FIXTURE = os.path.join(FIXTURE_DIR, "fng.json")
+
+FEAR_GREED_START = datetime.date(2018, 2, 1)
+
+def _load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+class KlineFixture:
+    '''n candles of one interval ending at the current open candle, as columns ready to page through.'''
+
+    def __init__(self, n, interval_ms, seed=0):
+        now_ms = int(datetime.datetime.now().timestamp() * 1000)
+        last_open = now_ms // interval_ms * interval_ms
+        self.open_time = last_open - interval_ms * np.arange(n - 1, -1, -1, dtype=np.int64)
+        self.interval_ms = interval_ms
+
+        recorded = _load(KLINES_FIXTURE) or []
+        recorded_close = np.array([float(k[4]) for k in recorded[-n:]])
+        rng = np.random.default_rng(seed)
+        synthetic = n - len(recorded_close)
+        start_price = recorded_close[0] if len(recorded_close) else 30000.0
+        # Walk backwards from the first recorded price so the series joins up
+        walk = start_price * np.exp(-np.cumsum(rng.normal(0, 0.02, synthetic)))[::-1]
+        close = np.round(np.concatenate([walk, recorded_close]), 2)
+        open_ = np.concatenate([[close[0]], close[:-1]])
+        spread = np.abs(rng.normal(0, 0.01, n))
+        self.open = open_
+        self.close = close
+        self.high = np.round(np.maximum(open_, close) * (1 + spread), 2)
+        self.low = np.round(np.minimum(open_, close) * (1 - spread), 2)
+        self.volume = np.round(rng.uniform(100, 10000, n), 4)
+
+    def page(self, start_time, end_time, limit):
+        '''Rows with start_time <= open_time <= end_time, in Binance /api/v3/klines format.'''
+        lo = int(np.searchsorted(self.open_time, start_time, side="left"))
+        hi = min(int(np.searchsorted(self.open_time, end_time, side="right")), lo + limit)
+        return [
+            [int(self.open_time[i]), f"{self.open[i]:.2f}", f"{self.high[i]:.2f}", f"{self.low[i]:.2f}",
+             f"{self.close[i]:.2f}", f"{self.volume[i]:.4f}", int(self.open_time[i] + self.interval_ms - 1)]
+            for i in range(lo, hi)
+        ]
+
+def fear_greed_payload(seed=0):
+    '''The /fng/?limit=0&date_format=world response: the recorded one, or a synthetic daily history.'''
+    recorded = _load(FEAR_GREED_FIXTURE)
+    if recorded is not None:
+        return recorded
+    rng = np.random.default_rng(seed)
+    days = (datetime.date.today() - FEAR_GREED_START).days + 1
+    values = np.clip(np.round(50 + np.cumsum(rng.normal(0, 4, days))), 0, 100).astype(int)
+    data = []
+    for i, value in enumerate(values[::-1]):  # the API lists the newest day first
+        day = datetime.date.today() - datetime.timedelta(days=i)
+        classification = "Extreme Fear" if value < 25 else "Fear" if value < 47 else "Neutral" if value < 54 else "Greed" if value < 76 else "Extreme Greed"
+        data.append({"value": str(value), "value_classification": classification, "timestamp": day.strftime("%d-%m-%Y")})
+    return {"name": "Fear and Greed Index", "data": data}
+
+def record_fixtures():
+    '''Downloads the current BTCUSDT daily history and Fear & Greed index into benchmarks/fixtures/.'''
+    from SMA.data_fetcher import _fetch_klines, HISTORY_START, FEAR_GREED_URL
+    from SMA.http_client import DEFAULT_TIMEOUT, get_session
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    start_time = int(datetime.datetime.strptime(HISTORY_START, "%Y-%m-%d").timestamp() * 1000)
+    end_time = int(datetime.datetime.now().timestamp() * 1000)
+    klines = _fetch_klines("BTCUSDT", "1d", start_time, end_time)
+    with open(KLINES_FIXTURE, "w", encoding="utf-8") as f:
+        json.dump(klines, f)
+    response = get_session().get(FEAR_GREED_URL, params={"limit": 0, "date_format": "world"}, timeout=DEFAULT_TIMEOUT)
+    response.raise_for_status()
+    with open(FEAR_GREED_FIXTURE, "w", encoding="utf-8") as f:
+        json.dump(response.json(), f)
+    print(f"Recorded {len(klines)} klines and {len(response.json()['data'])} Fear & Greed values to {FIXTURE_DIR}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage benchmark fixtures.")
+    parser.add_argument("--record", action="store_true", help="record fresh fixtures from the live APIs")
+    args = parser.parse_args()
+    if args.record:
+        record_fixtures()
+    else:
+        parser.print_help()
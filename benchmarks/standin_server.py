@@ -0,0 +1,116 @@
+'''
+Local stand-ins for the upstream APIs: Binance /api/v3/klines and alternative.me /fng/ over HTTP
+(StandinServer), and the Binance kline WebSocket stream replaying recorded messages (ReplayWebSocketServer).
+'''
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/api/v3/klines":
+            fixture = self.server.klines
+            body = fixture.page(int(query["startTime"]), int(query.get("endTime", 2 ** 62)), int(query.get("limit", 500)))
+            self.server.request_counts["klines"] += 1
+        elif url.path == "/fng/":
+            body = self.server.fear_greed
+            self.server.request_counts["fng"] += 1
+        else:
+            self.send_error(404)
+            return
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandinServer:
+    '''
+    Serves a KlineFixture and a Fear & Greed payload on 127.0.0.1 in a background thread.
+    Use as a context manager; `url` is the root to point the fetchers at.
+    '''
+
+    def __init__(self, klines, fear_greed):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.klines = klines
+        self._server.fear_greed = fear_greed
+        self._server.request_counts = {"klines": 0, "fng": 0}
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def request_counts(self):
+        return self._server.request_counts
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+class ReplayWebSocketServer:
+    '''
+    Replays raw kline stream messages (see SMA.stream.load_recording) to every client connecting
+    on 127.0.0.1, `delay` seconds apart, then keeps the connection open like the real stream.
+    Runs its own asyncio loop in a background thread; use as a context manager. Needs websockets.
+    '''
+
+    def __init__(self, messages, delay=0.0):
+        self.messages = list(messages)
+        self.delay = delay
+        self.connections = 0
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._closing = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    async def _handler(self, websocket):
+        self.connections += 1
+        for message in self.messages:
+            await websocket.send(message)
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        await self._closing.wait()
+
+    async def _start(self):
+        from websockets.asyncio.server import serve
+        self._closing = asyncio.Event()
+        self._server = await serve(self._handler, "127.0.0.1", 0)
+
+    async def _stop(self):
+        self._closing.set()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result(10)
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
@@ -1,8 +1,47 @@
-from flask import Flask, jsonify, render_template
+from flask import Flask, jsonify, render_template, request, Response, g
 import datetime
+import importlib
+import json
+import os
+import time
+from collections import deque
 from apscheduler.schedulers.background import BackgroundScheduler
-from SMA.data_processor import get_processed_data, generate_echarts_options
+from SMA.payload import serialize_json, encode_payload, choose_encoding, variant_etag, AVAILABLE_CODINGS, BINARY_MIMETYPE
+from SMA.delta import compute_delta_since, delta_base
+from SMA.jobs import UpdateJobQueue
+from SMA.variant_cache import VariantCache
+from SMA.snapshot import build_snapshot, snapshot_options, snapshot_frame, SnapshotFile, ProcessLock
+from SMA.metrics import (render_metrics, record_cache, run_profiled, PROMETHEUS_CONTENT_TYPE, STAGE_SECONDS,
+                         REFRESHES, REFRESH_SECONDS, SNAPSHOT_BYTES, REQUEST_SECONDS, RESPONSE_BYTES)
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+def _lazy(module, name):
+    '''
+    Stand-in for a function of a pandas-based SMA module that imports the module on first call.
+    The server boots and serves the persisted snapshot without loading pandas and NumPy;
+    they are only imported by the first refresh or range/binary/indicator request.
+    '''
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+get_processed_data = _lazy("SMA.data_processor", "get_processed_data")
+generate_echarts_options = _lazy("SMA.data_processor", "generate_echarts_options")
+downsample_frame = _lazy("SMA.downsample", "downsample_frame")
+slice_frame = _lazy("SMA.downsample", "slice_frame")
+encode_chart_binary = _lazy("SMA.binary_payload", "encode_chart_binary")
+is_intraday = _lazy("SMA.data_fetcher", "is_intraday")
+apply_live_klines = _lazy("SMA.data_processor", "apply_live_klines")
+upsert_klines = _lazy("SMA.candle_store", "upsert_klines")
+compute_indicators = _lazy("SMA.factors", "compute_indicators")
+parse_indicator_specs = _lazy("SMA.factors", "parse_indicator_specs")
+indicator_column = _lazy("SMA.factors", "indicator_column")
+backtest_report = _lazy("SMA.backtest", "backtest_report")
+parameter_grid = _lazy("SMA.backtest", "parameter_grid")
+parse_values = _lazy("SMA.backtest", "parse_values")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -10,78 +49,813 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Global variables to store data and last update time
-echarts_options = {}
-last_updated_time = None
-data_update_in_progress = False # Basic flag to prevent concurrent updates
-
-def update_chart_data():
-    '''Fetches new data, processes it, and updates global chart options and timestamp.'''
-    global echarts_options, last_updated_time, data_update_in_progress
-    
-    if data_update_in_progress:
-        logger.info("Data update already in progress. Skipping.")
-        return
-
-    data_update_in_progress = True
-    logger.info("Starting data update...")
+# Charts served by this process, "SYMBOL:INTERVAL" pairs. The first one is the default /data chart.
+DEFAULT_PAIRS = "BTCUSDT:1d,ETHUSDT:1d,SOLUSDT:1d,BTCUSDT:4h,BTCUSDT:1h"
+CHART_PAIRS = [tuple(pair.strip().split(":")) for pair in os.environ.get("CHART_PAIRS", DEFAULT_PAIRS).split(",") if pair.strip()]
+DEFAULT_SYMBOL, DEFAULT_INTERVAL = CHART_PAIRS[0]
+
+# Superseded versions kept per pair for /data?since=<version> (one day at the 30 min schedule). Each
+# one is a DeltaBase of a few KB (SMA.delta.TAIL_POINTS values per series), whatever the pair's size.
+DELTA_HISTORY = int(os.environ.get("CHART_DELTA_HISTORY", 48))
+PIPELINE_WORKERS = min(8, len(CHART_PAIRS)) # Pairs refreshed concurrently
+
+# Every published snapshot is persisted to CHART_SNAPSHOT_FILE (one file per pair), so a restarted
+# server serves the last chart at once and refreshes in the background. Several processes (e.g.
+# Gunicorn workers) pointed at the same file share it: they serve what is published there, and only
+# the worker holding the leader lock runs the scheduler. An empty CHART_SNAPSHOT_FILE disables this.
+DEFAULT_SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SMA", "output", "snapshot.bin")
+SNAPSHOT_FILE_PATH = os.environ.get("CHART_SNAPSHOT_FILE", DEFAULT_SNAPSHOT_FILE) or None
+SNAPSHOT_RELOAD_INTERVAL = 1.0 # Seconds between checks of the shared file for a newer snapshot
+STARTUP_REFRESH_DELAY = 5 # Seconds after boot before the first refresh; a persisted snapshot is served meanwhile
+# CHART_SCHEDULER=0 keeps this process from ever running the scheduler (and the streams), e.g. in tests
+SCHEDULER_ENABLED = os.environ.get("CHART_SCHEDULER", "1").lower() not in ("0", "false", "no")
+
+# Serialized /data variants (ranges, downsampling, indicators) shared by all pairs, LRU-bounded
+VARIANT_CACHE_ENTRIES = int(os.environ.get("CHART_VARIANT_CACHE_ENTRIES", 256))
+VARIANT_CACHE_BYTES = int(os.environ.get("CHART_VARIANT_CACHE_MB", 64)) * 1024 * 1024
+variant_cache = VariantCache(VARIANT_CACHE_ENTRIES, VARIANT_CACHE_BYTES)
+
+# Optional streaming mode (CHART_STREAMING=1): the leader process follows the Binance kline
+# WebSocket streams of all pairs and pushes the in-progress candle between scheduled refreshes, at
+# most every STREAM_PUBLISH_INTERVAL seconds per pair. A streamed update is only a "tick": the tail
+# of the chart relative to the published snapshot, sent to dashboards over /stream (SSE). Full
+# snapshots are still only built, compressed and persisted by the scheduled refreshes.
+STREAMING_ENABLED = os.environ.get("CHART_STREAMING", "").lower() in ("1", "true", "yes")
+STREAM_PUBLISH_INTERVAL = float(os.environ.get("CHART_STREAM_PUBLISH_INTERVAL", 2.0))
+STREAM_TICK_ROWS = 3 # Published rows a tick restates (the closing kline of a candle can arrive after the next one opened)
+UPDATE_LOCK_WAIT = 30 # Seconds a refresh waits for a running tick or refresh of its pair before it is skipped
+SSE_MIN_INTERVAL = 1.0 # Seconds between two events sent to one dashboard
+SSE_KEEPALIVE_INTERVAL = 15 # Seconds of silence before a comment line keeps proxies from closing the connection
+SSE_RETRY_MS = 5000 # Browser reconnect delay
+
+# cProfile dumps of refreshes requested with POST /update_data?profile=1
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SMA", "output", "profiles")
+
+def _pair_file_path(path, symbol, interval):
+    '''The default pair uses `path` itself, other pairs get a suffixed sibling file.'''
+    if (symbol, interval) == (DEFAULT_SYMBOL, DEFAULT_INTERVAL):
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{symbol}_{interval}{ext}"
+
+class ChartChannel:
+    '''
+    Published chart state of one symbol/interval.
+
+    Readers take one reference to `current_snapshot` and use only that, and an update swaps in
+    a complete new snapshot, so options and timestamp always match. Each channel has its own
+    locks and job queue, so refreshing one pair never blocks another.
+    '''
+
+    def __init__(self, symbol, interval, executor):
+        self.symbol = symbol
+        self.interval = interval
+        self.current_snapshot = None
+        self.history = deque(maxlen=DELTA_HISTORY) # DeltaBase of recently superseded versions, oldest first
+        self.update_lock = threading.Lock() # Held for the whole update, prevents concurrent updates
+        self.snapshot_file = None
+        self.update_process_lock = None
+        if SNAPSHOT_FILE_PATH:
+            path = _pair_file_path(SNAPSHOT_FILE_PATH, symbol, interval)
+            self.snapshot_file = SnapshotFile(path)
+            self.update_process_lock = ProcessLock(path + ".update.lock")
+        self.last_reload_check = 0.0
+        self.queue = UpdateJobQueue(self._run_update_job, executor=executor)
+        self.pending_klines = {} # Streamed klines not yet applied, by open time (latest message wins)
+        self.pending_lock = threading.Lock()
+        self.changed = threading.Condition() # Notified on every publish and tick, wakes /stream subscribers
+        self.published_rows = None # Rows of the frame this process last published, ticks start just before its end
+        self.live_tick = None # Latest tick on the current snapshot: {"version", "tick", "body"}
+        if self.snapshot_file is not None:
+            # 冷启动 - serve the last persisted chart right away (only its small header is parsed here)
+            self.last_reload_check = time.monotonic()
+            snapshot = self.snapshot_file.load_if_changed()
+            if snapshot is not None:
+                self.publish(snapshot)
+                logger.info(f"Serving persisted {symbol} {interval} snapshot from {snapshot.last_updated.isoformat()}")
+
+    def publish(self, snapshot):
+        '''Makes a snapshot current in this process (a single reference swap) and drops cached variants of older data.'''
+        previous = self.current_snapshot
+        if previous is not None and previous.version < snapshot.version:
+            # 旧版本只保留增量所需的尾部 - the superseded snapshot (frame, encodings, derived
+            # payloads) is released; only what /data?since= needs to diff against it is kept
+            self.history.append(delta_base(previous.version, snapshot_options(previous)))
+        self.current_snapshot = snapshot
+        if self.live_tick is not None and self.live_tick["version"] < snapshot.version:
+            self.live_tick = None # The new snapshot contains what the tick showed
+        variant_cache.invalidate((self.symbol, self.interval), snapshot.version)
+        with self.changed:
+            self.changed.notify_all()
+
+    def publish_tick(self, body):
+        '''Makes a tick (JSON body of a "tick" event) current, and shares it with other processes.'''
+        if self.snapshot_file is not None:
+            self.snapshot_file.publish_tick(body)
+        self._set_tick(body)
+
+    def _set_tick(self, body):
+        header = json.loads(body)
+        current, tick = self.current_snapshot, self.live_tick
+        if current is None or header["version"] != current.version:
+            return # A tick on a snapshot this process does not serve (yet)
+        if tick is not None and tick["version"] == header["version"] and tick["tick"] >= header["tick"]:
+            return
+        self.live_tick = {"version": header["version"], "tick": header["tick"], "body": body.decode("utf-8")}
+        with self.changed:
+            self.changed.notify_all()
+
+    def get_snapshot(self):
+        '''Current snapshot, picking up one published by another process when a shared file is used.'''
+        if self.snapshot_file is not None and time.monotonic() - self.last_reload_check >= SNAPSHOT_RELOAD_INTERVAL:
+            self.last_reload_check = time.monotonic()
+            loaded = self.snapshot_file.load_if_changed()
+            current = self.current_snapshot
+            if loaded is not None and (current is None or loaded.version > current.version):
+                self.publish(loaded)
+            tick = self.snapshot_file.load_tick_if_changed()
+            if tick is not None:
+                self._set_tick(tick)
+        return self.current_snapshot
+
+    def _run_update_job(self, progress, profile=False):
+        if not profile:
+            if not update_chart_data(progress, self.symbol, self.interval):
+                raise RuntimeError("Data update failed or was skipped, see server log.")
+            return None
+        path = os.path.join(PROFILE_DIR, f"{self.symbol}_{self.interval}_{datetime.datetime.now():%Y%m%d-%H%M%S}.prof")
+        ok, summary = run_profiled(lambda: update_chart_data(progress, self.symbol, self.interval), path)
+        logger.info(f"Profile of the {self.symbol} {self.interval} refresh written to {path}")
+        if not ok:
+            raise RuntimeError(f"Data update failed or was skipped, see server log (profile: {path}).")
+        return {"profile": {"path": path, "top": summary}}
+
+# Manual and scheduled refreshes of all pairs share one bounded worker pool
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="update")
+channels = {pair: ChartChannel(pair[0], pair[1], pipeline_executor) for pair in CHART_PAIRS}
+
+def get_snapshot(symbol=DEFAULT_SYMBOL, interval=DEFAULT_INTERVAL):
+    return channels[(symbol, interval)].get_snapshot()
+
+def _acquire_update_locks(channel, timeout=0):
+    '''
+    Takes the channel's update locks, waiting up to `timeout` seconds for an update running in this
+    or another process; False if it is still running.
+    '''
+    deadline = time.monotonic() + timeout
+    acquired = channel.update_lock.acquire(timeout=timeout) if timeout > 0 else channel.update_lock.acquire(blocking=False)
+    if not acquired:
+        return False
+    if channel.update_process_lock is not None and not channel.update_process_lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        channel.update_lock.release()
+        return False
+    return True
+
+def _release_update_locks(channel):
+    if channel.update_process_lock is not None:
+        channel.update_process_lock.release()
+    channel.update_lock.release()
+
+def _publish_processed(channel, options, processed_df):
+    '''Builds the next snapshot of a channel from fresh chart options and publishes it (file first, then memory).'''
+    previous = channel.get_snapshot()
+    with STAGE_SECONDS.time(stage="serialize"):
+        snapshot = build_snapshot(options, datetime.datetime.now(), previous.version if previous else 0, processed_df)
+    with STAGE_SECONDS.time(stage="publish"):
+        if channel.snapshot_file is not None:
+            channel.snapshot_file.publish(snapshot)
+        channel.publish(snapshot)
+        channel.published_rows = len(processed_df)
+    for coding, body in snapshot.encodings.items():
+        SNAPSHOT_BYTES.set(len(body), symbol=channel.symbol, interval=channel.interval, coding=coding)
+    return snapshot
+
+def update_chart_data(progress=None, symbol=DEFAULT_SYMBOL, interval=DEFAULT_INTERVAL):
+    '''
+    Fetches new data for one pair, processes it, and publishes a new chart snapshot.
+    Returns True on success. `progress` is called with the name of each stage as it starts.
+    '''
+    channel = channels[(symbol, interval)]
+    # A streamed tick holds the locks for milliseconds, so wait for it (or a refresh from another process) rather than skip
+    if not _acquire_update_locks(channel, timeout=UPDATE_LOCK_WAIT):
+        logger.info(f"Data update for {symbol} {interval} still in progress after {UPDATE_LOCK_WAIT}s. Skipping.")
+        REFRESHES.inc(symbol=symbol, interval=interval, result="skipped")
+        return False
+
+    progress = progress or (lambda stage: None)
+    logger.info(f"Starting data update for {symbol} {interval}...")
+    started = time.perf_counter()
+    try:
+        progress("fetching")
+        processed_df = get_processed_data(symbol, interval)
+        progress("building")
+        options = generate_echarts_options(processed_df, symbol=symbol, interval=interval)
+        progress("publishing")
+        snapshot = _publish_processed(channel, options, processed_df)
+        elapsed = time.perf_counter() - started
+        REFRESH_SECONDS.observe(elapsed, symbol=symbol, interval=interval)
+        REFRESHES.inc(symbol=symbol, interval=interval, result="succeeded")
+        logger.info(f"Data update for {symbol} {interval} successful in {elapsed:.2f}s. Last updated: {snapshot.last_updated.isoformat()}")
+        return True
+    except Exception as e:
+        REFRESH_SECONDS.observe(time.perf_counter() - started, symbol=symbol, interval=interval)
+        REFRESHES.inc(symbol=symbol, interval=interval, result="failed")
+        logger.error(f"Error updating chart data for {symbol} {interval}: {e}", exc_info=True)
+        return False
+    finally:
+        _release_update_locks(channel)
+
+def on_stream_kline(symbol, interval, kline, closed):
+    '''KlineStream callback (stream thread): parks the kline until the next flush of its channel.'''
+    channel = channels.get((symbol, interval))
+    if channel is not None:
+        with channel.pending_lock:
+            channel.pending_klines[kline[0]] = kline
+
+def flush_stream_updates(channel):
+    '''
+    Applies the klines streamed since the last flush to the channel's chart and pushes them as a
+    tick. The klines go into the candle store only once they line up with the loaded candles; a
+    gap (e.g. after a reconnect) queues a regular refresh instead. Returns True if a tick was pushed.
+    '''
+    with channel.pending_lock:
+        klines, channel.pending_klines = list(channel.pending_klines.values()), {}
+    if not klines:
+        return False
+    if not _acquire_update_locks(channel):
+        # A refresh is running: keep the klines for the next flush, unless newer ones arrived meanwhile
+        with channel.pending_lock:
+            for kline in klines:
+                channel.pending_klines.setdefault(kline[0], kline)
+        return False
+    needs_refresh = False
     try:
-        processed_df = get_processed_data()
-        echarts_options = generate_echarts_options(processed_df)
-        last_updated_time = datetime.datetime.now()
-        logger.info(f"Data update successful. Last updated: {last_updated_time.isoformat()}")
+        snapshot = channel.get_snapshot()
+        processed_df = apply_live_klines(channel.symbol, channel.interval, klines)
+        if processed_df is None or snapshot is None or channel.published_rows is None:
+            needs_refresh = True
+            return False
+        upsert_klines(klines, channel.symbol, channel.interval)
+        _publish_tick(channel, snapshot, processed_df)
+        REFRESHES.inc(symbol=channel.symbol, interval=channel.interval, result="streamed")
+        return True
     except Exception as e:
-        logger.error(f"Error updating chart data: {e}", exc_info=True)
+        logger.error(f"Error applying streamed klines for {channel.symbol} {channel.interval}: {e}", exc_info=True)
+        return False
     finally:
-        data_update_in_progress = False
+        _release_update_locks(channel)
+        if needs_refresh:
+            # Only once the locks are released, so the queued refresh does not find this flush still running
+            channel.queue.submit(source="stream")
+
+def _publish_tick(channel, snapshot, processed_df):
+    '''
+    Tick of the live frame on the published snapshot: the chart tail from a few rows before the
+    end of the published frame, as a delta on the snapshot. Only those rows are turned into
+    options, so a tick costs the same for any history length.
+    '''
+    start = max(channel.published_rows - STREAM_TICK_ROWS, 0)
+    with STAGE_SECONDS.time(stage="tick"):
+        options = generate_echarts_options(processed_df.iloc[start:], symbol=channel.symbol, interval=channel.interval)
+        previous = channel.live_tick
+        body = serialize_json({
+            "version": snapshot.version,
+            "tick": previous["tick"] + 1 if previous is not None and previous["version"] == snapshot.version else 1,
+            "delta": {
+                "xAxis": {"start": start, "data": options["xAxis"]["data"]},
+                "series": [{"start": start, "data": series["data"]} for series in options["series"]]
+            },
+            "last_updated": datetime.datetime.now().isoformat()
+        })
+        channel.publish_tick(body)
+
+def _stream_flush_loop(stop_event):
+    while not stop_event.wait(STREAM_PUBLISH_INTERVAL):
+        for channel in channels.values():
+            flush_stream_updates(channel)
+
+def start_streaming(url=None):
+    '''Starts the kline stream of all pairs and the throttled publisher. Returns a function stopping both.'''
+    from SMA.stream import KlineStream
+    stream = KlineStream(CHART_PAIRS, on_stream_kline, url).start()
+    stop_event = threading.Event()
+    threading.Thread(target=_stream_flush_loop, args=(stop_event,), name="stream-flush", daemon=True).start()
+    logger.info(f"Streaming klines from {stream.url}")
+    def stop():
+        stop_event.set()
+        stream.stop()
+    return stop
+
+def schedule_update():
+    '''Queues a refresh of every configured pair; the pairs run concurrently on the pipeline pool.'''
+    for channel in channels.values():
+        channel.queue.submit(source="scheduler")
+
+def _last_updated_iso(snapshot):
+    return snapshot.last_updated.isoformat() if snapshot else None
+
+def _unknown_pair_response(symbol, interval):
+    return jsonify({
+        "error": f"Unknown chart {symbol} {interval}.",
+        "pairs": [f"{s}/{i}" for s, i in CHART_PAIRS]
+    }), 404
 
 @app.route('/')
 def index():
     # We will create templates/index.html in a later step
-    return render_template('index.html', last_updated=last_updated_time.isoformat() if last_updated_time else "Not yet updated")
+    snapshot = get_snapshot()
+    return render_template(
+        'index.html',
+        last_updated=_last_updated_iso(snapshot) or "Not yet updated",
+        pairs=[f"{s}/{i}" for s, i in CHART_PAIRS],
+        streaming=STREAMING_ENABLED
+    )
 
 @app.route('/data')
-def get_data_json(): # Renamed to avoid conflict with any 'data' variable
-    global echarts_options, last_updated_time
-    if not echarts_options:
+@app.route('/data/<symbol>/<interval>')
+def get_data_json(symbol=DEFAULT_SYMBOL, interval=DEFAULT_INTERVAL): # Renamed to avoid conflict with any 'data' variable
+    channel = channels.get((symbol.upper(), interval))
+    if channel is None:
+        return _unknown_pair_response(symbol, interval)
+    snapshot = channel.get_snapshot()
+    if snapshot is None:
         # This case might happen if the first scheduled job hasn't finished yet
         # or if there was an error during the initial update.
         logger.warning("ECharts options not available yet.")
         return jsonify({
             "error": "Data not available yet. Please try again in a moment.",
             "echarts_options": {},
-            "last_updated": last_updated_time.isoformat() if last_updated_time else None
+            "last_updated": None
         }), 503 # Service Unavailable
 
-    return jsonify({
-        "echarts_options": echarts_options,
-        "last_updated": last_updated_time.isoformat() if last_updated_time else None
+    if any(name in request.args for name in VARIANT_ARGS):
+        return _variant_response(channel, snapshot)
+
+    since = request.args.get('since', type=int)
+    if since is not None:
+        delta_payload = _get_delta_payload(channel, snapshot, since)
+        if delta_payload is not None:
+            return _payload_response(delta_payload, snapshot.last_updated)
+        # Unknown or too old version: fall through to the full snapshot
+
+    if _wants_binary() and snapshot.frame is not None: # ColumnarFrame or DataFrame
+        return _payload_response(_get_binary_payload(channel, snapshot), snapshot.last_updated, BINARY_MIMETYPE)
+    return _payload_response({"encodings": snapshot.encodings, "etag": snapshot.etag}, snapshot.last_updated)
+
+def _wants_binary():
+    '''Binary columnar bodies are only sent to clients that explicitly prefer them over JSON.'''
+    return request.accept_mimetypes.best_match(["application/json", BINARY_MIMETYPE]) == BINARY_MIMETYPE
+
+def _get_binary_payload(channel, snapshot):
+    '''Binary encoding of the full snapshot, built on first request and kept with the snapshot.'''
+    key = ("binary",)
+    record_cache("binary", key in snapshot.derived)
+    if key not in snapshot.derived:
+        body = encode_chart_binary(
+            snapshot_frame(snapshot), snapshot_options(snapshot), snapshot.version, snapshot.last_updated,
+            is_intraday(channel.interval)
+        )
+        encodings, etag = encode_payload(body)
+        snapshot.derived[key] = {"encodings": encodings, "etag": etag}
+    return snapshot.derived[key]
+
+VARIANT_ARGS = ("start", "end", "max_points", "indicators", "future_days")
+MAX_POINTS_LIMIT = 100000
+DEFAULT_FUTURE_DAYS = 1460 # Empty dates after the last candle (daily charts), four years ≈ one halving cycle
+MAX_FUTURE_DAYS = 3650
+MAX_INDICATORS = 8
+MAX_CACHED_INDICATOR_SETS = 16 # Indicator frames kept per snapshot; rarer combinations are recomputed
+
+def _parse_indicator_arg(args):
+    '''[(name, window)] from ?indicators=sma:50,rsi:14 (see SMA.factors). Raises ValueError.'''
+    indicators = parse_indicator_specs(args.get("indicators", ""))
+    if len(indicators) > MAX_INDICATORS:
+        raise ValueError(f"at most {MAX_INDICATORS} indicators per chart")
+    return indicators
+
+def _parse_future_days(args):
+    future_days = int(args["future_days"]) if args.get("future_days") else DEFAULT_FUTURE_DAYS
+    if not 0 <= future_days <= MAX_FUTURE_DAYS:
+        raise ValueError(f"future_days must be between 0 and {MAX_FUTURE_DAYS}")
+    return future_days
+
+def _parse_range_args(args):
+    '''(start, end, max_points) from /data query args; dates are YYYY-MM-DD. Raises ValueError.'''
+    start = datetime.date.fromisoformat(args["start"]) if args.get("start") else None
+    end = datetime.date.fromisoformat(args["end"]) if args.get("end") else None
+    if start and end and start > end:
+        raise ValueError("start must not be after end")
+    max_points = int(args["max_points"]) if args.get("max_points") else None
+    if max_points is not None and not 10 <= max_points <= MAX_POINTS_LIMIT:
+        raise ValueError(f"max_points must be between 10 and {MAX_POINTS_LIMIT}")
+    return start, end, max_points
+
+def _variant_response(channel, snapshot):
+    '''
+    /data?start=&end=&max_points=&indicators=&future_days=: the chart for a date range, optionally
+    downsampled, with any requested indicator series. Built payloads are kept in the variant
+    cache until the pair publishes new data.
+    '''
+    try:
+        start, end, max_points = _parse_range_args(request.args)
+        indicators = _parse_indicator_arg(request.args)
+        future_days = _parse_future_days(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range parameters: {e}"}), 400
+    if snapshot.frame is None:
+        return jsonify({"error": "Range queries are not available for this snapshot yet."}), 503
+
+    binary = _wants_binary()
+    coding = choose_encoding(request.accept_encodings, AVAILABLE_CODINGS)
+    params = ("binary" if binary else "json", coding, start, end, max_points, tuple(indicators), future_days)
+    try:
+        payload = variant_cache.get_or_build(
+            (channel.symbol, channel.interval), snapshot.version, params,
+            lambda: _build_variant(channel, snapshot, start, end, max_points, indicators, future_days, binary, coding)
+        )
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    return _payload_response(payload, snapshot.last_updated, BINARY_MIMETYPE if binary else "application/json")
+
+def _build_variant(channel, snapshot, start, end, max_points, indicators, future_days, binary, coding):
+    '''Serialized chart variant ({"encodings", "etag"}); raises LookupError for an empty range.'''
+    from SMA.data_processor import HALVING_DATES
+    frame = snapshot_frame(snapshot)
+    if indicators:
+        frame = _frame_with_indicators(channel, snapshot, indicators)
+
+    sliced = slice_frame(frame, start, end)
+    if sliced.empty:
+        raise LookupError("No data in the requested range.")
+
+    # Future padding only makes sense when the range reaches the latest candle
+    if sliced.index[-1] != frame.index[-1]:
+        future_days = 0
+    future_step = 1
+    if max_points is not None:
+        keep = _index_labels(HALVING_DATES, frame.index)
+        sampled = downsample_frame(sliced, max_points, keep)
+        future_step = max(1, round(len(sliced) / len(sampled)))
+        sliced = sampled
+
+    options = generate_echarts_options(sliced, future_days, future_step, channel.symbol, channel.interval, indicators)
+    indicator_columns = [indicator_column(name, window) for name, window in indicators]
+    if binary:
+        body = encode_chart_binary(
+            sliced, options, snapshot.version, snapshot.last_updated, is_intraday(channel.interval), indicator_columns
+        )
+    else:
+        body = serialize_json({
+            "version": snapshot.version,
+            "echarts_options": options,
+            "last_updated": _last_updated_iso(snapshot),
+            "range": {
+                "start": start.isoformat() if start else None,
+                "end": end.isoformat() if end else None,
+                "max_points": max_points,
+                "points": len(sliced),
+                "indicators": indicator_columns
+            }
+        })
+    encodings, etag = encode_payload(body, codings=(coding,))
+    return {"encodings": encodings, "etag": etag}
+
+def _frame_with_indicators(channel, snapshot, indicators):
+    '''
+    Snapshot frame plus the requested indicator columns, computed over the whole history (so
+    windows are full at the start of any range) and kept with the snapshot per indicator set.
+    '''
+    key = ("indicators", tuple(indicators))
+    record_cache("indicators", key in snapshot.derived)
+    if key in snapshot.derived:
+        return snapshot.derived[key]
+    base = snapshot_frame(snapshot)
+    columns = compute_indicators(base, indicators, channel.interval)
+    new = columns.columns.difference(base.columns)
+    frame = base.join(columns[new]) if len(new) else base
+    if sum(1 for k in list(snapshot.derived) if k[0] == "indicators") < MAX_CACHED_INDICATOR_SETS:
+        snapshot.derived[key] = frame
+    return frame
+
+def _index_labels(dates, index):
+    '''ISO date strings as labels comparable with `index` (date objects or a DatetimeIndex).'''
+    import pandas as pd
+    if isinstance(index, pd.DatetimeIndex):
+        return pd.to_datetime(dates)
+    return [datetime.date.fromisoformat(d) for d in dates]
+
+def _get_delta_payload(channel, snapshot, since):
+    '''Pre-serialized delta from version `since` to `snapshot`, or None if that version is not retained.'''
+    key = ("delta", since)
+    record_cache("delta", key in snapshot.derived)
+    if key in snapshot.derived:
+        return snapshot.derived[key]
+
+    if since == snapshot.version:
+        base = delta_base(since, snapshot_options(snapshot))
+    else:
+        base = next((b for b in list(channel.history) if b.version == since), None)
+    if base is None or base.version > snapshot.version:
+        return None
+    delta = compute_delta_since(base, snapshot_options(snapshot))
+    if delta is None:
+        return None
+
+    encodings, etag = encode_payload(serialize_json({
+        "version": snapshot.version,
+        "since": since,
+        "delta": delta,
+        "last_updated": _last_updated_iso(snapshot)
+    }))
+    snapshot.derived[key] = {"encodings": encodings, "etag": etag}
+    return snapshot.derived[key]
+
+def _payload_response(payload, last_modified, mimetype="application/json"):
+    '''Serves a pre-serialized body, answering conditional requests with 304.'''
+    coding = choose_encoding(request.accept_encodings, payload["encodings"])
+    etag = variant_etag(payload["etag"], coding)
+    last_modified = last_modified.replace(microsecond=0).astimezone(datetime.timezone.utc)
+
+    if request.if_none_match:
+        not_modified = any(
+            request.if_none_match.contains(variant_etag(payload["etag"], c)) for c in payload["encodings"]
+        )
+    else:
+        not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = Response(payload["encodings"][coding], mimetype=mimetype)
+        if coding != "identity":
+            response.headers["Content-Encoding"] = coding
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers["Cache-Control"] = "no-cache" # Always revalidate, 304s are cheap
+    response.vary.add("Accept-Encoding")
+    response.vary.add("Accept")
+    return response
+
+BACKTEST_ARGS = ("entry_below", "exit_above", "fear_entry", "fear_exit")
+# Backtests run on the request thread at roughly 25M combination x candle cells per second, so the
+# budget is in cells: about 8000 combinations on 3000 daily candles, 350 on 72k hourly ones
+MAX_BACKTEST_CELLS = 25_000_000
+MAX_BACKTEST_TOP = 20
+
+def _parse_backtest_args(args, candles):
+    '''(values per rule, options) from /backtest query args for a frame of `candles` rows. Raises ValueError.'''
+    values = []
+    combinations = 1
+    max_combinations = MAX_BACKTEST_CELLS // max(candles, 1)
+    for name in BACKTEST_ARGS:
+        # Each rule may use what the previous ones left of the budget; ranges are counted, not expanded
+        budget = max_combinations // combinations
+        rule_values = tuple(parse_values(args.get(name, ""), max_values=budget))
+        values.append(rule_values)
+        combinations *= len(rule_values)
+    values = tuple(values)
+    options = {"top": int(args.get("top", 5)), "sort": args.get("sort", "sharpe")}
+    if not 1 <= options["top"] <= MAX_BACKTEST_TOP:
+        raise ValueError(f"top must be between 1 and {MAX_BACKTEST_TOP}")
+    if args.get("fee_bps"):
+        options["fee_bps"] = float(args["fee_bps"])
+        if not 0 <= options["fee_bps"] <= 1000:
+            raise ValueError("fee_bps must be between 0 and 1000")
+    return values, options
+
+@app.route('/backtest')
+@app.route('/backtest/<symbol>/<interval>')
+def get_backtest(symbol=DEFAULT_SYMBOL, interval=DEFAULT_INTERVAL):
+    '''
+    Backtest of SMA-deviation / Fear & Greed rules on the pair's published data, e.g.
+    /backtest?entry_below=20:60:5&exit_above=50,100,150&fear_exit=80,none&sort=sharpe&top=5.
+    Every combination of the listed values is evaluated (see SMA.backtest); reports are kept in
+    the variant cache until the pair publishes new data.
+    '''
+    channel = channels.get((symbol.upper(), interval))
+    if channel is None:
+        return _unknown_pair_response(symbol, interval)
+    snapshot = channel.get_snapshot()
+    if snapshot is None or snapshot.frame is None:
+        return jsonify({"error": "Data not available yet. Please try again in a moment."}), 503
+    try:
+        values, options = _parse_backtest_args(request.args, len(snapshot_frame(snapshot)))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid backtest parameters: {e}"}), 400
+
+    coding = choose_encoding(request.accept_encodings, AVAILABLE_CODINGS)
+    params = ("backtest", coding, values, tuple(sorted(options.items())))
+    try:
+        payload = variant_cache.get_or_build(
+            (channel.symbol, channel.interval), snapshot.version, params,
+            lambda: _build_backtest(channel, snapshot, values, options, coding)
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Invalid backtest parameters: {e}"}), 400
+    return _payload_response(payload, snapshot.last_updated)
+
+def _build_backtest(channel, snapshot, values, options, coding):
+    report = backtest_report(snapshot_frame(snapshot), parameter_grid(*values), interval=channel.interval, **options)
+    body = serialize_json({
+        "version": snapshot.version,
+        "symbol": channel.symbol,
+        "interval": channel.interval,
+        "last_updated": _last_updated_iso(snapshot),
+        **report
     })
+    encodings, etag = encode_payload(body, codings=(coding,))
+    return {"encodings": encodings, "etag": etag}
+
+def _parse_pairs_arg(text):
+    '''[(SYMBOL, interval)] from "BTCUSDT:1d,ETHUSDT:1d". Raises ValueError.'''
+    pairs = []
+    for part in text.split(","):
+        if part.strip():
+            symbol, sep, interval = part.strip().partition(":")
+            if not sep:
+                raise ValueError(f"pair {part!r} must look like SYMBOL:INTERVAL")
+            pairs.append((symbol.upper(), interval))
+    return pairs
+
+@app.route('/export')
+@app.route('/export/<symbol>/<interval>')
+def export_data(symbol=DEFAULT_SYMBOL, interval=DEFAULT_INTERVAL):
+    '''
+    Published data of one or more pairs as a streamed file, e.g.
+    /export/BTCUSDT/1d?format=parquet&start=2020-01-01&columns=Close,SMA_200,Fear_Greed&indicators=rsi:14
+    or /export?pairs=BTCUSDT:1d,ETHUSDT:1d&format=ndjson. format is csv (default), ndjson or
+    parquet; rows are encoded chunk by chunk while the response is sent (see SMA.export).
+    '''
+    from SMA.export import EXPORT_FORMATS, available_formats, iter_export, select_export
+    try:
+        pairs = _parse_pairs_arg(request.args["pairs"]) if request.args.get("pairs") else [(symbol.upper(), interval)]
+        start, end, _ = _parse_range_args(request.args)
+        indicators = _parse_indicator_arg(request.args)
+        columns = [c.strip() for c in request.args.get("columns", "").split(",") if c.strip()]
+        export_format = request.args.get("format", "csv")
+        if export_format not in available_formats():
+            raise ValueError(f"format must be one of {', '.join(available_formats())}")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid export parameters: {e}"}), 400
+
+    frames = []
+    for pair in pairs:
+        channel = channels.get(pair)
+        if channel is None:
+            return _unknown_pair_response(*pair)
+        snapshot = channel.get_snapshot()
+        if snapshot is None or snapshot.frame is None:
+            return jsonify({"error": f"Data for {channel.symbol} {channel.interval} not available yet."}), 503
+        frame = _frame_with_indicators(channel, snapshot, indicators) if indicators else snapshot_frame(snapshot)
+        try:
+            frames.append((channel.symbol, channel.interval, select_export(frame, start, end, columns)))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid export parameters: {e}"}), 400
+
+    name = "_".join(f"{s}_{i}" for s, i in pairs) if len(pairs) <= 4 else f"{len(pairs)}_pairs"
+    response = Response(iter_export(frames, export_format), mimetype=EXPORT_FORMATS[export_format])
+    response.headers["Content-Disposition"] = f'attachment; filename="{name}.{export_format}"'
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 @app.route('/update_data', methods=['POST'])
-def trigger_manual_update_data():
-    global data_update_in_progress
-    logger.info("Manual data update triggered by user.")
-    if data_update_in_progress:
-        return jsonify({"message": "Data update already in progress. Please wait."}), 429 # Too Many Requests
-    
-    # Run update in a separate thread to avoid blocking the request, 
-    # although APScheduler also runs in background.
-    # For simplicity here, direct call, but for long tasks, threading/task queue is better.
-    update_chart_data() 
-    return jsonify({"message": "Data update process started.", "last_updated": last_updated_time.isoformat() if last_updated_time else "Updating..."})
-
-# Initialize and start APScheduler
+@app.route('/update_data/<symbol>/<interval>', methods=['POST'])
+def trigger_manual_update_data(symbol=DEFAULT_SYMBOL, interval=DEFAULT_INTERVAL):
+    channel = channels.get((symbol.upper(), interval))
+    if channel is None:
+        return _unknown_pair_response(symbol, interval)
+    logger.info(f"Manual data update for {channel.symbol} {channel.interval} triggered by user.")
+    # ?profile=1 runs this refresh under cProfile; the job result lists the hottest functions
+    params = {"profile": True} if request.args.get("profile") in ("1", "true") else {}
+    # Never run the update on the request thread: queue it (or join the active one) and return at once
+    job, coalesced = channel.queue.submit(source="manual", **params)
+    response = jsonify({
+        "message": "Data update already in progress." if coalesced else "Data update process started.",
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/update_status/{job['id']}",
+        "last_updated": _last_updated_iso(channel.get_snapshot())
+    })
+    response.status_code = 202 # Accepted
+    response.headers["Location"] = f"/update_status/{job['id']}"
+    return response
+
+@app.route('/update_status/<job_id>')
+def get_update_status(job_id):
+    for channel in channels.values():
+        job = channel.queue.get(job_id)
+        if job is not None:
+            job["symbol"] = channel.symbol
+            job["interval"] = channel.interval
+            job["last_updated"] = _last_updated_iso(channel.get_snapshot())
+            return jsonify(job)
+    return jsonify({"error": "Unknown job id."}), 404
+
+@app.route('/stream')
+@app.route('/stream/<symbol>/<interval>')
+def stream_chart_updates(symbol=DEFAULT_SYMBOL, interval=DEFAULT_INTERVAL):
+    '''
+    Server-sent events of one chart: a "delta" event (the /data?since= body) for every published
+    version, or "reload" when the client's version is no longer retained, and in streaming mode
+    "tick" events with the live tail on the current version. The event id is the version, so a
+    reconnecting browser resumes from its Last-Event-ID. Needs a threaded (or
+    async) server, every subscriber holds a connection.
+    '''
+    channel = channels.get((symbol.upper(), interval))
+    if channel is None:
+        return _unknown_pair_response(symbol, interval)
+    # A reconnecting EventSource sends the id of the last event it got, newer than its URL's ?since=
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    response = Response(_chart_events(channel, since), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no" # nginx: pass events through unbuffered
+    return response
+
+def _chart_events(channel, since):
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    if since is None and channel.get_snapshot() is not None:
+        since = channel.get_snapshot().version # Nothing to catch up on, only later versions are sent
+    last_event = 0.0
+    last_write = time.monotonic()
+    sent_tick = None
+    while True:
+        snapshot = channel.get_snapshot()
+        tick = channel.live_tick
+        new_version = snapshot is not None and snapshot.version != since
+        new_tick = (not new_version and tick is not None and tick["version"] == since and tick["tick"] != sent_tick)
+        if new_version or new_tick:
+            wait = SSE_MIN_INTERVAL - (time.monotonic() - last_event)
+            if wait > 0:
+                time.sleep(wait) # Throttle: versions published meanwhile are merged into one delta
+                continue
+            if new_version:
+                yield _chart_event(channel, snapshot, since)
+                since, sent_tick = snapshot.version, None
+            else:
+                # No id: a reconnect resumes from the snapshot version and gets the latest tick again
+                yield f"event: tick\ndata: {tick['body']}\n\n"
+                sent_tick = tick["tick"]
+            last_event = last_write = time.monotonic()
+            continue
+        if time.monotonic() - last_write >= SSE_KEEPALIVE_INTERVAL:
+            yield ": keepalive\n\n"
+            last_write = time.monotonic()
+        with channel.changed:
+            # Also wakes up periodically, to see snapshots published by other processes
+            channel.changed.wait(SNAPSHOT_RELOAD_INTERVAL)
+
+def _chart_event(channel, snapshot, since):
+    payload = _get_delta_payload(channel, snapshot, since) if since is not None else None
+    if payload is not None:
+        event, data = "delta", payload["encodings"]["identity"].decode("utf-8")
+    else:
+        event, data = "reload", serialize_json({"version": snapshot.version, "last_updated": _last_updated_iso(snapshot)}).decode("utf-8")
+    return f"id: {snapshot.version}\nevent: {event}\ndata: {data}\n\n"
+
+@app.route('/metrics')
+def get_metrics():
+    '''Per-process counters and histograms in the Prometheus text format.'''
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.pop("request_started", None)
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method, status=response.status_code)
+    if not response.is_streamed and response.status_code != 304:
+        RESPONSE_BYTES.observe(response.content_length or 0, endpoint=endpoint)
+    return response
+
+# Initialize and start APScheduler. With a shared snapshot file only one process (the holder of
+# the leader lock) schedules refreshes; the other workers just serve what it publishes.
+scheduler_lock = ProcessLock(SNAPSHOT_FILE_PATH + ".leader.lock") if SNAPSHOT_FILE_PATH else None
 scheduler = BackgroundScheduler()
 # Schedule job to run every 30 minutes
-scheduler.add_job(func=update_chart_data, trigger="interval", minutes=30)
+scheduler.add_job(func=schedule_update, trigger="interval", minutes=30)
 # Schedule job to run once at startup, after a small delay to allow app to initialize
-scheduler.add_job(func=update_chart_data, trigger="date", run_date=datetime.datetime.now() + datetime.timedelta(seconds=5))
-scheduler.start()
+scheduler.add_job(func=schedule_update, trigger="date", run_date=datetime.datetime.now() + datetime.timedelta(seconds=STARTUP_REFRESH_DELAY))
+stop_streaming = None
+if not SCHEDULER_ENABLED:
+    logger.info("Scheduler disabled (CHART_SCHEDULER=0); refreshes only run when requested")
+elif scheduler_lock is None or scheduler_lock.acquire():
+    scheduler.start()
+    if STREAMING_ENABLED:
+        stop_streaming = start_streaming()
+else:
+    logger.info(f"Another process owns the scheduler; serving snapshots from {SNAPSHOT_FILE_PATH}")
 
 # Ensure scheduler shuts down cleanly when app exits
 import atexit
-atexit.register(lambda: scheduler.shutdown())
+atexit.register(lambda: scheduler.shutdown() if scheduler.running else None)
+atexit.register(lambda: stop_streaming() if stop_streaming else None)
+atexit.register(lambda: pipeline_executor.shutdown(wait=False, cancel_futures=True))
 
 if __name__ == '__main__':
     # The initial data update is now handled by the scheduler.
@@ -1 +1,10 @@
 # This file makes the 'tests' directory a Python package.
+import os
+import tempfile
+
+# Keep the server's persisted snapshots and the candle store out of SMA/output while testing, and
+# keep the scheduler from refreshing every pair from the live APIs in the middle of the tests
+_output_dir = tempfile.mkdtemp(prefix="btc-tests-")
+os.environ.setdefault("CHART_SNAPSHOT_FILE", os.path.join(_output_dir, "snapshot.bin"))
+os.environ.setdefault("CHART_CANDLE_STORE", os.path.join(_output_dir, "candles.sqlite"))
+os.environ.setdefault("CHART_SCHEDULER", "0")
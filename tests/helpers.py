@@ -0,0 +1,37 @@
+# Synthetic offline data shared by the tests that must not depend on live APIs.
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from SMA.data_fetcher import FEAR_GREED_CLASSES
+from SMA.data_processor import join_fear_greed
+from SMA.indicator import calculate_percentages
+
+
+def make_candles(n, seed=0, start=date(2017, 1, 1)):
+    rng = np.random.default_rng(seed)
+    close = np.round(np.exp(np.cumsum(rng.normal(0, 0.03, n))) * 20000, 2)
+    index = pd.date_range(start, periods=n, freq="D", name='Date')
+    return pd.DataFrame({
+        'Low': np.round(close * 0.97, 2),
+        'High': np.round(close * 1.03, 2),
+        'Close': close,
+    }, index=index)
+
+
+def make_fear_greed(candles, seed=0, skip=400):
+    rng = np.random.default_rng(seed)
+    index = candles.index[skip:]
+    values = rng.integers(0, 101, len(index))
+    classes = np.where(values < 25, 'Extreme Fear', np.where(values < 50, 'Fear', np.where(values < 75, 'Greed', 'Extreme Greed')))
+    return pd.DataFrame({
+        'value': values,
+        'value_classification': pd.Categorical(classes, categories=FEAR_GREED_CLASSES)
+    }, index=index.rename('date'))
+
+
+def make_processed_frame(n=1000, seed=0):
+    '''Same shape as get_processed_data(): candles, indicators and left-joined Fear & Greed.'''
+    candles = make_candles(n, seed)
+    return join_fear_greed(calculate_percentages(candles.copy()), make_fear_greed(candles, seed))
@@ -0,0 +1,174 @@
+import unittest
+import sys
+import os
+import json
+import math
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import numpy as np
+import pandas as pd
+
+import server
+from SMA import backtest
+from SMA.backtest import parse_values, parameter_grid, run_backtest, equity_curves, backtest_report, METRICS
+from tests.helpers import make_processed_frame
+
+
+def reference_backtest(frame, entry_below, exit_above, fear_entry, fear_exit, fee_bps, periods_per_year=365):
+    '''Candle-by-candle loop over the same rules, the behaviour run_backtest() vectorizes.'''
+    fee = fee_bps / 10000
+    close = frame["Close"].to_numpy(float)
+    low, high, fear_greed = (frame[c].to_numpy(float) for c in ("Low_Percentage", "High_Percentage", "Fear_Greed"))
+    in_market, equity, peak, drawdown, trades, held = False, 1.0, 1.0, 0.0, 0, 0
+    returns = []
+    for t in range(len(close)):
+        before = equity
+        if in_market and t > 0:
+            equity *= close[t] / close[t - 1]
+        entry = (entry_below is None or low[t] <= -entry_below) and (fear_entry is None or fear_greed[t] <= fear_entry)
+        exit_ = (exit_above is not None and high[t] >= exit_above) or (fear_exit is not None and fear_greed[t] >= fear_exit)
+        if in_market and exit_:
+            in_market = False
+            equity *= 1 - fee
+        elif not in_market and entry and not exit_:
+            in_market = True
+            trades += 1
+            equity *= 1 - fee
+        held += in_market
+        returns.append(equity / before - 1)
+        peak = max(peak, equity)
+        drawdown = min(drawdown, equity / peak - 1)
+    std = np.std(returns, ddof=1)
+    return {
+        "total_return": equity - 1,
+        "cagr": equity ** (periods_per_year / (len(close) - 1)) - 1,
+        "max_drawdown": drawdown,
+        "sharpe": np.mean(returns) / std * math.sqrt(periods_per_year) if std > 1e-12 else float("nan"),
+        "trades": trades,
+        "exposure": held / len(close)
+    }
+
+
+class TestParseValues(unittest.TestCase):
+
+    def test_lists_ranges_and_none(self):
+        self.assertEqual(parse_values("20:40:10,55,none"), [20.0, 30.0, 40.0, 55.0, None])
+        self.assertEqual(parse_values(""), [None])
+        self.assertEqual(parse_values("0.5:1.5:0.5"), [0.5, 1.0, 1.5])
+        for bad in ("10:5:1", "1:2:0", "abc", "inf"):
+            with self.assertRaises(ValueError):
+                parse_values(bad)
+
+    def test_ranges_are_counted_before_they_are_built(self):
+        self.assertEqual(parse_values("20:40:10,55", max_values=4), [20.0, 30.0, 40.0, 55.0])
+        with mock.patch("SMA.backtest.round", side_effect=AssertionError("range expanded"), create=True):
+            with self.assertRaises(ValueError):
+                parse_values("0:1e12:1", max_values=20000)
+        with self.assertRaises(ValueError):
+            parse_values("20:40:10,55", max_values=3)
+
+    def test_grid_is_the_product(self):
+        grid = parameter_grid([20, 30], [50, None], [None], [80, 90])
+        self.assertEqual(len(grid), 8)
+        self.assertEqual(int(grid["exit_above"].isna().sum()), 4)
+
+
+class TestRunBacktest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.frame = make_processed_frame(1500)
+        cls.grid = parameter_grid([None, 10, 25, 40], [None, 30, 80], [None, 40], [None, 75])
+
+    def test_matches_candle_loop(self):
+        stats = run_backtest(self.frame, self.grid, fee_bps=25, chunk_size=7)
+        self.assertEqual(len(stats), len(self.grid))
+        for _, row in stats.iterrows():
+            rules = [None if math.isnan(row[p]) else row[p] for p in ("entry_below", "exit_above", "fear_entry", "fear_exit")]
+            expected = reference_backtest(self.frame, *rules, fee_bps=25)
+            for metric in METRICS:
+                if math.isnan(expected[metric]):
+                    self.assertTrue(math.isnan(row[metric]), (rules, metric))
+                else:
+                    self.assertAlmostEqual(row[metric], expected[metric], places=9, msg=(rules, metric))
+        self.assertGreater(stats["trades"].max(), 1)
+
+    def test_chunks_follow_the_frame_length(self):
+        frame = make_processed_frame(900)
+        grid = parameter_grid([None, 10, 25, 40], [None, 30, 80])
+        with mock.patch("SMA.backtest._evaluate_chunk", wraps=backtest._evaluate_chunk) as evaluate, \
+                mock.patch.object(backtest, "CHUNK_CELLS", 5 * 900):
+            run_backtest(frame, grid)
+        self.assertEqual([len(c.args[1]) for c in evaluate.call_args_list], [5, 5, 2])
+
+    def test_process_pool_gives_the_same_stats(self):
+        serial = run_backtest(self.frame, self.grid)
+        pooled = run_backtest(self.frame, self.grid, workers=2, chunk_size=16)
+        pd.testing.assert_frame_equal(serial, pooled)
+
+    def test_equity_curves_end_at_total_return(self):
+        stats = run_backtest(self.frame, self.grid.head(5))
+        curves = equity_curves(self.frame, self.grid.head(5))
+        self.assertEqual(curves.shape, (len(self.frame), 5))
+        np.testing.assert_allclose(curves.iloc[-1].to_numpy() - 1, stats["total_return"].to_numpy())
+
+    def test_report_is_sorted_and_json_ready(self):
+        report = backtest_report(self.frame, self.grid, top=3, sort="total_return")
+        returns = [r["total_return"] for r in report["results"]]
+        self.assertEqual(returns, sorted(returns, reverse=True))
+        self.assertEqual(report["buy_and_hold"]["exposure"], 1.0)
+        self.assertEqual(len(report["equity"]), 3)
+        self.assertEqual(len(report["dates"]), len(report["buy_and_hold_equity"]))
+        json.dumps(report, allow_nan=False)
+        with self.assertRaises(ValueError):
+            backtest_report(self.frame, self.grid, sort="volume")
+
+
+class TestBacktestEndpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.patcher = mock.patch.object(server, "get_processed_data", side_effect=lambda *args: make_processed_frame(900))
+        cls.patcher.start()
+        server.app.testing = True
+        cls.client = server.app.test_client()
+        server.update_chart_data()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patcher.stop()
+
+    def test_backtest_report(self):
+        response = self.client.get('/backtest?entry_below=10:40:10&exit_above=30,80&fear_exit=none,75&top=2')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["combinations"], 16)
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(data["symbol"], server.DEFAULT_SYMBOL)
+
+        etag = response.headers["ETag"]
+        cached = self.client.get('/backtest?entry_below=10:40:10&exit_above=30,80&fear_exit=none,75&top=2',
+                                 headers={"If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_bad_parameters(self):
+        for query in ("entry_below=abc", "entry_below=1:30000:1", "entry_below=0:1e9:1",
+                      "entry_below=1:200:1&exit_above=1:200:1", "top=0", "sort=volume", "fee_bps=-1"):
+            self.assertEqual(self.client.get('/backtest?' + query).status_code, 400, query)
+        self.assertEqual(self.client.get('/backtest/NOPE/1d').status_code, 404)
+
+    def test_budget_is_in_cells(self):
+        query = {"entry_below": "10:40:10", "exit_above": "30,80"} # 8 combinations
+        with mock.patch.object(server, "MAX_BACKTEST_CELLS", 8 * 900):
+            values, _ = server._parse_backtest_args(query, 900)
+            self.assertEqual([len(v) for v in values], [4, 2, 1, 1])
+            with self.assertRaises(ValueError):
+                server._parse_backtest_args(query, 901) # Same grid, one candle more
+            self.assertEqual(self.client.get('/backtest?entry_below=10:40:10&exit_above=30,80,120').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
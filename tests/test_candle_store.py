@@ -0,0 +1,99 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from SMA import data_fetcher
+from SMA.candle_store import get_last_open_time, upsert_klines, load_klines
+
+DAY_MS = 24 * 60 * 60 * 1000
+START_MS = 1500000000000 // DAY_MS * DAY_MS
+
+
+def make_kline(open_time, close):
+    return [open_time, str(close), str(close + 10), str(close - 10), str(close), "1.0", open_time + DAY_MS - 1]
+
+
+class FakeResponse:
+    headers = {"X-MBX-USED-WEIGHT-1M": "2"}
+    status_code = 200
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class TestCandleStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.tmp_dir.name, "candles.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_upsert_replaces_open_candle(self):
+        upsert_klines([make_kline(START_MS, 100), make_kline(START_MS + DAY_MS, 200)], "BTCUSDT", "1d", self.store_path)
+        upsert_klines([make_kline(START_MS + DAY_MS, 250)], "BTCUSDT", "1d", self.store_path)
+
+        stored = load_klines("BTCUSDT", "1d", self.store_path)
+        self.assertEqual(len(stored), 2)
+        self.assertEqual(stored["close"].tolist(), [100.0, 250.0])
+        self.assertEqual(get_last_open_time("BTCUSDT", "1d", self.store_path), START_MS + DAY_MS)
+        self.assertIsNone(get_last_open_time("ETHUSDT", "1d", self.store_path))
+
+    def test_get_btc_data_only_requests_new_candles(self):
+        history = [make_kline(START_MS + i * DAY_MS, 100 + i) for i in range(5)]
+        upsert_klines(history, "BTCUSDT", "1d", self.store_path)
+
+        # The API re-sends the still-open last candle with an updated close, plus one new candle
+        fresh = [make_kline(START_MS + 4 * DAY_MS, 150), make_kline(START_MS + 5 * DAY_MS, 160)]
+        session = mock.Mock()
+        session.get.return_value = FakeResponse(fresh)
+        with mock.patch.object(data_fetcher, "get_session", return_value=session):
+            df = data_fetcher.get_btc_data(store_path=self.store_path)
+        get = session.get
+
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(get.call_args.kwargs["params"]["startTime"], START_MS + 4 * DAY_MS)
+        self.assertEqual(len(df), 6)
+        self.assertEqual(df["Close"].tolist(), [100.0, 101.0, 102.0, 103.0, 150.0, 160.0])
+
+
+class TestCandleIndex(unittest.TestCase):
+
+    def test_across_dst(self):
+        # Hourly candles over the 2023 US daylight-saving switches
+        open_times = [1678000000000 // 3600000 * 3600000 + i * 3600000 for i in range(24 * 300)]
+        previous_tz = os.environ.get("TZ")
+        os.environ["TZ"] = "America/New_York"
+        time.tzset()
+        try:
+            intraday = data_fetcher._candle_index(open_times, intraday=True)
+            daily = data_fetcher._candle_index(open_times[::24])
+            expected = [datetime.fromtimestamp(t / 1000) for t in open_times[::24]]
+        finally:
+            if previous_tz is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = previous_tz
+            time.tzset()
+        # Intraday candles are labelled in UTC, so the repeated hour of the fall-back stays two labels
+        self.assertTrue(intraday.is_unique and intraday.is_monotonic_increasing)
+        self.assertEqual(list(intraday.to_pydatetime()), [datetime.fromtimestamp(t / 1000, timezone.utc).replace(tzinfo=None) for t in open_times])
+        self.assertEqual([d.date() for d in daily], [d.date() for d in expected])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
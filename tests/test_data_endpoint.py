@@ -0,0 +1,237 @@
+import unittest
+import sys
+import os
+import gzip
+import json
+import time
+import threading
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import numpy as np
+
+import server
+from SMA.binary_payload import decode_chart_binary
+from SMA.payload import BINARY_MIMETYPE
+from SMA.data_processor import generate_echarts_options
+from SMA.delta import DeltaBase, TAIL_POINTS, compute_delta, compute_delta_since, delta_base
+from tests.helpers import make_processed_frame
+
+
+class TestDeltaBase(unittest.TestCase):
+
+    def test_matches_full_delta(self):
+        old = generate_echarts_options(make_processed_frame(500))
+        new = generate_echarts_options(make_processed_frame(503))
+        new["series"][0]["data"][-5:] = [v + 1.0 for v in new["series"][0]["data"][-5:]] # rewritten tail
+        self.assertEqual(compute_delta_since(delta_base(1, old), new), compute_delta(old, new))
+
+    def test_rewritten_history_needs_full_snapshot(self):
+        old = generate_echarts_options(make_processed_frame(500))
+        new = generate_echarts_options(make_processed_frame(500))
+        new["series"][0]["data"][10] = 0.0
+        self.assertIsNone(compute_delta_since(delta_base(1, old), new))
+        self.assertIsNotNone(compute_delta(old, new))
+
+
+class TestDataEndpoint(unittest.TestCase):
+    '''Offline checks of /data against a synthetic processed frame.'''
+
+    rows = 800
+
+    @classmethod
+    def setUpClass(cls):
+        cls.patcher = mock.patch.object(server, "get_processed_data", side_effect=lambda *args: make_processed_frame(cls.rows))
+        cls.patcher.start()
+        server.app.testing = True
+        cls.client = server.app.test_client()
+        server.update_chart_data()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patcher.stop()
+
+    def test_identity_body_is_json(self):
+        response = self.client.get('/data')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(len(data["echarts_options"]["series"]), 5)
+        self.assertIsNotNone(response.headers.get("ETag"))
+        self.assertIsNotNone(response.headers.get("Last-Modified"))
+
+    def test_gzip_variant(self):
+        response = self.client.get('/data', headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        plain = self.client.get('/data').data
+        self.assertEqual(gzip.decompress(response.data), plain)
+
+    def test_matching_etag_returns_304(self):
+        etag = self.client.get('/data').headers["ETag"]
+        response = self.client.get('/data', headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+        response = self.client.get('/data', headers={"If-None-Match": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_delta_since_previous_version(self):
+        before = json.loads(self.client.get('/data').data)
+        type(self).rows += 1
+        server.update_chart_data()
+        after = json.loads(self.client.get('/data').data)
+        self.assertGreater(after["version"], before["version"])
+
+        delta = json.loads(self.client.get(f'/data?since={before["version"]}').data)
+        self.assertEqual(delta["version"], after["version"])
+        self.assertNotIn("echarts_options", delta)
+        # Only the tail travels: one new history date plus one more padded future date
+        self.assertEqual(len(delta["delta"]["xAxis"]["data"]), 1)
+
+        def apply(arr, tail):
+            return arr[:tail["start"]] + tail["data"]
+
+        old, new = before["echarts_options"], after["echarts_options"]
+        self.assertEqual(apply(old["xAxis"]["data"], delta["delta"]["xAxis"]), new["xAxis"]["data"])
+        for old_series, new_series, tail in zip(old["series"], new["series"], delta["delta"]["series"]):
+            self.assertLessEqual(len(tail["data"]), 2)
+            self.assertEqual(apply(old_series["data"], tail), new_series["data"])
+
+    def test_history_keeps_only_delta_bases(self):
+        type(self).rows += 1
+        server.update_chart_data()
+        channel = server.channels[(server.DEFAULT_SYMBOL, server.DEFAULT_INTERVAL)]
+        for base in channel.history:
+            self.assertIsInstance(base, DeltaBase)
+            self.assertTrue(all(len(tail) <= TAIL_POINTS for _, _, tail in base.arrays))
+
+    def test_unknown_version_gets_full_snapshot(self):
+        data = json.loads(self.client.get('/data?since=1').data)
+        self.assertIn("echarts_options", data)
+        self.assertNotIn("delta", data)
+
+    def test_manual_update_returns_job_and_coalesces(self):
+        release = threading.Event()
+
+        def slow_processed_data(*args):
+            release.wait(5)
+            return make_processed_frame(self.rows)
+
+        with mock.patch.object(server, "get_processed_data", side_effect=slow_processed_data):
+            first = self.client.post('/update_data')
+            second = self.client.post('/update_data')
+            release.set()
+
+            self.assertEqual(first.status_code, 202)
+            first_job = json.loads(first.data)
+            second_job = json.loads(second.data)
+            self.assertEqual(first_job["job_id"], second_job["job_id"])
+
+            deadline = time.time() + 10
+            while True:
+                status = json.loads(self.client.get(first_job["status_url"]).data)
+                if status["status"] not in ("queued", "running") or time.time() > deadline:
+                    break
+                time.sleep(0.05)
+
+        self.assertEqual(status["status"], "succeeded")
+        self.assertIsNotNone(status["finished_at"])
+        self.assertEqual(self.client.get('/update_status/unknown').status_code, 404)
+    def test_range_and_downsampling(self):
+        full = json.loads(self.client.get('/data').data)["echarts_options"]
+        response = self.client.get('/data?start=2017-06-01&end=2018-06-01')
+        self.assertEqual(response.status_code, 200)
+        options = json.loads(response.data)["echarts_options"]
+        # A range ending before the latest candle gets no future padding
+        self.assertEqual(options["xAxis"]["data"][0], "2017-06-01")
+        self.assertEqual(options["xAxis"]["data"][-1], "2018-06-01")
+        self.assertEqual(len(options["series"][0]["data"]), 366)
+        first = full["xAxis"]["data"].index("2017-06-01")
+        self.assertEqual(options["series"][0]["data"], full["series"][0]["data"][first:first + 366])
+
+        data = json.loads(self.client.get('/data?max_points=100').data)
+        options = data["echarts_options"]
+        self.assertLessEqual(data["range"]["points"], 100 + 2)
+        low_full = [v for v in full["series"][2]["data"] if v is not None]
+        low_sampled = [v for v in options["series"][2]["data"] if v is not None]
+        self.assertEqual(min(low_sampled), min(low_full))  # deepest drawdown bar survives
+        self.assertEqual(options["xAxis"]["data"][0], full["xAxis"]["data"][0])
+
+    def test_bad_range_parameters(self):
+        self.assertEqual(self.client.get('/data?start=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/data?max_points=1').status_code, 400)
+        self.assertEqual(self.client.get('/data?start=2030-01-01').status_code, 404)
+
+    def test_per_pair_routes(self):
+        self.assertTrue(server.update_chart_data(symbol="ETHUSDT", interval="1d"))
+        eth = json.loads(self.client.get('/data/ETHUSDT/1d').data)
+        self.assertEqual(eth["echarts_options"]["series"][0]["name"], "ETH价格")
+        btc = json.loads(self.client.get('/data/BTCUSDT/1d').data)
+        self.assertEqual(btc["echarts_options"]["series"][0]["name"], "BTC价格")
+        self.assertEqual(self.client.get('/data/DOGEUSDT/1d').status_code, 404)
+        self.assertEqual(self.client.post('/update_data/DOGEUSDT/1d').status_code, 404)
+
+    def assert_binary_matches_json(self, url):
+        json_data = json.loads(self.client.get(url).data)
+        response = self.client.get(url, headers={"Accept": BINARY_MIMETYPE})
+        self.assertEqual(response.mimetype, BINARY_MIMETYPE)
+        self.assertIn("Accept", response.headers["Vary"])
+        header, series, x_values = decode_chart_binary(response.data)
+
+        options = json_data["echarts_options"]
+        self.assertEqual(header["version"], json_data["version"])
+        self.assertIsNone(header["options"]["series"][0]["data"])
+        labels = np.datetime_as_string(x_values.astype("datetime64[D]"), unit="D").tolist()
+        self.assertEqual(labels, options["xAxis"]["data"])
+        for i, expected in enumerate(s["data"] for s in options["series"]):
+            expected = np.array([np.nan if v is None else v for v in expected])
+            np.testing.assert_array_equal(series[i].astype(float), expected)
+        return header
+
+    def test_binary_payload_matches_json(self):
+        header = self.assert_binary_matches_json('/data')
+        self.assertEqual(header["x"]["kind"], "range")
+        # Downsampled axes are irregular and travel as an int32 buffer
+        header = self.assert_binary_matches_json('/data?max_points=100')
+        self.assertEqual(header["x"]["kind"], "array")
+        # Plain clients keep getting JSON
+        self.assertEqual(self.client.get('/data', headers={"Accept": "*/*"}).mimetype, "application/json")
+
+    def test_variants_are_cached_until_next_publish(self):
+        url = '/data?start=2017-03-01&max_points=200&future_days=30'
+        stats = server.variant_cache.stats()
+        body = self.client.get(url).data
+        self.assertEqual(self.client.get(url).data, body)
+        after = server.variant_cache.stats()
+        self.assertEqual(after["misses"] - stats["misses"], 1)
+        self.assertEqual(after["hits"] - stats["hits"], 1)
+        data = json.loads(body)
+        self.assertLessEqual(len(data["echarts_options"]["xAxis"]["data"]) - data["range"]["points"], 30)
+
+        server.update_chart_data()
+        new_body = self.client.get(url).data
+        self.assertEqual(server.variant_cache.stats()["misses"] - after["misses"], 1)
+        self.assertNotEqual(json.loads(new_body)["version"], json.loads(body)["version"])
+        self.assertEqual(self.client.get('/data?future_days=-1').status_code, 400)
+
+    def test_requested_indicators_are_added(self):
+        data = json.loads(self.client.get('/data?indicators=sma:50,rsi:14,mayer:200').data)
+        self.assertEqual(data["range"]["indicators"], ["SMA_50", "RSI_14", "Mayer_200"])
+        series = data["echarts_options"]["series"]
+        self.assertEqual([s["name"] for s in series[5:]], ["SMA50", "RSI14", "Mayer倍数(200)"])
+        self.assertEqual([s["yAxisIndex"] for s in series[5:]], [0, 2, 3])
+        self.assertEqual(len(data["echarts_options"]["yAxis"]), 4)
+        # Indicators are computed over the whole history, so a later range starts with full windows
+        ranged = json.loads(self.client.get('/data?indicators=sma:50&start=2017-06-01').data)["echarts_options"]
+        self.assertIsNotNone(ranged["series"][5]["data"][0])
+        self.assert_binary_matches_json('/data?indicators=ema:21,drawdown&max_points=100')
+
+        self.assertEqual(self.client.get('/data?indicators=macd').status_code, 400)
+        self.assertEqual(self.client.get('/data?indicators=sma:1').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
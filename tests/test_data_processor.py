@@ -0,0 +1,147 @@
+import unittest
+import sys
+import os
+import json
+import datetime
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from SMA import data_processor
+from SMA.data_processor import generate_echarts_options, join_fear_greed
+from SMA.indicator import calculate_percentages
+from tests.helpers import make_candles, make_fear_greed, make_processed_frame
+
+
+def legacy_chart_data(data_df):
+    '''The per-row dates/series preparation generate_echarts_options used before it was vectorized.'''
+    chart_df = data_df.copy()
+    if isinstance(chart_df.index, pd.DatetimeIndex):
+        chart_df["Date"] = chart_df.index.strftime("%Y-%m-%d")
+    else:
+        chart_df["Date"] = chart_df.index.map(lambda x: x.strftime("%Y-%m-%d") if hasattr(x, 'strftime') else str(x))
+    dates = chart_df["Date"].tolist()
+    last_date = datetime.datetime.strptime(dates[-1], "%Y-%m-%d")
+    for i in range(1, 1460 + 1):
+        dates.append((last_date + datetime.timedelta(days=i)).strftime("%Y-%m-%d"))
+
+    def replace_nan(val):
+        return val if pd.notna(val) else None
+
+    series = [
+        [replace_nan(x) for x in chart_df[column].round(2).tolist()]
+        for column in ("Close", "SMA_200", "Low_Percentage", "High_Percentage")
+    ]
+    series.append([replace_nan(x) for x in chart_df["Fear_Greed"].tolist()])
+    return dates, series
+
+
+def legacy_join(processed_df, fear_greed_df, intraday=False):
+    '''The reindex + DataFrame.join merge used with date-object indexes.'''
+    if intraday:
+        daily = fear_greed_df.reindex(processed_df.index.date)
+        daily.index = processed_df.index
+        fear_greed_df = daily
+    return processed_df.join(fear_greed_df, how='left').rename(columns={
+        'value': 'Fear_Greed',
+        'value_classification': 'Fear_Greed_Class'
+    })
+
+
+class TestJoinFearGreed(unittest.TestCase):
+    '''The sorted-array merge on datetime64 indexes against the old object-index join.'''
+
+    def legacy_inputs(self, candles, fear_greed):
+        old_candles = candles.copy()
+        old_candles.index = pd.Index(candles.index.date, name='Date')
+        old_fg = fear_greed.iloc[::-1].astype({'value_classification': object})  # API order, newest first
+        old_fg.index = pd.Index(old_fg.index.date, name='date')
+        return calculate_percentages(old_candles), old_fg
+
+    def test_daily_join_matches_legacy(self):
+        candles = make_candles(900, seed=5)
+        fear_greed = make_fear_greed(candles, seed=5).drop(candles.index[500])  # a missing day
+        joined = join_fear_greed(calculate_percentages(candles.copy()), fear_greed)
+        legacy = legacy_join(*self.legacy_inputs(candles, fear_greed))
+
+        self.assertEqual(joined["Fear_Greed"].dtype, "float32")
+        self.assertIsInstance(joined["Fear_Greed_Class"].dtype, pd.CategoricalDtype)
+        self.assertEqual(joined["Fear_Greed_Class"].astype(object).where(joined["Fear_Greed_Class"].notna(), None).tolist(),
+                         legacy["Fear_Greed_Class"].where(legacy["Fear_Greed_Class"].notna(), None).tolist())
+        new_options = generate_echarts_options(joined)
+        old_options = generate_echarts_options(legacy)
+        self.assertEqual(json.dumps(new_options), json.dumps(old_options))
+
+    def test_intraday_join_matches_legacy(self):
+        daily = make_candles(60, seed=2)
+        fear_greed = make_fear_greed(daily, seed=2, skip=10)
+        candles = make_candles(60 * 6, seed=2)
+        candles.index = pd.date_range(daily.index[0], periods=len(candles), freq="4h", name='Date')
+        joined = join_fear_greed(calculate_percentages(candles.copy()), fear_greed, "4h")
+
+        old_candles = calculate_percentages(candles.copy())
+        old_fg = fear_greed.astype({'value_classification': object})
+        old_fg.index = pd.Index(old_fg.index.date, name='date')
+        legacy = legacy_join(old_candles, old_fg, intraday=True)
+        self.assertEqual(json.dumps(generate_echarts_options(joined, interval="4h")),
+                         json.dumps(generate_echarts_options(legacy, interval="4h")))
+
+    def test_float32_storage_serves_the_same_values(self):
+        # Prices around 140000, where float32 cannot hold 2 decimals (140000.07 -> 140000.0625)
+        candles = make_candles(700)
+        candles[["Low", "High", "Close"]] = (candles[["Low", "High", "Close"]] * 7 + 0.07).round(2)
+        fear_greed = make_fear_greed(candles)
+        processed = calculate_percentages(candles.copy())
+        wide = join_fear_greed(processed, fear_greed)
+        with mock.patch.object(data_processor, "FLOAT_DTYPE", np.dtype("float32")):
+            compact = join_fear_greed(processed, fear_greed)
+        self.assertEqual(compact["Low_Percentage"].dtype, "float32")
+        self.assertEqual(compact["Close"].dtype, "float64")
+        self.assertGreater(compact["Close"].max(), 131072)
+        self.assertEqual(json.dumps(generate_echarts_options(compact)), json.dumps(generate_echarts_options(wide)))
+
+
+class TestGenerateEchartsOptions(unittest.TestCase):
+
+    def assert_matches_legacy(self, frame):
+        options = generate_echarts_options(frame)
+        dates, series = legacy_chart_data(frame)
+        # Compare the JSON text so int/float and None/NaN differences are caught too
+        self.assertEqual(json.dumps(options["xAxis"]["data"]), json.dumps(dates))
+        for built, expected in zip(options["series"], series):
+            self.assertEqual(json.dumps(built["data"]), json.dumps(expected))
+        return options
+
+    def test_date_index_matches_legacy(self):
+        options = self.assert_matches_legacy(make_processed_frame(700))
+        self.assertEqual(len(options["series"]), 5)
+        self.assertIsNone(options["series"][1]["data"][0])  # SMA warm-up stays null
+        self.assertEqual(len(options["series"][0]["markLine"]["data"]), 3)
+
+    def test_datetime_index_matches_legacy(self):
+        frame = make_processed_frame(300)
+        frame.index = pd.to_datetime(frame.index)
+        self.assert_matches_legacy(frame)
+
+    def test_integer_fear_greed_stays_integer(self):
+        frame = make_processed_frame(700).dropna(subset=["Fear_Greed"])
+        frame["Fear_Greed"] = frame["Fear_Greed"].astype("int64")
+        options = self.assert_matches_legacy(frame)
+        self.assertIsInstance(options["series"][4]["data"][0], int)
+
+    def test_intraday_axis_labels(self):
+        frame = make_processed_frame(300)
+        frame.index = pd.date_range("2024-04-18", periods=len(frame), freq="4h")
+        options = generate_echarts_options(frame, symbol="ETHUSDT", interval="4h")
+        self.assertEqual(options["xAxis"]["data"][:2], ["2024-04-18 00:00", "2024-04-18 04:00"])
+        self.assertEqual(len(options["xAxis"]["data"]), len(frame))  # no future padding
+        self.assertIn("2024-04-20 00:00", [d["xAxis"] for d in options["series"][0]["markLine"]["data"]])
+        self.assertEqual(options["title"]["text"], "ETH Price and SMA Percentage Analysis (4h)")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
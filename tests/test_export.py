@@ -0,0 +1,129 @@
+import unittest
+import sys
+import os
+import io
+import json
+import tempfile
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import pandas as pd
+
+import server
+from SMA import export as export_module
+from SMA import main as cli
+from SMA.export import iter_export, select_export
+from tests.helpers import make_processed_frame
+
+# pyarrow is optional (SMA/export.py), Parquet cases only run where it is installed
+NO_PYARROW = "pyarrow is not installed"
+
+
+def read_export(data, export_format):
+    if export_format == "csv":
+        return pd.read_csv(io.BytesIO(data))
+    if export_format == "ndjson":
+        return pd.DataFrame([json.loads(line) for line in data.decode("utf-8").splitlines()])
+    return pd.read_parquet(io.BytesIO(data))
+
+
+class TestIterExport(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(export_module, "CHUNK_ROWS", 128)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.frame = make_processed_frame(700)
+
+    def test_formats_round_trip_in_chunks(self):
+        for export_format in ("csv", "ndjson", "parquet"):
+            with self.subTest(format=export_format):
+                if export_format == "parquet" and export_module.pa is None:
+                    self.skipTest(NO_PYARROW)
+                chunks = list(iter_export([("BTCUSDT", "1d", self.frame)], export_format))
+                self.assertGreaterEqual(len(chunks), 6)  # 700 rows in chunks of 128
+                back = read_export(b"".join(chunks), export_format)
+                self.assertEqual(list(back.columns), ["Date"] + list(self.frame.columns))
+                self.assertEqual(len(back), len(self.frame))
+                self.assertEqual(back["Date"].iloc[0], "2017-01-01")
+                pd.testing.assert_series_equal(back["Close"], self.frame["Close"].reset_index(drop=True), check_names=False)
+                self.assertEqual(back["Fear_Greed_Class"].isna().sum(), self.frame["Fear_Greed_Class"].isna().sum())
+                self.assertEqual(back["Fear_Greed"].dropna().tolist(), self.frame["Fear_Greed"].dropna().tolist())
+
+    def test_several_pairs_are_tagged(self):
+        frames = [("BTCUSDT", "1d", self.frame), ("ETHUSDT", "4h", self.frame.iloc[:10])]
+        for export_format in ("csv", "parquet"):
+            with self.subTest(format=export_format):
+                if export_format == "parquet" and export_module.pa is None:
+                    self.skipTest(NO_PYARROW)
+                back = read_export(b"".join(iter_export(frames, export_format)), export_format)
+                self.assertEqual(list(back.columns[:3]), ["Date", "Symbol", "Interval"])
+                self.assertEqual(back["Symbol"].value_counts().to_dict(), {"BTCUSDT": 700, "ETHUSDT": 10})
+                self.assertEqual(back["Date"].iloc[-1], "2017-01-10 00:00")
+
+    def test_range_and_column_selection(self):
+        selected = select_export(self.frame, pd.Timestamp("2017-02-01").date(), pd.Timestamp("2017-02-28").date(), ["Close", "SMA_200"])
+        self.assertEqual(list(selected.columns), ["Close", "SMA_200"])
+        self.assertEqual(len(selected), 28)
+        with self.assertRaises(ValueError):
+            select_export(self.frame, columns=["Volume"])
+        with self.assertRaises(ValueError):
+            list(iter_export([("BTCUSDT", "1d", self.frame)], "xlsx"))
+
+
+class TestExportEndpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.patcher = mock.patch.object(server, "get_processed_data", side_effect=lambda *args: make_processed_frame(500))
+        cls.patcher.start()
+        server.app.testing = True
+        cls.client = server.app.test_client()
+        server.update_chart_data()
+        server.update_chart_data(symbol="ETHUSDT", interval="1d")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patcher.stop()
+
+    def test_streamed_csv(self):
+        response = self.client.get('/export?start=2017-06-01&end=2017-06-30&columns=Close,Fear_Greed_Class')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertIn('filename="BTCUSDT_1d.csv"', response.headers["Content-Disposition"])
+        back = read_export(response.data, "csv")
+        self.assertEqual(list(back.columns), ["Date", "Close", "Fear_Greed_Class"])
+        self.assertEqual(len(back), 30)
+
+    @unittest.skipUnless(export_module.pa is not None, NO_PYARROW)
+    def test_several_pairs_with_indicators(self):
+        response = self.client.get('/export?pairs=BTCUSDT:1d,ETHUSDT:1d&format=parquet&indicators=rsi:14')
+        self.assertEqual(response.status_code, 200)
+        back = read_export(response.data, "parquet")
+        self.assertIn("RSI_14", back.columns)
+        self.assertEqual(len(back), 1000)
+
+    def test_bad_parameters(self):
+        for query in ("format=xlsx", "columns=Volume", "start=2020-13-01", "pairs=BTCUSDT", "indicators=nope"):
+            self.assertEqual(self.client.get('/export?' + query).status_code, 400, query)
+        self.assertEqual(self.client.get('/export?pairs=NOPE:1d').status_code, 404)
+
+
+class TestExportCommand(unittest.TestCase):
+
+    def test_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch("SMA.data_processor.get_processed_data", side_effect=lambda *args: make_processed_frame(300)):
+            path = os.path.join(tmp_dir, "history.ndjson")
+            args = cli._parse_args(["export", "--pairs", "BTCUSDT:1d,ETHUSDT:1d", "--format", "ndjson", "--output", path])
+            cli.export([tuple(p.split(":")) for p in args.pairs.split(",")], args.output, args.format)
+            back = read_export(open(path, "rb").read(), "ndjson")
+        self.assertEqual(len(back), 600)
+        self.assertEqual(sorted(back["Symbol"].unique()), ["BTCUSDT", "ETHUSDT"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,74 @@
+import unittest
+import sys
+import os
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import numpy as np
+import pandas as pd
+
+from SMA.factors import compute_indicators, parse_indicator_specs, RollingKernel, FactorContext
+from tests.helpers import make_candles, make_processed_frame
+
+
+class TestFactors(unittest.TestCase):
+    '''Every registered indicator against its straightforward pandas formulation.'''
+
+    def setUp(self):
+        self.candles = make_candles(1500, seed=3)
+        self.close = pd.Series(self.candles['Close'].to_numpy())
+
+    def reference(self):
+        s = self.close
+        change = s.diff()
+        gain = change.clip(lower=0).ewm(alpha=1 / 14, adjust=False, min_periods=14).mean()
+        loss = (-change.clip(upper=0)).ewm(alpha=1 / 14, adjust=False, min_periods=14).mean()
+        return {
+            "SMA_50": s.rolling(50).mean(),
+            "EMA_21": s.ewm(span=21, adjust=False).mean(),
+            "EMA_3": s.ewm(span=3, adjust=False).mean(),
+            "Mayer_200": s / s.rolling(200).mean(),
+            "Volatility_30": np.log(s).diff().rolling(30).std() * np.sqrt(365) * 100,
+            "RSI_14": 100 - 100 / (1 + gain / loss),
+            "Drawdown": (s / s.cummax() - 1) * 100,
+            "ZScore_200": (s - s.rolling(200).mean()) / s.rolling(200).std(),
+        }
+
+    def test_matches_pandas(self):
+        specs = parse_indicator_specs("sma:50,ema:21,ema:3,mayer,vol:30,rsi,drawdown,zscore:200")
+        result = compute_indicators(self.candles, specs)
+        self.assertTrue(result.index.equals(self.candles.index))
+        for column, expected in self.reference().items():
+            with self.subTest(column=column):
+                np.testing.assert_allclose(result[column].to_numpy(), expected.to_numpy(), rtol=1e-9, equal_nan=True)
+
+    def test_shared_window_reuses_buffers(self):
+        context = FactorContext(self.candles)
+        kernel = context.kernel("close")
+        self.assertIs(kernel.mean(200), kernel.mean(200))
+        self.assertIs(context.kernel("close"), kernel)
+
+    def test_existing_sma_column_is_reused(self):
+        frame = make_processed_frame(700)
+        result = compute_indicators(frame, parse_indicator_specs("sma:200,mayer:200"))
+        np.testing.assert_array_equal(result["SMA_200"].to_numpy(), frame["SMA_200"].to_numpy())
+        np.testing.assert_array_equal(result["Mayer_200"].to_numpy(), (frame["Close"] / frame["SMA_200"]).to_numpy())
+
+    def test_intraday_volatility_is_annualized_per_interval(self):
+        daily = compute_indicators(self.candles, [("vol", 30)], "1d")["Volatility_30"]
+        hourly = compute_indicators(self.candles, [("vol", 30)], "1h")["Volatility_30"]
+        np.testing.assert_allclose(hourly, daily * np.sqrt(24), rtol=1e-12)
+
+    def test_short_series_and_spec_errors(self):
+        kernel = RollingKernel([1.0, 2.0, 3.0])
+        self.assertTrue(np.isnan(kernel.mean(5)).all())
+        np.testing.assert_array_equal(kernel.ema(1.0), [1.0, 2.0, 3.0])
+        self.assertEqual(parse_indicator_specs("SMA:50, sma:50 ,drawdown"), [("sma", 50), ("drawdown", None)])
+        for bad in ("macd", "sma:0", "drawdown:5", "sma:x"):
+            with self.assertRaises(ValueError):
+                parse_indicator_specs(bad)
+
+
+if __name__ == '__main__':
+    unittest.main()
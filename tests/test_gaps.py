@@ -0,0 +1,116 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import numpy as np
+
+from benchmarks.fixtures import KlineFixture, fear_greed_payload
+from benchmarks.standin_server import StandinServer
+from SMA import data_fetcher
+from SMA.candle_store import delete_klines, load_open_times, load_repairs, upsert_klines
+from SMA.data_fetcher import INTERVAL_MS
+from SMA.gaps import check_candles, find_duplicates, find_gaps, repair_candles
+from SMA.metrics import STAGE_SECONDS, STAGE_ROWS
+
+HOUR_MS = INTERVAL_MS["1h"]
+
+
+class TestFindGaps(unittest.TestCase):
+
+    def test_gaps_and_duplicates(self):
+        open_times = np.array([0, 1, 2, 5, 6, 9], dtype=np.int64) * HOUR_MS
+        open_times = np.sort(np.append(open_times, 6 * HOUR_MS + 60000))  # second candle in the 06:00 slot
+        self.assertEqual(find_gaps(open_times, "1h"), [(3 * HOUR_MS, 4 * HOUR_MS), (7 * HOUR_MS, 8 * HOUR_MS)])
+        self.assertEqual(find_duplicates(open_times, "1h").tolist(), [6 * HOUR_MS + 60000])
+        self.assertEqual(find_gaps(open_times[:0], "1h"), [])
+        self.assertEqual(find_gaps(np.arange(10) * HOUR_MS, "1h"), [])
+
+
+class TestRepairCandles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.store_path = os.path.join(self.tmp_dir.name, "candles.sqlite")
+        self.fixture = KlineFixture(6000, HOUR_MS)
+        self.server = StandinServer(self.fixture, fear_greed_payload())
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        patcher = mock.patch.object(data_fetcher, "BINANCE_KLINES_URL", self.server.url + "/api/v3/klines")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def store(self, holes=()):
+        '''Stores the fixture history without the (start, stop) index ranges in `holes`.'''
+        upsert_klines(self.fixture.page(0, 2 ** 62, 10 ** 6), "BTCUSDT", "1h", self.store_path)
+        for start, stop in holes:
+            delete_klines(self.fixture.open_time[start:stop], "BTCUSDT", "1h", self.store_path)
+
+    def test_backfills_only_the_missing_ranges(self):
+        self.store(holes=[(100, 2600), (3000, 3005), (4000, 4001)])
+        duplicate = int(self.fixture.open_time[5000]) + 60000
+        upsert_klines([[duplicate, "1", "1", "1", "1", "1", duplicate + HOUR_MS - 1]], "BTCUSDT", "1h", self.store_path)
+
+        report = check_candles("BTCUSDT", "1h", self.store_path)
+        self.assertEqual(report["missing"], 2506)
+        self.assertEqual([g["candles"] for g in report["gaps"]], [2500, 5, 1])
+        self.assertEqual(report["duplicates"], [duplicate])
+
+        repairs = repair_candles("BTCUSDT", "1h", self.store_path, workers=4)
+        np.testing.assert_array_equal(load_open_times("BTCUSDT", "1h", self.store_path), self.fixture.open_time)
+        self.assertEqual(self.server.request_counts["klines"], 5)  # 3 ranges for the long gap, 1 each for the others
+        self.assertEqual([(r["kind"], r["candles"], r["repaired"]) for r in repairs],
+                         [("duplicate", 1, 1), ("gap", 2500, 2500), ("gap", 5, 5), ("gap", 1, 1)])
+        self.assertEqual(len(load_repairs("BTCUSDT", "1h", self.store_path)), 4)
+
+        self.assertEqual(repair_candles("BTCUSDT", "1h", self.store_path), [])
+        self.assertEqual(self.server.request_counts["klines"], 5)
+
+    def test_exchange_outage_is_recorded_and_skipped(self):
+        self.store(holes=[(200, 210)])
+        for name in ("open_time", "open", "high", "low", "close", "volume"):
+            setattr(self.fixture, name, np.delete(getattr(self.fixture, name), np.arange(200, 210)))
+
+        repairs = repair_candles("BTCUSDT", "1h", self.store_path)
+        self.assertEqual([(r["kind"], r["candles"], r["repaired"]) for r in repairs], [("gap", 10, 0)])
+        requests = self.server.request_counts["klines"]
+        self.assertEqual(repair_candles("BTCUSDT", "1h", self.store_path), [])
+        self.assertEqual(self.server.request_counts["klines"], requests)
+        repair_candles("BTCUSDT", "1h", self.store_path, retry_known=True)
+        self.assertEqual(self.server.request_counts["klines"], requests + 1)
+
+    def test_recorded_outage_does_not_trigger_repairs(self):
+        self.store(holes=[(200, 210)])
+        for name in ("open_time", "open", "high", "low", "close", "volume"):
+            setattr(self.fixture, name, np.delete(getattr(self.fixture, name), np.arange(200, 210)))
+        open_times = load_open_times("BTCUSDT", "1h", self.store_path)
+        self.assertTrue(data_fetcher._needs_repair(open_times, "BTCUSDT", "1h", self.store_path))
+        repair_candles("BTCUSDT", "1h", self.store_path)
+        self.assertFalse(data_fetcher._needs_repair(open_times, "BTCUSDT", "1h", self.store_path))
+
+        with mock.patch("SMA.gaps.repair_candles") as repair:
+            data_fetcher.get_klines("BTCUSDT", "1h", store_path=self.store_path)
+        repair.assert_not_called()
+
+        # A new hole, or a candle off the grid, still does
+        self.assertTrue(data_fetcher._needs_repair(np.delete(open_times, 1000), "BTCUSDT", "1h", self.store_path))
+        self.assertTrue(data_fetcher._needs_repair(np.append(open_times, open_times[-1] + 60000), "BTCUSDT", "1h", self.store_path))
+
+    def test_get_klines_repairs_the_stored_history(self):
+        self.store(holes=[(1000, 1300)])
+        builds, rows = STAGE_SECONDS.count(stage="frame_build"), STAGE_ROWS.value(stage="frame_build")
+        frame = data_fetcher.get_klines("BTCUSDT", "1h", store_path=self.store_path)
+        self.assertEqual(len(frame), len(self.fixture.open_time))
+        self.assertEqual(STAGE_SECONDS.count(stage="frame_build"), builds + 1)
+        self.assertEqual(STAGE_ROWS.value(stage="frame_build"), rows + len(frame))
+        self.assertTrue(frame.index.is_unique)
+        self.assertEqual(load_repairs("BTCUSDT", "1h", self.store_path)["repaired"].tolist(), [300])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
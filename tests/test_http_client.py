@@ -0,0 +1,144 @@
+import unittest
+import sys
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import requests
+from urllib3.util.retry import Retry
+
+from SMA import data_fetcher, http_client
+from SMA.http_client import DEFAULT_TIMEOUT, BinanceWeightLimiter, get_session
+
+
+class FakeClock:
+    '''Stands in for the `time` module of SMA.http_client: sleep() only advances the clock.'''
+
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+
+    def __init__(self, used=None):
+        self.headers = {} if used is None else {"X-MBX-USED-WEIGHT-1M": str(used)}
+
+
+class TestBinanceWeightLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(100 * 60 + 10)
+        patcher = mock.patch.object(http_client, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = BinanceWeightLimiter(limit=100, safety=0.9)
+
+    def test_budget_rolls_over_each_minute(self):
+        self.assertEqual(self.limiter.budget, 90)
+        self.limiter.acquire(60)
+        self.limiter.acquire(30)
+        self.assertEqual(self.limiter.used, 90)
+        self.clock.now += 50 # 101:00, a new minute
+        self.limiter.acquire(10)
+        self.assertEqual((self.limiter.minute, self.limiter.used), (101, 10))
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_acquire_blocks_until_the_next_minute(self):
+        self.limiter.acquire(80)
+        self.limiter.acquire(20)
+        self.assertEqual(self.clock.sleeps, [50])
+        self.assertEqual((self.limiter.minute, self.limiter.used), (101, 20))
+
+    def test_update_resyncs_from_used_weight_header(self):
+        self.limiter.acquire(10)
+        self.limiter.update(FakeResponse(used=85)) # Weight used by other clients of the same IP
+        self.assertEqual(self.limiter.used, 85)
+        self.limiter.update(FakeResponse(used=40)) # A stale header never lowers the count
+        self.limiter.update(FakeResponse())
+        self.assertEqual(self.limiter.used, 85)
+        self.limiter.acquire(10)
+        self.assertEqual(self.clock.sleeps, [50])
+
+        self.clock.now += 60
+        self.limiter.update(FakeResponse(used=5))
+        self.assertEqual((self.limiter.minute, self.limiter.used), (102, 5))
+
+
+class _ScriptedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, delay = self.server.script.pop(0) if self.server.script else (200, 0)
+        self.server.requests += 1
+        time.sleep(delay)
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSession(unittest.TestCase):
+    '''The shared session against a local server answering with scripted (status, delay) pairs.'''
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ScriptedHandler)
+        self.server.daemon_threads = True
+        self.server.script = []
+        self.server.requests = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v3/klines"
+        # No backoff between attempts
+        patcher = mock.patch.object(Retry, "sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_server_errors_and_rate_limits_are_retried(self):
+        self.server.script = [(503, 0), (429, 0), (200, 0)]
+        self.assertEqual(get_session().get(self.url, timeout=DEFAULT_TIMEOUT).status_code, 200)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_ip_ban_is_not_retried(self):
+        self.server.script = [(418, 0), (200, 0)]
+        self.assertEqual(get_session().get(self.url, timeout=DEFAULT_TIMEOUT).status_code, 418)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_retries_are_bounded(self):
+        self.server.script = [(500, 0)] * 10
+        self.assertEqual(get_session().get(self.url, timeout=DEFAULT_TIMEOUT).status_code, 500)
+        self.assertEqual(self.server.requests, 4) # the request and 3 retries
+
+    def test_hung_response_times_out(self):
+        self.server.script = [(200, 0.5)] * 4
+        started = time.perf_counter()
+        with self.assertRaises(requests.ConnectionError): # ReadTimeoutError once retries are exhausted
+            get_session().get(self.url, timeout=(1, 0.1))
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertEqual(self.server.requests, 4)
+
+    def test_fetchers_pass_the_default_timeout(self):
+        self.server.script = [(200, 0)]
+        with mock.patch.object(data_fetcher, "get_session", return_value=mock.Mock(wraps=get_session())) as session:
+            data_fetcher._timed_get("binance", self.url, {})
+        self.assertEqual(session.return_value.get.call_args.kwargs["timeout"], DEFAULT_TIMEOUT)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
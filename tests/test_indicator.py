@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from SMA.indicator import calculate_percentages, update_percentages
+from tests.helpers import make_candles as make_random_candles
+
+
+def make_candles(n, seed=0):
+    candles = make_random_candles(n, seed)
+    candles.iloc[50:120, candles.columns.get_loc('Close')] = candles['Close'].iloc[50]  # flat stretch exercises the repeated-value path of the kernel
+    return candles
+
+
+class TestIncrementalPercentages(unittest.TestCase):
+
+    def test_full_pass_matches_pandas(self):
+        candles = make_candles(600)
+        processed, _ = update_percentages(candles)
+        pd.testing.assert_frame_equal(processed, calculate_percentages(candles.copy()), check_exact=True)
+        self.assertTrue(processed['SMA_200'].iloc[:199].isna().all())
+        self.assertFalse(np.isnan(processed['SMA_200'].iloc[199]))
+
+    def test_incremental_updates_match_pandas(self):
+        candles = make_candles(900, seed=1)
+        processed, state = update_percentages(candles.iloc[:150])
+        for end in (199, 200, 201, 450, 451, 700, 900):
+            batch = candles.iloc[:end].copy()
+            # the previously open last candle is re-fetched with a different close
+            batch.iloc[-1, batch.columns.get_loc('Close')] *= 1.01
+            processed, state = update_percentages(batch, processed, state)
+            pd.testing.assert_frame_equal(processed, calculate_percentages(batch.copy()), check_exact=True)
+            self.assertEqual(state.position, end - 1)
+
+    def test_rewritten_history_falls_back_to_full_pass(self):
+        candles = make_candles(400, seed=2)
+        processed, state = update_percentages(candles)
+        shifted = candles.iloc[10:]
+        processed, state = update_percentages(shifted, processed, state)
+        pd.testing.assert_frame_equal(processed, calculate_percentages(shifted.copy()), check_exact=True)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
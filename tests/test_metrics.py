@@ -0,0 +1,74 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import server
+from SMA.metrics import Counter, Histogram, render_metrics
+from tests.helpers import make_processed_frame
+
+
+class TestMetricTypes(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("test_latency_seconds", "Test latency.", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, route="/x")
+        text = render_metrics()
+        self.assertIn('test_latency_seconds_bucket{route="/x",le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{route="/x",le="1.0"} 3', text)
+        self.assertIn('test_latency_seconds_bucket{route="/x",le="+Inf"} 4', text)
+        self.assertIn('test_latency_seconds_count{route="/x"} 4', text)
+        self.assertIn('test_latency_seconds_sum{route="/x"} 6.05', text)
+
+    def test_counter_labels_are_checked_and_escaped(self):
+        counter = Counter("test_events_total", "Test events.", ("kind",))
+        counter.inc(kind='a"b')
+        counter.inc(2, kind='a"b')
+        self.assertEqual(counter.value(kind='a"b'), 3)
+        self.assertIn('test_events_total{kind="a\\"b"} 3', render_metrics())
+        with self.assertRaises(ValueError):
+            counter.inc(other="x")
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.patcher = mock.patch.object(server, "get_processed_data", side_effect=lambda *args: make_processed_frame(800))
+        cls.patcher.start()
+        server.app.testing = True
+        cls.client = server.app.test_client()
+        server.update_chart_data()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patcher.stop()
+
+    def test_metrics_cover_refresh_and_requests(self):
+        self.client.get('/data')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        text = response.data.decode("utf-8")
+        symbol, interval = server.DEFAULT_SYMBOL, server.DEFAULT_INTERVAL
+        self.assertIn(f'btc_chart_refreshes_total{{symbol="{symbol}",interval="{interval}",result="succeeded"}}', text)
+        self.assertIn('btc_pipeline_stage_seconds_count{stage="options"}', text)
+        self.assertIn(f'btc_snapshot_payload_bytes{{symbol="{symbol}",interval="{interval}",coding="gzip"}}', text)
+        self.assertIn('btc_http_request_seconds_count{endpoint="/data",method="GET",status="200"}', text)
+
+    def test_profiled_update_job_returns_hot_functions(self):
+        channel = server.channels[(server.DEFAULT_SYMBOL, server.DEFAULT_INTERVAL)]
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(server, "PROFILE_DIR", tmp):
+            result = channel._run_update_job(lambda stage: None, profile=True)
+            self.assertTrue(os.path.exists(result["profile"]["path"]))
+        self.assertTrue(result["profile"]["top"])
+        self.assertIn("cumulative_seconds", result["profile"]["top"][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
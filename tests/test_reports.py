@@ -0,0 +1,147 @@
+import unittest
+import sys
+import os
+import re
+import json
+import math
+import subprocess
+import tempfile
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import pandas as pd
+
+from SMA import main as cli
+from SMA.data_processor import generate_echarts_options
+from SMA.downsample import slice_frame
+from SMA.factors import compute_indicators, parse_indicator_specs
+from SMA.visualizer_echarts import generate_reports, plot_btc_analysis_standalone, resolve_range
+from tests.helpers import make_processed_frame
+
+
+def read_script_json(text, name):
+    '''Value of `var <name> = ...;` in a report page.'''
+    return json.loads(re.search(rf"var {name} = (.*);\n", text).group(1))
+
+
+def load_report(path):
+    '''Options of a report as the page builds them: the skeleton filled from the shared data file.'''
+    html = open(path, encoding="utf-8").read()
+    option, view = read_script_json(html, "option"), read_script_json(html, "view")
+    data_src = re.search(r'<script src="(data/[^"]+)"></script>', html).group(1)
+    script = open(os.path.join(os.path.dirname(path), data_src), encoding="utf-8").read()
+    key, body = re.match(r"\(window\.BTC_CHART_DATA = window\.BTC_CHART_DATA \|\| \{\}\)\[(.*?)\] = (.*);\n$", script).groups()
+    assert json.loads(key) == view["key"]
+    data = json.loads(body)
+    option["xAxis"]["data"] = data["dates"][view["dates"][0]:view["dates"][1]]
+    for series, column in zip(option["series"], view["columns"]):
+        series["data"] = data["columns"][column][view["rows"][0]:view["rows"][1]]
+    return option
+
+
+def same_values(a, b):
+    return len(a) == len(b) and all(
+        (x is None and y is None) or (x is not None and y is not None and math.isclose(x, y)) for x, y in zip(a, b)
+    )
+
+
+class TestResolveRange(unittest.TestCase):
+
+    def test_specs(self):
+        index = pd.date_range("2020-01-01", "2021-06-30", freq="D")
+        self.assertEqual(resolve_range("all", index), (None, None))
+        self.assertEqual(resolve_range("90d", index), (pd.Timestamp("2021-04-02").date(), None))
+        self.assertEqual(resolve_range("1y", index), (pd.Timestamp("2020-07-01").date(), None))
+        self.assertEqual(resolve_range("2020-03-01:", index), (pd.Timestamp("2020-03-01").date(), None))
+        for bad in ("week", "2021-01-01:2020-01-01", "5x"):
+            with self.assertRaises(ValueError):
+                resolve_range(bad, index)
+
+
+class TestGenerateReports(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.frame = make_processed_frame(800)
+
+    def assert_report_matches(self, path, frame, range_spec, indicators, interval="1d"):
+        start, end = resolve_range(range_spec, frame.index)
+        sliced = slice_frame(frame, start, end)
+        future_days = 1460 if sliced.index[-1] == frame.index[-1] else 0
+        expected = generate_echarts_options(sliced, future_days, interval=interval, indicators=indicators)
+        option = load_report(path)
+        self.assertEqual(option["xAxis"]["data"], expected["xAxis"]["data"])
+        self.assertEqual([s["name"] for s in option["series"]], [s["name"] for s in expected["series"]])
+        for series, wanted in zip(option["series"], expected["series"]):
+            self.assertTrue(same_values(series["data"], wanted["data"]), series["name"])
+        self.assertEqual(option["yAxis"], expected["yAxis"])
+
+    def test_reports_match_the_chart_options(self):
+        frames = {("BTCUSDT", "1d"): self.frame, ("ETHUSDT", "1d"): make_processed_frame(500, seed=1)}
+        ranges = ["all", "90d", "2017-03-01:2017-06-30"]
+        indicator_sets = ["", "sma:50,rsi:14"]
+        paths = generate_reports(list(frames), ranges, indicator_sets, self.tmp_dir.name, frames=frames)
+        self.assertEqual(len(paths), 12)
+        self.assertIs(frames[("BTCUSDT", "1d")], self.frame)  # the caller's dict is left alone
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp_dir.name, "data"))), ["BTCUSDT_1d.js", "ETHUSDT_1d.js"])
+        index = open(os.path.join(self.tmp_dir.name, "index.html"), encoding="utf-8").read()
+        for path in paths:
+            self.assertIn(os.path.basename(path), index)
+
+        full = self.frame.join(compute_indicators(self.frame, parse_indicator_specs("sma:50,rsi:14")))
+        for range_spec in ranges:
+            for text in indicator_sets:
+                name = "_".join(filter(None, ["BTCUSDT_1d", range_spec.replace(":", "-"), text.replace(":", "").replace(",", "-")]))
+                with self.subTest(range=range_spec, indicators=text):
+                    self.assert_report_matches(os.path.join(self.tmp_dir.name, name + ".html"), full, range_spec, parse_indicator_specs(text))
+
+    def test_reports_hold_no_data_arrays(self):
+        frames = {("BTCUSDT", "1d"): self.frame}
+        path, = generate_reports(list(frames), ["all"], [""], self.tmp_dir.name, frames=frames)
+        data_file = os.path.join(self.tmp_dir.name, "data", "BTCUSDT_1d.js")
+        self.assertLess(os.path.getsize(path), 8000)
+        self.assertGreater(os.path.getsize(data_file), 10 * os.path.getsize(path))
+
+    def test_process_pool_writes_the_same_files(self):
+        frames = {("BTCUSDT", "1d"): self.frame}
+        serial_dir = os.path.join(self.tmp_dir.name, "serial")
+        pooled_dir = os.path.join(self.tmp_dir.name, "pooled")
+        serial = generate_reports(list(frames), ["all", "6m"], ["", "ema:20"], serial_dir, frames=frames)
+        pooled = generate_reports(list(frames), ["all", "6m"], ["", "ema:20"], pooled_dir, workers=2, frames=frames)
+        self.assertEqual([os.path.basename(p) for p in serial], [os.path.basename(p) for p in pooled])
+        for name in os.listdir(serial_dir) + ["data/BTCUSDT_1d.js"]:
+            if name != "data":
+                with open(os.path.join(serial_dir, name), "rb") as a, open(os.path.join(pooled_dir, name), "rb") as b:
+                    self.assertEqual(a.read(), b.read(), name)
+
+    def test_bad_range_fails_before_writing(self):
+        frames = {("BTCUSDT", "1d"): self.frame}
+        with self.assertRaises(ValueError):
+            generate_reports(list(frames), ["all", "soon"], [""], self.tmp_dir.name, frames=frames)
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+
+    def test_standalone_report_is_self_contained(self):
+        path = os.path.join(self.tmp_dir.name, "standalone.html")
+        plot_btc_analysis_standalone(self.frame, path)
+        html = open(path, encoding="utf-8").read()
+        self.assertIsNone(read_script_json(html, "view"))
+        self.assertEqual(len(read_script_json(html, "option")["series"][0]["data"]), len(self.frame))
+
+    def test_report_command(self):
+        with mock.patch("SMA.visualizer_echarts.get_processed_data", side_effect=lambda *args: make_processed_frame(400)):
+            args = cli._parse_args(["--pairs", "BTCUSDT:1d", "--ranges", "all,90d", "--indicators", "rsi", "--output-dir", self.tmp_dir.name])
+            self.assertEqual(args.command, "report")
+            paths = cli.main(cli._parse_pairs(args.pairs), args.ranges.split(","), args.indicators, args.output_dir, workers=1)
+        self.assertEqual(len(paths), 2)
+
+    def test_package_compiles(self):
+        result = subprocess.run([sys.executable, "-m", "compileall", "-q", os.path.join(project_root, "SMA")],
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
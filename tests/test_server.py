@@ -10,6 +10,7 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
 try:
+    import server
     from server import app as flask_app 
     from SMA.data_processor import get_processed_data, generate_echarts_options
 except ImportError as e:
@@ -29,6 +30,8 @@ class TestFlaskApp(unittest.TestCase):
         cls.client = flask_app.test_client()
         
         print("TestFlaskApp.setUpClass: Ensuring initial data load by waiting for scheduler...")
+        if not server.scheduler.running: # CHART_SCHEDULER=0 (tests/__init__.py): queue the initial load here
+            server.schedule_update()
         time.sleep(15) # Wait for server's initial data load (scheduled 5s + processing time)
         
         response = cls.client.get('/data')
@@ -78,9 +81,10 @@ class TestFlaskApp(unittest.TestCase):
         initial_last_updated_str = initial_data.get("last_updated")
         
         update_response = self.client.post('/update_data')
-        self.assertEqual(update_response.status_code, 200)
+        self.assertEqual(update_response.status_code, 202)
         update_data_json = json.loads(update_response.data.decode('utf-8'))
         self.assertIn("message", update_data_json)
+        self.assertIn("job_id", update_data_json)
         
         print("Waiting for /update_data to process in test_03_update_data_endpoint...")
         time.sleep(30) # Wait for data processing which involves external API calls
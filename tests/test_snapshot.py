@@ -0,0 +1,155 @@
+import unittest
+import sys
+import os
+import datetime
+import json
+import subprocess
+import tempfile
+import threading
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from SMA.snapshot import build_snapshot, snapshot_options, snapshot_frame, read_snapshot_file, write_snapshot_file, SnapshotFile, ProcessLock
+
+COLD_START_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import server
+client = server.app.test_client()
+full = client.get("/data")
+served_in = time.perf_counter() - started
+lazy = "pandas" not in sys.modules
+ranged = client.get("/data?max_points=50")
+print(json.dumps({"status": full.status_code, "etag": full.headers.get("ETag"), "lazy": lazy,
+                  "range_status": ranged.status_code, "served_in": served_in}))
+'''
+
+
+class TestSnapshotFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "snapshot.bin")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        options = {"xAxis": {"data": ["2024-01-01"]}, "series": [{"name": "BTC价格", "data": [42000.5, None]}]}
+        snapshot = build_snapshot(options, datetime.datetime(2024, 1, 2, 3, 4, 5))
+        shared = SnapshotFile(self.path)
+        shared.publish(snapshot)
+
+        loaded = shared.load_if_changed()
+        self.assertEqual(loaded.version, snapshot.version)
+        self.assertEqual(loaded.etag, snapshot.etag)
+        self.assertEqual(loaded.last_updated, snapshot.last_updated)
+        self.assertEqual(loaded.encodings, snapshot.encodings)
+        self.assertEqual(snapshot_options(loaded), options)
+        # Unchanged file: nothing to reload
+        self.assertIsNone(shared.load_if_changed())
+
+    def test_tick_is_shared_with_other_processes(self):
+        leader, follower = SnapshotFile(self.path), SnapshotFile(self.path)
+        self.assertIsNone(follower.load_tick_if_changed())
+        leader.publish_tick(b'{"version": 1, "tick": 1}')
+        self.assertEqual(follower.load_tick_if_changed(), b'{"version": 1, "tick": 1}')
+        self.assertIsNone(follower.load_tick_if_changed())
+
+    def test_versions_increase(self):
+        first = build_snapshot({}, datetime.datetime(2024, 1, 1))
+        second = build_snapshot({}, datetime.datetime(2024, 1, 1), first.version)
+        self.assertGreater(second.version, first.version)
+
+    def test_missing_or_foreign_file(self):
+        self.assertIsNone(read_snapshot_file(self.path))
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot")
+        self.assertIsNone(read_snapshot_file(self.path))
+
+    def test_process_lock_is_exclusive(self):
+        lock_path = self.path + ".lock"
+        first, second = ProcessLock(lock_path), ProcessLock(lock_path)
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        first.release()
+        self.assertTrue(second.acquire())
+        second.release()
+
+    def test_process_lock_creates_missing_directory(self):
+        lock = ProcessLock(os.path.join(self.tmp_dir.name, "missing", "dir", "snapshot.bin.leader.lock"))
+        self.assertTrue(lock.acquire())
+        lock.release()
+
+    def test_process_lock_waits_for_timeout(self):
+        lock_path = self.path + ".lock"
+        first, second = ProcessLock(lock_path), ProcessLock(lock_path)
+        self.assertTrue(first.acquire())
+        started = time.monotonic()
+        self.assertFalse(second.acquire(timeout=0.2))
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        threading.Timer(0.1, first.release).start()
+        self.assertTrue(second.acquire(timeout=5))
+        second.release()
+
+
+
+class TestColdStart(unittest.TestCase):
+
+    def test_frame_is_loaded_on_first_use(self):
+        from tests.helpers import make_processed_frame
+        frame = make_processed_frame(700)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "snapshot.bin")
+            write_snapshot_file(path, build_snapshot({"series": []}, datetime.datetime(2024, 1, 1), frame=frame))
+            loaded = read_snapshot_file(path)
+            os.unlink(path) # The mapping outlives the file
+        self.assertIsNot(loaded.frame, frame)
+        restored = snapshot_frame(loaded)
+        self.assertTrue(restored.equals(frame))
+        self.assertEqual(restored.dtypes.to_dict(), frame.dtypes.to_dict())
+        self.assertEqual(restored.index.name, frame.index.name)
+        self.assertIs(snapshot_frame(loaded), snapshot_frame(loaded))
+        # Columns are read-only views of the mapped file, not copies
+        self.assertFalse(restored["Close"].to_numpy().flags.writeable)
+
+    def test_frame_columns_are_stored_without_pickle(self):
+        import pandas as pd
+        from tests.helpers import make_processed_frame
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "snapshot.bin")
+            empty = make_processed_frame(700).iloc[:0]
+            write_snapshot_file(path, build_snapshot({}, datetime.datetime(2024, 1, 1), frame=empty))
+            self.assertTrue(snapshot_frame(read_snapshot_file(path)).equals(empty))
+            with open(path, "rb") as f:
+                self.assertNotIn(b"pandas", f.read())
+
+            mixed = pd.DataFrame({"Close": [1.0, 2.0], "Note": ["a", "b"]})
+            with self.assertRaises(TypeError):
+                write_snapshot_file(path, build_snapshot({}, datetime.datetime(2024, 1, 1), frame=mixed))
+
+    def test_restarted_server_serves_persisted_snapshot_without_pandas(self):
+        from tests.helpers import make_processed_frame
+        from SMA.data_processor import generate_echarts_options
+        frame = make_processed_frame(700)
+        snapshot = build_snapshot(generate_echarts_options(frame), datetime.datetime.now(), frame=frame)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "snapshot.bin")
+            write_snapshot_file(path, snapshot)
+            env = dict(os.environ, CHART_SNAPSHOT_FILE=path, CHART_PAIRS="BTCUSDT:1d")
+            result = subprocess.run(
+                [sys.executable, "-c", COLD_START_SCRIPT], cwd=project_root, env=env,
+                capture_output=True, text=True, timeout=60
+            )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        output = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(output["status"], 200)
+        self.assertEqual(output["etag"], f'"{snapshot.etag}"')
+        self.assertTrue(output["lazy"])
+        self.assertEqual(output["range_status"], 200)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,263 @@
+import unittest
+import sys
+import os
+import json
+import threading
+import time
+from unittest import mock
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import pandas as pd
+
+import server
+from SMA import data_processor
+from SMA.data_fetcher import INTERVAL_MS, candle_open_time
+from SMA.data_processor import apply_live_klines, join_fear_greed
+from SMA.indicator import calculate_percentages
+from SMA import stream as stream_module
+from SMA.stream import KlineStream, parse_kline_message, kline_message
+from benchmarks.standin_server import ReplayWebSocketServer
+from tests.helpers import make_candles, make_fear_greed, make_processed_frame
+
+
+def make_kline(day, close, interval="1d"):
+    # Opens at 00:00 UTC like Binance's daily candles, on the one whose local date is `day`
+    open_time = candle_open_time(day, interval)
+    return [open_time, str(close), str(close * 1.02), str(close * 0.98), str(close), "12.5", open_time + INTERVAL_MS[interval] - 1]
+
+
+class TestParseKlineMessage(unittest.TestCase):
+
+    def test_round_trip(self):
+        kline = make_kline(pd.Timestamp("2024-03-01"), 61234.5)
+        parsed = parse_kline_message(kline_message("BTCUSDT", "1d", kline, closed=False))
+        self.assertEqual(parsed, ("BTCUSDT", "1d", kline, False))
+
+    def test_raw_stream_and_other_events(self):
+        message = json.loads(kline_message("ETHUSDT", "4h", make_kline(pd.Timestamp("2024-03-01"), 3000), closed=True))
+        self.assertEqual(parse_kline_message(json.dumps(message["data"]))[3], True)
+        self.assertIsNone(parse_kline_message('{"result": null, "id": 1}'))
+
+
+class TestLiveKlines(unittest.TestCase):
+    '''Streamed klines replayed by a local WebSocket stand-in update the loaded chart incrementally.'''
+
+    def setUp(self):
+        self.candles = make_candles(500)
+        self.fear_greed = make_fear_greed(self.candles)
+        patches = [
+            mock.patch.object(data_processor, "get_klines", return_value=self.candles),
+            mock.patch.object(data_processor, "get_fear_greed_index", return_value=self.fear_greed)
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(data_processor._indicator_cache.pop, ("BTCUSDT", "1d"), None)
+        data_processor.get_processed_data("BTCUSDT", "1d")
+
+    def expected(self, updates):
+        candles = self.candles.copy()
+        for day, close in updates.items():
+            candles.loc[day] = [close * 0.98, close * 1.02, close]
+        candles.index = candles.index.astype(self.candles.index.dtype)
+        return join_fear_greed(calculate_percentages(candles.copy()), self.fear_greed)
+
+    @unittest.skipUnless(stream_module.connect is not None, "websockets is not installed")
+    def test_replayed_stream_matches_full_recalculation(self):
+        last = self.candles.index[-1]
+        following = last + pd.Timedelta(days=1)
+        # The open candle ticks, closes, and the next one opens and ticks
+        messages = [
+            kline_message("BTCUSDT", "1d", make_kline(last, 20100.0), closed=False),
+            kline_message("BTCUSDT", "1d", make_kline(last, 20150.5), closed=True),
+            kline_message("BTCUSDT", "1d", make_kline(following, 20200.0), closed=False),
+            '{"result": null, "id": 1}',
+            kline_message("BTCUSDT", "1d", make_kline(following, 19950.25), closed=False),
+        ]
+        received = []
+        with ReplayWebSocketServer(messages) as replay:
+            stream = KlineStream([("BTCUSDT", "1d")], lambda *args: received.append(args), url=replay.url).start()
+            deadline = time.monotonic() + 10
+            while len(received) < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            stream.stop()
+        self.assertEqual(len(received), 4)
+        self.assertEqual([r[3] for r in received], [False, True, False, False])
+
+        # Apply in two flushes, like the server's throttled publisher
+        apply_live_klines("BTCUSDT", "1d", [r[2] for r in received[:1]])
+        latest = {kline[0]: kline for _, _, kline, _ in received[1:]}
+        result = apply_live_klines("BTCUSDT", "1d", list(latest.values()))
+
+        pd.testing.assert_frame_equal(result, self.expected({last: 20150.5, following: 19950.25}), check_freq=False)
+
+    def test_gap_is_not_applied(self):
+        skipped = self.candles.index[-1] + pd.Timedelta(days=2)
+        self.assertIsNone(apply_live_klines("BTCUSDT", "1d", [make_kline(skipped, 20000.0)]))
+        self.assertIsNone(apply_live_klines("ETHUSDT", "1d", [make_kline(skipped, 20000.0)]))
+
+
+class TestLiveKlinesAcrossDst(unittest.TestCase):
+    '''Hourly klines on 2023-10-29 in Berlin, where 02:00 local time happens twice.'''
+
+    def setUp(self):
+        previous_tz = os.environ.get("TZ")
+        os.environ["TZ"] = "Europe/Berlin"
+        time.tzset()
+        self.addCleanup(time.tzset)
+        self.addCleanup(lambda: os.environ.pop("TZ") if previous_tz is None else os.environ.update(TZ=previous_tz))
+        # The last loaded candle opens at 00:00 UTC, 02:00 summer time
+        daily = make_candles(500)
+        self.candles = daily.set_axis(pd.date_range(end="2023-10-29 00:00", periods=500, freq="h", name="Date"))
+        patches = [
+            mock.patch.object(data_processor, "get_klines", return_value=self.candles),
+            mock.patch.object(data_processor, "get_fear_greed_index", return_value=make_fear_greed(daily))
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(data_processor._indicator_cache.pop, ("BTCUSDT", "1h"), None)
+        data_processor.get_processed_data("BTCUSDT", "1h")
+
+    def test_repeated_local_hour_keeps_both_candles(self):
+        last = self.candles.index[-1]
+        following = last + pd.Timedelta(hours=1) # 02:00 winter time
+        result = apply_live_klines("BTCUSDT", "1h", [make_kline(last, 20100.0, "1h"), make_kline(following, 20200.0, "1h")])
+        self.assertEqual(len(result), len(self.candles) + 1)
+        self.assertTrue(result.index.is_unique)
+        self.assertEqual(result["Close"].iloc[-2:].tolist(), [20100.0, 20200.0])
+        self.assertEqual(result["Close"].iloc[:-2].tolist(), self.candles["Close"].iloc[:-1].tolist())
+
+
+class TestStreamEndpoint(unittest.TestCase):
+    '''Streamed klines are published by the flusher and pushed to /stream subscribers.'''
+
+    rows = 600
+
+    @classmethod
+    def setUpClass(cls):
+        cls.patchers = [
+            mock.patch.object(server, "get_processed_data", side_effect=lambda *args: make_processed_frame(cls.rows)),
+            mock.patch.object(server, "apply_live_klines", side_effect=lambda *args: make_processed_frame(cls.rows)),
+            mock.patch.object(server, "upsert_klines"),
+            mock.patch.object(server, "SSE_MIN_INTERVAL", 0.0)
+        ]
+        for patcher in cls.patchers:
+            patcher.start()
+        server.app.testing = True
+        cls.client = server.app.test_client()
+        server.update_chart_data()
+
+    @classmethod
+    def tearDownClass(cls):
+        for patcher in cls.patchers:
+            patcher.stop()
+
+    def setUp(self):
+        self.channel = server.channels[(server.DEFAULT_SYMBOL, server.DEFAULT_INTERVAL)]
+
+    def test_flush_pushes_tick_without_publishing(self):
+        before = self.channel.get_snapshot()
+        type(self).rows += 1
+        server.on_stream_kline(server.DEFAULT_SYMBOL, server.DEFAULT_INTERVAL, make_kline(pd.Timestamp("2020-01-01"), 1.0), False)
+        with mock.patch.object(server, "build_snapshot") as build:
+            self.assertTrue(server.flush_stream_updates(self.channel))
+            self.assertFalse(server.flush_stream_updates(self.channel)) # Nothing pending
+        build.assert_not_called()
+        self.assertIs(self.channel.get_snapshot(), before)
+
+        response = self.client.get(f'/stream?since={before.version}', buffered=False)
+        try:
+            self.assertEqual(response.mimetype, "text/event-stream")
+            self.assertEqual(response.headers["Cache-Control"], "no-cache")
+            events = iter(response.response)
+            self.assertTrue(next(events).startswith(b"retry:"))
+            lines = next(events).decode("utf-8").strip().split("\n")
+        finally:
+            response.close()
+        self.assertEqual(lines[0], "event: tick")
+        tick = json.loads(lines[1][len("data: "):])
+        self.assertEqual(tick["version"], before.version)
+
+        # The tick restates the last published rows and adds the new candle
+        def apply(arr, tail):
+            return arr[:tail["start"]] + tail["data"]
+
+        old = server.snapshot_options(before)
+        expected = server.generate_echarts_options(make_processed_frame(self.rows))
+        self.assertEqual(tick["delta"]["xAxis"]["start"], self.rows - 1 - server.STREAM_TICK_ROWS)
+        self.assertEqual(apply(old["xAxis"]["data"], tick["delta"]["xAxis"]), expected["xAxis"]["data"])
+        for old_series, new_series, tail in zip(old["series"], expected["series"], tick["delta"]["series"]):
+            self.assertEqual(apply(old_series["data"], tail), new_series["data"])
+
+    def test_next_version_streams_delta(self):
+        before = self.channel.get_snapshot().version
+        rows_before = len(server.snapshot_options(self.channel.get_snapshot())["series"][0]["data"])
+        type(self).rows += 1
+        server.update_chart_data()
+        after = self.channel.get_snapshot().version
+        self.assertIsNone(self.channel.live_tick)
+
+        response = self.client.get(f'/stream?since={before}', buffered=False)
+        try:
+            events = iter(response.response)
+            next(events)
+            lines = next(events).decode("utf-8").strip().split("\n")
+        finally:
+            response.close()
+        self.assertEqual(lines[:2], [f"id: {after}", "event: delta"])
+        delta = json.loads(lines[2][len("data: "):])
+        self.assertEqual((delta["since"], delta["version"]), (before, after))
+        self.assertEqual(len(delta["delta"]["xAxis"]["data"]), self.rows - rows_before)
+
+        # A version that is no longer retained asks the dashboard to reload
+        response = self.client.get('/stream', headers={"Last-Event-ID": "-5"}, buffered=False)
+        try:
+            events = iter(response.response)
+            next(events)
+            self.assertIn("event: reload", next(events).decode("utf-8"))
+        finally:
+            response.close()
+
+    def test_gap_queues_refresh(self):
+        server.upsert_klines.reset_mock()
+        server.on_stream_kline(server.DEFAULT_SYMBOL, server.DEFAULT_INTERVAL, make_kline(pd.Timestamp("2020-01-01"), 1.0), False)
+        # The refresh is queued once the flush let go of the locks, so it is not skipped
+        locked_at_submit = []
+        def submit(**params):
+            locked_at_submit.append(self.channel.update_lock.locked())
+        with mock.patch.object(server, "apply_live_klines", return_value=None), \
+                mock.patch.object(self.channel.queue, "submit", side_effect=submit) as queued:
+            self.assertFalse(server.flush_stream_updates(self.channel))
+        queued.assert_called_once_with(source="stream")
+        self.assertEqual(locked_at_submit, [False])
+        server.upsert_klines.assert_not_called()
+
+    def test_refresh_waits_for_running_flush(self):
+        self.assertTrue(server._acquire_update_locks(self.channel))
+        timer = threading.Timer(0.2, server._release_update_locks, args=(self.channel,))
+        timer.start()
+        try:
+            self.assertTrue(server.update_chart_data())
+        finally:
+            timer.join()
+        with mock.patch.object(server, "UPDATE_LOCK_WAIT", 0.1):
+            self.assertTrue(server._acquire_update_locks(self.channel))
+            try:
+                self.assertFalse(server.update_chart_data())
+            finally:
+                server._release_update_locks(self.channel)
+
+    def test_page_subscribes_only_in_streaming_mode(self):
+        for enabled, flag in ((True, b"const STREAMING_ENABLED = true;"), (False, b"const STREAMING_ENABLED = false;")):
+            with mock.patch.object(server, "STREAMING_ENABLED", enabled):
+                self.assertIn(flag, self.client.get('/').data)
+
+    def test_unknown_pair(self):
+        self.assertEqual(self.client.get('/stream/NOPE/1d').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
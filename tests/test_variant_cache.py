@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from SMA.variant_cache import VariantCache
+
+
+def payload(size):
+    return {"encodings": {"identity": b"x" * size}, "etag": str(size)}
+
+
+class TestVariantCache(unittest.TestCase):
+
+    def test_hits_misses_and_build_once(self):
+        cache = VariantCache()
+        calls = []
+        build = lambda: calls.append(1) or payload(10)
+        first = cache.get_or_build("BTC", 1, ("json", "a"), build)
+        second = cache.get_or_build("BTC", 1, ("json", "a"), build)
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats(), {"entries": 1, "bytes": 10, "hits": 1, "misses": 1})
+
+    def test_lru_bounds_entries_and_bytes(self):
+        cache = VariantCache(max_entries=2, max_bytes=100)
+        cache.put("BTC", 1, "a", payload(10))
+        cache.put("BTC", 1, "b", payload(10))
+        cache.get("BTC", 1, "a")  # "a" is now the most recently used
+        cache.put("BTC", 1, "c", payload(10))
+        self.assertIsNone(cache.get("BTC", 1, "b"))
+        self.assertIsNotNone(cache.get("BTC", 1, "a"))
+
+        cache.put("BTC", 1, "d", payload(95))
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.stats()["bytes"], 95)
+        cache.put("BTC", 1, "e", payload(500))  # larger than the whole cache: not kept
+        self.assertIsNone(cache.get("BTC", 1, "e"))
+        self.assertIsNotNone(cache.get("BTC", 1, "d"))
+
+    def test_invalidate_drops_namespace_and_stale_builds(self):
+        cache = VariantCache()
+        cache.put("BTC", 1, "a", payload(10))
+        cache.put("ETH", 7, "a", payload(10))
+        cache.invalidate("BTC", 2)
+        self.assertIsNone(cache.get("BTC", 1, "a"))
+        self.assertIsNotNone(cache.get("ETH", 7, "a"))
+        # A build that started on the old data finishes after the publish: it is not stored
+        cache.put("BTC", 1, "a", payload(10))
+        self.assertIsNone(cache.get("BTC", 1, "a"))
+        self.assertEqual(cache.stats()["bytes"], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()